@@ -0,0 +1,397 @@
+import numpy as np
+import pandas as pd
+
+from compact_results import CompactFrame
+from instrumentation import context, span
+from sc_sweep import calc_sc_sweep
+from scenarios import DEFAULT_CASES, _copy_for_scenario, apply_scenario
+from setpoint_engine import PROTECTION_TYPES, SetpointEngine
+
+# 电弧闪络（arc flash）入射能量计算，IEEE 1584-2018 模型
+# 输入为已有的母线三相短路电流（calc_sc_sweep，各方式）和定值表（SetpointEngine.setpoint_table）中
+# 各段的动作电流与延时，全部 方式 × 装置 × 保护段 由一次数组运算得到：
+#     燃弧电流    Iarc_V = 10^(k1 + k2·lgIbf + k3·lgG)·(k4·Ibf^6 + … + k10)，V = 600 / 2700 / 14300 V，
+#                 按系统电压 Voc 在三个电压点之间插值（Voc ≤ 0.6 kV 时按低压公式折算）
+#     最小燃弧电流 Iarc_min = Iarc·(1 − 0.5·VarCf)，VarCf 为 Voc 的 6 次多项式
+#     入射能量    E_V = 12.552/50·T·10^(k1 + k2·lgG + k3·Iarc_V/(k4·Ibf^7 + … + k10·Ibf) + k11·lgIbf
+#                                         + k12·lgD + k13·lgIarc_V + lg(1/CF))（J/cm²，T 单位 ms），同样按 Voc 插值
+#     电弧闪络边界 入射能量为 5.0 J/cm²（1.2 cal/cm²）处的距离
+#     CF          开关柜尺寸修正系数，由等效柜体尺寸 EES 求得；敞开式（VOA/HOA）为 1
+# 切除时间 = 该段延时 + 断路器分闸时间，各段为定时限，额定电流和最小燃弧电流下的切除时间相同，
+# 入射能量取两者的较大值；该段动作电流大于最小燃弧电流时 status 为 'no_trip'（该段不能可靠切除电弧）。
+# 另按最长燃弧时间（缺省 2 s，IEEE 1584-2018 6.9.1）计算一行 'max_duration'，没有保护段能切除电弧时
+# 标签值取该行；max_arc_duration_s 为 None 时不计算，此时这类装置的标签为 'no_trip'。
+# 装置处燃弧电流按所在母线的短路电流计算（电弧发生在母线处），各段是否动作也按该电流判断，不计并联支路间的分流。
+
+ELECTRODE_CONFIGS = ('VCB', 'VCBB', 'HCB', 'VOA', 'HOA')
+
+# 燃弧电流系数 k1…k10（IEEE 1584-2018 表 1），每种电极布置依次为 600 / 2700 / 14300 V
+_ARC_CURRENT = np.array([
+    [[-0.04287, 1.035, -0.083, 0., 0., -4.783e-09, 1.962e-06, -0.000229, 0.003141, 1.092],
+     [0.0065, 1.001, -0.024, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729],
+     [0.005795, 1.015, -0.011, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729]],
+    [[-0.017432, 0.98, -0.05, 0., 0., -5.767e-09, 2.524e-06, -0.00034, 0.01187, 1.013],
+     [0.002823, 0.995, -0.0125, 0., -9.204e-11, 2.901e-08, -3.262e-06, 0.0001569, -0.004003, 0.9825],
+     [0.014827, 1.01, -0.01, 0., -9.204e-11, 2.901e-08, -3.262e-06, 0.0001569, -0.004003, 0.9825]],
+    [[0.054922, 0.988, -0.11, 0., 0., -5.382e-09, 2.316e-06, -0.000302, 0.0091, 0.9725],
+     [0.001011, 1.003, -0.0249, 0., 0., 4.859e-10, -1.814e-07, -9.128e-06, -0.0007, 0.9881],
+     [0.008693, 0.999, -0.02, 0., -5.043e-11, 2.233e-08, -3.046e-06, 0.000116, -0.001145, 0.9839]],
+    [[0.043785, 1.04, -0.18, 0., 0., -4.783e-09, 1.962e-06, -0.000229, 0.003141, 1.092],
+     [-0.02395, 1.006, -0.0188, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729],
+     [0.005371, 1.0102, -0.029, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729]],
+    [[0.111147, 1.008, -0.24, 0., 0., -3.895e-09, 1.641e-06, -0.000197, 0.002615, 1.1],
+     [0.000435, 1.006, -0.038, 0., 0., 7.859e-10, -1.914e-07, -9.128e-06, -0.0007, 0.9981],
+     [0.000904, 0.999, -0.02, 0., 0., 7.859e-10, -1.914e-07, -9.128e-06, -0.0007, 0.9981]],
+])
+
+# 入射能量系数 k1…k13（表 3、4、5），顺序同上
+_ENERGY = np.array([
+    [[0.753364, 0.566, 1.752636, 0., 0., -4.783e-09, 1.962e-06, -0.000229, 0.003141, 1.092, 0., -1.598, 0.957],
+     [2.40021, 0.165, 0.354, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729, 0.,
+      -1.569, 0.9778],
+     [3.825917, 0.11, -0.999, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729, 0.,
+      -1.568, 0.99]],
+    [[3.068459, 0.26, -0.098107, 0., 0., -5.767e-09, 2.524e-06, -0.00034, 0.01187, 1.013, -0.06, -1.809, 1.19],
+     [3.870959, 0.185, 0.575, 0., -9.204e-11, 2.901e-08, -3.262e-06, 0.0001569, -0.004003, 0.9825, 0., -1.742,
+      1.09],
+     [3.644309, 0.215, 0.585, 0., -9.204e-11, 2.901e-08, -3.262e-06, 0.0001569, -0.004003, 0.9825, 0., -1.677,
+      1.06]],
+    [[4.073745, 0.344, -0.370259, 0., 0., -5.382e-09, 2.316e-06, -0.000302, 0.0091, 0.9725, 0., -2.03, 1.036],
+     [3.486391, 0.177, 1.0, 0., 0., 4.859e-10, -1.814e-07, -9.128e-06, -0.0007, 0.9881, 0.027, -1.723, 1.055],
+     [3.044516, 0.125, 0.245, 0., -5.043e-11, 2.233e-08, -3.046e-06, 0.000116, -0.001145, 0.9839, 0., -1.655,
+      1.084]],
+    [[0.679294, 0.746, 1.222636, 0., 0., -4.783e-09, 1.962e-06, -0.000229, 0.003141, 1.092, 0., -1.598, 0.997],
+     [3.880724, 0.105, -1.906, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729, 0.,
+      -1.515, 1.115],
+     [3.405454, 0.12, -0.93, -1.557e-12, 4.556e-10, -4.186e-08, 8.346e-07, 5.482e-05, -0.003191, 0.9729, 0.,
+      -1.534, 0.979]],
+    [[3.470417, 0.465, -0.261863, 0., 0., -3.895e-09, 1.641e-06, -0.000197, 0.002615, 1.1, 0., -1.99, 1.04],
+     [3.616266, 0.149, -0.761, 0., 0., 7.859e-10, -1.914e-07, -9.128e-06, -0.0007, 0.9981, 0., -1.639, 1.078],
+     [2.04049, 0.177, 1.005, 0., 0., 7.859e-10, -1.914e-07, -9.128e-06, -0.0007, 0.9981, 0., -1.633, 1.151]],
+])
+
+# 燃弧电流变化系数 VarCf 的多项式系数 k1…k7（表 2，Voc 单位 kV，k1 为 6 次项）
+_VARIATION = np.array([
+    [0., -1.4269e-06, 8.3137e-05, -0.0019382, 0.022366, -0.12645, 0.30226],
+    [1.138e-06, -6.0287e-05, 0.0012758, -0.013778, 0.080217, -0.24066, 0.33524],
+    [0., -3.097e-06, 0.00016405, -0.0033609, 0.033308, -0.16182, 0.34627],
+    [9.5606e-07, -5.1543e-05, 0.0011161, -0.01242, 0.075125, -0.23584, 0.33696],
+    [0., -3.1555e-06, 0.0001682, -0.0034607, 0.034124, -0.1599, 0.34629],
+])
+
+# 开关柜尺寸修正系数 b1…b3（表 7），行顺序 VCB / VCBB / HCB；敞开式不修正
+_ENCLOSURE_TYPICAL = np.array([[-0.000302, 0.03441, 0.4325], [-0.0002976, 0.032, 0.479], [-0.0001923, 0.01935, 0.6899]])
+_ENCLOSURE_SHALLOW = np.array([[0.002222, -0.02556, 0.6222], [-0.002778, 0.1194, -0.2778],
+                               [-0.0005556, 0.03722, 0.4778]])
+# 等效柜宽折算常数 A、B（表 6）
+_ENCLOSURE_AB = np.array([[4., 20.], [10., 24.], [10., 22.]])
+
+# 模型适用范围
+VOLTAGE_RANGE_KV = (0.208, 15.)
+IBF_RANGE_KA = {'lv': (0.5, 106.), 'mv': (0.2, 65.)}
+GAP_RANGE_MM = {'lv': (6.35, 76.2), 'mv': (19.05, 254.)}
+MIN_DISTANCE_MM = 305.
+
+# 典型设备参数（IEEE 1584-2018 表 8、表 10），按系统电压上限选取：
+#     电极布置、电极间隙（mm）、工作距离（mm）、柜体 高 × 宽 × 深（mm）
+EQUIPMENT_CLASSES = {
+    0.6: {'electrode': 'VCB', 'gap_mm': 32., 'distance_mm': 609.6,
+          'height_mm': 508., 'width_mm': 508., 'depth_mm': 508.},
+    5.: {'electrode': 'VCB', 'gap_mm': 104., 'distance_mm': 914.4,
+         'height_mm': 914.4, 'width_mm': 914.4, 'depth_mm': 914.4},
+    15.: {'electrode': 'VCB', 'gap_mm': 152., 'distance_mm': 914.4,
+          'height_mm': 1143., 'width_mm': 762., 'depth_mm': 762.},
+}
+EQUIPMENT_COLUMNS = ('electrode', 'gap_mm', 'distance_mm', 'height_mm', 'width_mm', 'depth_mm')
+
+# 断路器分闸时间（s），50 Hz 3 周波
+BREAKER_TIME_S = 0.06
+
+# 没有保护段能切除电弧时的最长燃弧时间（s）及其结果行的保护段名称
+MAX_ARC_DURATION_S = 2.
+MAX_DURATION_STAGE = 'max_duration'
+
+# 个人防护等级对应的入射能量上限（cal/cm²，NFPA 70E）：0 级不超过 1.2，1…4 级依次为 4 / 8 / 25 / 40
+PPE_LIMITS_CAL = (1.2, 4., 8., 25., 40.)
+JOULE_PER_CAL = 4.184
+# 电弧闪络边界处的入射能量（J/cm²）
+BOUNDARY_ENERGY_J = 5.
+
+ARC_FLASH_COLUMNS = ['case', 'fault', 'element_type', 'element', 'side', 'bus', 'vn_kv', 'stage', 'ibf_ka', 'iarc_ka',
+                     'iarc_min_ka', 'pickup_ka', 'clearing_time_s', 'incident_energy_cal', 'arc_flash_boundary_mm',
+                     'ppe_category', 'status']
+
+
+def _polynomial(coefficients, x):
+    # Horner 求值，coefficients 最后一维为最高次到常数项
+    result = np.zeros(np.broadcast_shapes(coefficients.shape[:-1], np.shape(x)))
+    for i in range(coefficients.shape[-1]):
+        result = result * x + coefficients[..., i]
+    return result
+
+
+def _interpolate(values, voc_kv):
+    # 三个电压点的结果按系统电压插值（0.6 < Voc ≤ 2.7 kV 用三点，Voc > 2.7 kV 用 2700 / 14300 V 两点）
+    v600, v2700, v14300 = values[..., 0], values[..., 1], values[..., 2]
+    first = (v2700 - v600) / 2.1 * (voc_kv - 2.7) + v2700
+    second = (v14300 - v2700) / 11.6 * (voc_kv - 14.3) + v14300
+    third = first * (2.7 - voc_kv) / 2.1 + second * (voc_kv - 0.6) / 2.1
+    return np.where(voc_kv > 2.7, second, third)
+
+
+def arc_currents(ibf_ka, voc_kv, gap_mm, electrode):
+    """
+    燃弧电流与最小燃弧电流（可广播）
+    :param ibf_ka: 三相短路电流（kA）
+    :param voc_kv: 系统电压（kV）
+    :param gap_mm: 电极间隙（mm）
+    :param electrode: 电极布置在 ELECTRODE_CONFIGS 中的序号
+    :return: (三个电压点的燃弧电流，形状 (..., 3), 燃弧电流, 最小燃弧电流)
+    """
+    ibf, voc = np.asarray(ibf_ka, dtype=np.float64), np.asarray(voc_kv, dtype=np.float64)
+    k = _ARC_CURRENT[electrode]
+    lg_ibf, lg_gap = np.log10(ibf)[..., np.newaxis], np.log10(gap_mm)[..., np.newaxis]
+    points = 10 ** (k[..., 0] + k[..., 1] * lg_ibf + k[..., 2] * lg_gap) * \
+        _polynomial(k[..., 3:], ibf[..., np.newaxis])
+    iarc = _interpolate(points, voc)
+    # 低压：由 600 V 燃弧电流折算
+    i600 = points[..., 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = 1 / np.sqrt((0.6 / voc) ** 2 * (1 / i600 ** 2 - (0.6 ** 2 - voc ** 2) / (0.6 ** 2 * ibf ** 2)))
+    iarc = np.where(voc <= 0.6, low, iarc)
+    reduction = 1 - 0.5 * _polynomial(_VARIATION[electrode], voc)
+    return points, iarc, iarc * reduction
+
+
+def enclosure_factor(voc_kv, electrode, height_mm, width_mm, depth_mm):
+    """
+    开关柜尺寸修正系数 CF（可广播），敞开式为 1
+    """
+    voc = np.asarray(voc_kv, dtype=np.float64)
+    electrode = np.asarray(electrode)
+    box = np.minimum(electrode, 2)
+    shallow = (voc < 0.6) & (np.asarray(depth_mm) <= 203.2)
+    a, b = _ENCLOSURE_AB[box, 0], _ENCLOSURE_AB[box, 1]
+
+    def equivalent(size_mm, adjust):
+        # 等效尺寸（in）：超过 1244.6 mm 按 1244.6 mm；660.4 mm 以上的部分按电压折算
+        size = np.minimum(np.asarray(size_mm, dtype=np.float64), 1244.6)
+        scaled = np.where(adjust & (size > 660.4), 660.4 + (size - 660.4) * (voc + a) / b, size) / 25.4
+        return np.where(size < 508., np.where(shallow, size / 25.4, 20.), scaled)
+
+    # VCB 的柜高不折算
+    ees = (equivalent(height_mm, box != 0) + equivalent(width_mm, True)) / 2
+    typical = _polynomial(_ENCLOSURE_TYPICAL[box], ees)
+    cf = np.where(shallow, 1 / _polynomial(_ENCLOSURE_SHALLOW[box], ees), typical)
+    return np.where(electrode >= 3, 1., cf)
+
+
+def incident_energy(ibf_ka, voc_kv, points, iarc_ka, gap_mm, distance_mm, time_s, electrode, cf):
+    """
+    入射能量与电弧闪络边界（可广播）
+    :param points: arc_currents 返回的三个电压点的燃弧电流（计算最小燃弧电流时按同一比例缩小）
+    :param iarc_ka: 燃弧电流（低压时用于能量公式的 k13 项）
+    :param time_s: 电弧持续时间（s）
+    :return: (入射能量 J/cm², 电弧闪络边界 mm)
+    """
+    ibf, voc = np.asarray(ibf_ka, dtype=np.float64), np.asarray(voc_kv, dtype=np.float64)
+    k = _ENERGY[electrode]
+    ibf_ = ibf[..., np.newaxis]
+    lg_ibf = np.log10(ibf_)
+    poly = _polynomial(k[..., 3:10], ibf_) * ibf_
+    # 低压时 k13 项用最终燃弧电流，k3 项仍用 600 V 燃弧电流
+    arc = np.concatenate([np.where(voc <= 0.6, iarc_ka, points[..., 0])[..., np.newaxis], points[..., 1:]], axis=-1)
+    exponent = k[..., 0] + k[..., 1] * np.log10(gap_mm)[..., np.newaxis] + k[..., 2] * points / poly + \
+        k[..., 10] * lg_ibf + k[..., 12] * np.log10(arc) - np.log10(cf)[..., np.newaxis]
+    time_ms = np.asarray(time_s, dtype=np.float64)[..., np.newaxis] * 1000.
+    energy = 12.552 / 50 * time_ms * 10 ** (exponent + k[..., 11] * np.log10(distance_mm)[..., np.newaxis])
+    boundary = 10 ** ((exponent - np.log10(BOUNDARY_ENERGY_J / (12.552 / 50) / time_ms)) / -k[..., 11])
+    low = voc <= 0.6
+    return np.where(low, energy[..., 0], _interpolate(energy, voc)), \
+        np.where(low, boundary[..., 0], _interpolate(boundary, voc))
+
+
+def equipment_parameters(bus, vn_kv, equipment=None):
+    """
+    各装置处的设备参数
+    :param bus: 装置所在母线索引数组
+    :param vn_kv: 装置所在母线额定电压数组
+    :param equipment: {电压上限 kV: 参数字典}（缺省 EQUIPMENT_CLASSES），
+                      或以母线索引为索引、含 EQUIPMENT_COLUMNS 列的 DataFrame（未列出的母线按电压等级取典型值）
+    :return: dict，EQUIPMENT_COLUMNS 中各项的数组，electrode 为 ELECTRODE_CONFIGS 中的序号
+    """
+    classes = equipment if isinstance(equipment, dict) else EQUIPMENT_CLASSES
+    limits = np.array(sorted(classes), dtype=np.float64)
+    level = np.minimum(np.searchsorted(limits, vn_kv), len(limits) - 1)
+    table = pd.DataFrame([classes[limit] for limit in sorted(classes)], columns=EQUIPMENT_COLUMNS)
+    params = {column: table[column].values[level] for column in EQUIPMENT_COLUMNS}
+    if isinstance(equipment, pd.DataFrame):
+        rows = equipment.index.get_indexer(bus)
+        found = rows >= 0
+        for column in EQUIPMENT_COLUMNS:
+            if column in equipment.columns:
+                values = equipment[column].values[rows[found]]
+                given = pd.notna(values)
+                params[column] = params[column].copy()
+                params[column][np.flatnonzero(found)[given]] = values[given]
+    params['electrode'] = pd.Index(ELECTRODE_CONFIGS).get_indexer(params['electrode'])
+    if (params['electrode'] < 0).any():
+        raise ValueError(f"electrode configuration must be one of {ELECTRODE_CONFIGS}")
+    return {column: params[column] if column == 'electrode' else params[column].astype(np.float64)
+            for column in EQUIPMENT_COLUMNS}
+
+
+def arc_flash_table(net, bus_results, setpoint_table, CT_ratio=1., equipment=None, breaker_time_s=BREAKER_TIME_S,
+                    voltage_range=VOLTAGE_RANGE_KV, max_arc_duration_s=MAX_ARC_DURATION_S):
+    """
+    各方式、各装置、各保护段切除电弧时的入射能量
+    :param net: pandapower 网络
+    :param bus_results: {方式: calc_sc_sweep 的母线结果}
+    :param setpoint_table: SetpointEngine.setpoint_table 的结果（取三相短路定值和各段延时），应为能动作的定值，
+                           如 basis='zone_min'；'bus' 基准的定值高于燃弧电流，各段均为 'no_trip'
+    :param CT_ratio: 计算定值时使用的电流互感器变比（标量，或与定值表行数相同的数组）
+    :param equipment: 设备参数，见 equipment_parameters
+    :param breaker_time_s: 断路器分闸时间（s）
+    :param voltage_range: 计算的母线电压范围（kV），缺省为模型适用范围
+    :param max_arc_duration_s: 最长燃弧时间（s），给定时每个装置另有一行 stage 为 'max_duration'（无动作电流），
+                               None 表示不计算
+    :return: 每个方式、每个装置、每个保护段一行的 DataFrame，列为 ARC_FLASH_COLUMNS；
+             status 为 'ok' / 'no_trip'（该段动作电流大于最小燃弧电流）/ 'danger'（超过 40 cal/cm²）/
+             'out_of_range'（短路电流、间隙或工作距离超出模型适用范围）/ 'no_fault'（母线失电）
+    """
+    with span('arc_flash') as s:
+        labels = setpoint_table.labels
+        bus_index = pd.Index(net.bus.index)
+        vn_all = net.bus['vn_kv'].values.astype(np.float64)
+        own = bus_index.get_indexer(labels['bus'])
+        keep = np.flatnonzero((vn_all[own] >= voltage_range[0]) & (vn_all[own] <= voltage_range[1]))
+        own, vn = own[keep], vn_all[own[keep]]
+        params = equipment_parameters(labels['bus'][keep], vn, equipment)
+        electrode = params['electrode']
+
+        cases = list(bus_results)
+        # 形状 (方式, 装置)
+        ibf = np.stack([bus_results[case]['3ph_ikss_ka'].reindex(bus_index).values[own] for case in cases])
+        valid = np.isfinite(ibf) & (ibf > 0)
+        ibf = np.where(valid, ibf, 1.)
+        points, iarc, iarc_min = arc_currents(ibf, vn, params['gap_mm'], electrode)
+        cf = enclosure_factor(vn, electrode, params['height_mm'], params['width_mm'], params['depth_mm'])
+
+        # 各段动作电流（一次值 kA）与切除时间，形状 (装置, 段)
+        ct = np.asarray(CT_ratio, dtype=np.float64)
+        ct = ct[keep, np.newaxis] if ct.ndim else ct
+        pickup = setpoint_table.setpoints[keep, 0, :] * ct / 1000.
+        clearing = np.asarray(setpoint_table.delays, dtype=np.float64) + breaker_time_s
+        stages = list(PROTECTION_TYPES)
+        if max_arc_duration_s is not None:
+            pickup = np.c_[pickup, np.full(len(keep), np.nan)]
+            clearing = np.r_[clearing, max_arc_duration_s]
+            stages.append(MAX_DURATION_STAGE)
+        n_stage = len(clearing)
+
+        # 形状 (方式, 装置, 段)；额定燃弧电流与最小燃弧电流各算一次，取较大值
+        full = (slice(None), slice(None), np.newaxis)
+        device = (slice(None), np.newaxis)
+        results = [incident_energy(ibf[full], vn[device], p[:, :, np.newaxis, :], i[full], params['gap_mm'][device],
+                                   params['distance_mm'][device], clearing, electrode[device], cf[device])
+                   for p, i in ((points, iarc), (points * (iarc_min / iarc)[..., np.newaxis], iarc_min))]
+        energy = np.fmax(results[0][0], results[1][0])
+        boundary = np.fmax(results[0][1], results[1][1])
+        energy_cal = energy / JOULE_PER_CAL
+
+        lv = vn <= 0.6
+        ibf_low = np.where(lv, IBF_RANGE_KA['lv'][0], IBF_RANGE_KA['mv'][0])
+        ibf_high = np.where(lv, IBF_RANGE_KA['lv'][1], IBF_RANGE_KA['mv'][1])
+        gap_low = np.where(lv, GAP_RANGE_MM['lv'][0], GAP_RANGE_MM['mv'][0])
+        gap_high = np.where(lv, GAP_RANGE_MM['lv'][1], GAP_RANGE_MM['mv'][1])
+        in_range = (ibf >= ibf_low) & (ibf <= ibf_high) & (params['gap_mm'] >= gap_low) & \
+            (params['gap_mm'] <= gap_high) & (params['distance_mm'] >= MIN_DISTANCE_MM)
+        with np.errstate(invalid='ignore'):
+            trips = pickup <= iarc_min[full]
+        trips[..., len(PROTECTION_TYPES):] = True
+        status = np.select([~valid[full], ~in_range[full], energy_cal > PPE_LIMITS_CAL[-1], ~trips],
+                           ['no_fault', 'out_of_range', 'danger', 'no_trip'], 'ok')
+        nan = ~valid[full]
+        energy_cal = np.where(nan, np.nan, energy_cal)
+        boundary = np.where(nan, np.nan, boundary)
+        ppe = np.where(nan, -1, np.searchsorted(PPE_LIMITS_CAL, energy_cal))
+
+        n_case, n_dev = ibf.shape
+        repeat = n_dev * n_stage
+        bus_names = net.bus['name'].values
+
+        def per_device(values):
+            return np.tile(np.repeat(values, n_stage), n_case)
+
+        def per_case_device(values):
+            return np.repeat(np.where(valid, values, np.nan).ravel(), n_stage)
+
+        result = pd.DataFrame({
+            'case': np.repeat(np.array(cases, dtype=object), repeat),
+            'fault': '3ph',
+            'element_type': per_device(np.asarray(labels['element_type'])[keep]),
+            'element': per_device(np.asarray(labels['element'])[keep]),
+            'side': per_device(np.asarray(labels['side'])[keep]),
+            'bus': per_device(bus_names[own]),
+            'vn_kv': per_device(vn),
+            'stage': np.tile(np.array(stages, dtype=object), n_case * n_dev),
+            'ibf_ka': per_case_device(ibf),
+            'iarc_ka': per_case_device(iarc),
+            'iarc_min_ka': per_case_device(iarc_min),
+            'pickup_ka': np.tile(pickup.ravel(), n_case),
+            'clearing_time_s': np.tile(clearing, n_case * n_dev),
+            'incident_energy_cal': energy_cal.ravel(),
+            'arc_flash_boundary_mm': boundary.ravel(),
+            'ppe_category': ppe.ravel(),
+            'status': status.ravel(),
+        }, columns=ARC_FLASH_COLUMNS)
+        s.rows = len(result)
+    return result
+
+
+def arc_flash_labels(table):
+    """
+    标签值：每个装置由能动作的最快一段切除电弧（没有能动作的段时取 'max_duration' 行），取各方式中入射能量最大者
+    :param table: arc_flash_table 的结果
+    :return: 每个装置一行的 DataFrame，列为 element_type, element, side, bus, vn_kv, case, stage, clearing_time_s,
+             incident_energy_cal, arc_flash_boundary_mm, ppe_category, status；没有能动作的段且未计算最长燃弧时间时
+             status 为 'no_trip'，各方式均失电时为 'no_fault'
+    """
+    keys = ['element_type', 'element', 'side', 'bus']
+    clears = table['status'].isin(('ok', 'danger', 'out_of_range')).values
+    fastest = table[clears].sort_values('clearing_time_s', kind='stable').drop_duplicates(keys + ['case'])
+    worst = fastest.sort_values('incident_energy_cal', ascending=False, kind='stable').drop_duplicates(keys)
+    devices = table.drop_duplicates(keys)[keys + ['vn_kv']]
+    labels = devices.merge(worst.drop(columns=['vn_kv']), on=keys, how='left')
+    dead = (table['status'] == 'no_fault').groupby([table[key] for key in keys], sort=False).all()
+    dead = dead.reindex(pd.MultiIndex.from_frame(labels[keys])).values
+    labels['status'] = labels['status'].fillna(pd.Series(np.where(dead, 'no_fault', 'no_trip'), index=labels.index))
+    labels['ppe_category'] = labels['ppe_category'].fillna(-1).astype(int)
+    return labels[keys + ['vn_kv', 'case', 'stage', 'clearing_time_s', 'incident_energy_cal', 'arc_flash_boundary_mm',
+                          'ppe_category', 'status']].reset_index(drop=True)
+
+
+def run_arc_flash(net, scenario, compact=False, engine=None, CT_ratio=1., **kwargs):
+    """
+    运行方式矩阵的电弧闪络计算（run_scenario_matrix 的 runner）：施加运行方式，计算各方式短路电流，
+    按 engine.reference_case 方式的结果计算定值，再计算全部装置、全部保护段的入射能量
+    :param net: 基础网络（不会被修改）
+    :param scenario: 运行方式字典
+    :param engine: SetpointEngine，缺省按 CT_ratio 以 'zone_min' 基准建立
+    :param kwargs: 传给 arc_flash_table 的其他参数
+    :return: 首列为 scenario 的 arc_flash_table 结果（compact 为 True 时为 CompactFrame）
+    """
+    with context(scenario=scenario['name']):
+        with span('scenario.apply'):
+            net = apply_scenario(_copy_for_scenario(net, scenario), scenario)
+        lv_tol_percent = scenario.get('lv_tol_percent', 6)
+        cases = scenario.get('cases', DEFAULT_CASES)
+        bus_results = {case: calc_sc_sweep(net, case, lv_tol_percent) for case in cases}
+        if engine is None:
+            engine = SetpointEngine(CT_ratio=CT_ratio, basis='zone_min', lv_tol_percent=lv_tol_percent)
+        reference = engine.reference_case
+        setpoints = engine.setpoint_table(net, bus_results[reference] if reference in bus_results
+                                          else calc_sc_sweep(net, reference, lv_tol_percent))
+        frame = arc_flash_table(net, bus_results, setpoints, CT_ratio=engine.CT_ratio, **kwargs)
+        frame.insert(0, 'scenario', scenario['name'])
+        return CompactFrame.from_frame(frame) if compact else frame
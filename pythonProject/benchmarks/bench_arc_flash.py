@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+import warnings
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from arc_flash import arc_flash_labels, arc_flash_table, run_arc_flash  # noqa: E402
+from network_factory import cached_tables  # noqa: E402
+from sc_sweep import calc_sc_sweep  # noqa: E402
+from scenarios import run_scenario_matrix  # noqa: E402
+from setpoint_engine import SetpointEngine  # noqa: E402
+from synthetic import scaled_spec  # noqa: E402
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# 电弧闪络入射能量基准：
+#     每个规模：最大/最小方式短路电流、定值表、全部 方式 × 装置 × 保护段 的入射能量与标签值的耗时
+#     运行方式矩阵：原变电站 --scenarios 个运行方式（母联分合、电源容量逐档变化）经 run_scenario_matrix 计算入射能量
+# 用法：python benchmarks/bench_arc_flash.py [--scales 1 100] [--scenarios 200] [--workers 4]
+
+DEFAULT_SCALES = (1, 100)
+
+
+def run_scale(factor, cache_dir=None):
+    """
+    :return: {'buses', 'sweep_s', 'arc_flash_s', 'rows'}
+    """
+    net = cached_tables(scaled_spec(factor), cache_dir)
+    start = time.perf_counter()
+    bus_results = {case: calc_sc_sweep(net, case) for case in ('max', 'min')}
+    setpoints = SetpointEngine(CT_ratio=60., basis='zone_min').setpoint_table(net, bus_results['min'])
+    sweep_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = arc_flash_table(net, bus_results, setpoints, 60.)
+    arc_flash_labels(table)
+    return {'buses': len(net.bus), 'sweep_s': sweep_s, 'arc_flash_s': time.perf_counter() - start,
+            'rows': len(table)}
+
+
+def fleet_scenarios(n):
+    """
+    示例运行方式：母联分合 × 电源短路容量在 300…407 MVA 间逐档变化
+    """
+    return [{'name': f'af-{i:04d}', 'switches': {'Bus Coupler': bool(i % 2)},
+             'ext_grid': {'s_sc_max_mva': 300. + 107.38 * i / max(n - 1, 1)}} for i in range(n)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='电弧闪络入射能量基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='放大倍数')
+    parser.add_argument('--scenarios', type=int, default=200, help='运行方式数')
+    parser.add_argument('--workers', type=int, help='进程数，缺省为 CPU 核数，0 为当前进程')
+    parser.add_argument('--cache-dir', help='网络缓存目录')
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6}{'buses':>8}{'sweep s':>10}{'arc flash s':>13}{'rows':>10}")
+    for factor in args.scales:
+        r = run_scale(factor, args.cache_dir)
+        print(f"{factor:>5}x{r['buses']:>8}{r['sweep_s']:>10.2f}{r['arc_flash_s']:>13.3f}{r['rows']:>10}")
+
+    start = time.perf_counter()
+    frame = run_scenario_matrix(fleet_scenarios(args.scenarios), max_workers=args.workers, runner=run_arc_flash)
+    print(f"scenario matrix: {args.scenarios} scenarios, {len(frame)} rows in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
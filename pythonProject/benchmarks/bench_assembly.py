@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import _legacy_line_end_loop  # noqa: E402
+from network_factory import cached_tables  # noqa: E402
+from result_assembly import assemble_tables, line_end_table, transformer_side_table  # noqa: E402
+from sc_sweep import FAULT_TYPES, calc_sc_sweep  # noqa: E402
+from synthetic import scaled_spec  # noqa: E402
+
+# 结果表组装基准：原脚本逐行 .at 取值的循环 与 result_assembly 按位置一次取值 的对比
+# 三种做法使用同一组母线结果（calc_sc_sweep），不调用 pandapower：
+#     loop        1+.py 的线路两端、变压器两侧循环（三相）
+#     join        result_assembly 组装同样的两张表，并检查结果与循环一致
+#     join_all    三种故障类型的线路两端、变压器两侧、母线三张表
+# 用法：python benchmarks/bench_assembly.py [--scales 1 10 100 1000] [--repeat 3]
+
+DEFAULT_SCALES = (1, 10, 100, 1000)
+
+
+def _best(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_scale(factor, repeat=3, cache_dir=None):
+    """
+    :return: {做法: 最小耗时（秒）}
+    """
+    net = cached_tables(scaled_spec(factor), cache_dir)
+    bus_results = calc_sc_sweep(net, 'max')
+    res_3ph = bus_results[['3ph_ikss_ka']].rename(columns={'3ph_ikss_ka': 'ikss_ka'})
+    bus_ikss = bus_results[['3ph_ikss_ka']]
+
+    loop_s, (line_loop, trafo_loop) = _best(lambda: _legacy_line_end_loop(net, res_3ph), repeat)
+    join_s, (line_join, trafo_join) = _best(
+        lambda: (line_end_table(net, bus_ikss), transformer_side_table(net, bus_ikss)), repeat)
+    if not (line_loop.equals(line_join) and trafo_loop.equals(trafo_join)):
+        raise AssertionError(f"assembled tables differ from the loop at scale {factor}x")
+    columns = [f'{fault}_ikss_ka' for fault in FAULT_TYPES]
+    join_all_s, _ = _best(lambda: assemble_tables(net, bus_results, columns), repeat)
+    return {'lines': len(net.line), 'loop': loop_s, 'join': join_s, 'join_all': join_all_s}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='结果表组装基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='放大倍数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cache-dir', help='网络缓存目录')
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6}{'lines':>8}{'loop ms':>12}{'join ms':>12}{'speedup':>10}{'all faults ms':>16}")
+    for factor in args.scales:
+        r = run_scale(factor, args.repeat, args.cache_dir)
+        print(f"{factor:>5}x{r['lines']:>8}{r['loop'] * 1000:>12.2f}{r['join'] * 1000:>12.2f}"
+              f"{r['loop'] / r['join']:>9.0f}x{r['join_all'] * 1000:>16.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
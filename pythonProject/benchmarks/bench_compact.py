@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compact_results import CompactFrame, compact_long_results, element_labels  # noqa: E402
+from network_factory import cached_tables  # noqa: E402
+from results_sink import long_results  # noqa: E402
+from sc_sweep import calc_sc_sweep  # noqa: E402
+from setpoint_engine import SetpointEngine  # noqa: E402
+from synthetic import scaled_spec  # noqa: E402
+
+# 紧凑结果表示的内存基准：同一网络 --scenarios 个运行方式的长格式结果与定值表，
+# 分别以 DataFrame（object 名称列、float64）和 CompactFrame 累积，比较占用内存（deep）与转换耗时。
+# 各运行方式使用同一组母线结果，只比较结果表示本身。
+# 用法：python benchmarks/bench_compact.py [--scales 1 100] [--scenarios 100]
+
+DEFAULT_SCALES = (1, 100)
+
+
+def _mb(n_bytes):
+    return n_bytes / 2 ** 20
+
+
+def run_scale(factor, n_scenarios, cache_dir=None):
+    """
+    :return: {'rows', 'long_frame_mb', 'long_compact_mb', 'setpoint_frame_mb', 'setpoint_compact_mb',
+              'compact_s', 'to_frame_s'}
+    """
+    net = cached_tables(scaled_spec(factor), cache_dir)
+    bus_results = calc_sc_sweep(net, 'max')
+    table = SetpointEngine(CT_ratio=60., stage_factors=(1., 1.5, 1.8)).setpoint_table(net, bus_results)
+
+    frames = []
+    for i in range(n_scenarios):
+        frame = long_results(net, bus_results)
+        frame.insert(0, 'case', 'max')
+        frame.insert(0, 'scenario', f's{i}')
+        frames.append(frame)
+    long_frame = pd.concat(frames, ignore_index=True)
+    setpoint_frames = [table.to_frame() for _ in range(n_scenarios)]
+
+    start = time.perf_counter()
+    labels = element_labels(net)
+    long_compact = CompactFrame.concat(compact_long_results(net, bus_results, labels, scenario=f's{i}', case='max')
+                                       for i in range(n_scenarios))
+    setpoint_compact = CompactFrame.concat(table.to_compact(scenario=f's{i}', case='max') for i in range(n_scenarios))
+    compact_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    long_compact.to_frame()
+    to_frame_s = time.perf_counter() - start
+
+    return {
+        'rows': len(long_frame),
+        'long_frame_mb': _mb(long_frame.memory_usage(deep=True).sum()),
+        'long_compact_mb': _mb(long_compact.nbytes),
+        'setpoint_frame_mb': _mb(sum(f.memory_usage(deep=True).sum() for f in setpoint_frames)),
+        'setpoint_compact_mb': _mb(setpoint_compact.nbytes),
+        'compact_s': compact_s,
+        'to_frame_s': to_frame_s,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='紧凑结果表示内存基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='放大倍数')
+    parser.add_argument('--scenarios', type=int, default=100, help='运行方式数')
+    parser.add_argument('--cache-dir', help='网络缓存目录')
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6}{'rows':>10}{'long MB':>10}{'compact':>10}{'ratio':>8}"
+          f"{'setpt MB':>10}{'compact':>10}{'ratio':>8}{'build s':>9}{'to_frame s':>12}")
+    for factor in args.scales:
+        r = run_scale(factor, args.scenarios, args.cache_dir)
+        print(f"{factor:>5}x{r['rows']:>10}{r['long_frame_mb']:>10.1f}{r['long_compact_mb']:>10.1f}"
+              f"{r['long_frame_mb'] / r['long_compact_mb']:>7.1f}x"
+              f"{r['setpoint_frame_mb']:>10.1f}{r['setpoint_compact_mb']:>10.1f}"
+              f"{r['setpoint_frame_mb'] / r['setpoint_compact_mb']:>7.1f}x"
+              f"{r['compact_s']:>9.2f}{r['to_frame_s']:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
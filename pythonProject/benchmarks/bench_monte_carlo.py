@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from monte_carlo import MonteCarloStudy  # noqa: E402
+from network_factory import cached_tables  # noqa: E402
+from sc_sweep import calc_sc_sweep  # noqa: E402
+from synthetic import scaled_spec  # noqa: E402
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# 蒙特卡洛短路计算基准：每个规模抽取 --samples 个样本（电源短路容量、短路电压、单相过渡电阻），
+# 记录批量 Woodbury 求解与包络的耗时，并与逐样本 calc_sc_sweep 的耗时（按 --reference 个样本外推）对照。
+# 用法：python benchmarks/bench_monte_carlo.py [--scales 1 100] [--samples 100000]
+
+DEFAULT_SCALES = (1, 100)
+
+
+def _reference_seconds(net, n_reference):
+    # 逐样本修改电源短路容量后整网重算（每个样本一次分解）
+    s_sc = net.ext_grid['s_sc_max_mva'].values.copy()
+    start = time.perf_counter()
+    for u in np.linspace(0.5, 1., n_reference):
+        net.ext_grid['s_sc_max_mva'] = s_sc * u
+        calc_sc_sweep(net, 'max')
+    net.ext_grid['s_sc_max_mva'] = s_sc
+    return (time.perf_counter() - start) / n_reference
+
+
+def run_scale(factor, n_samples, n_reference, cache_dir=None):
+    """
+    :return: {'buses', 'prepare_s', 'evaluate_s', 'envelope_s', 'per_sample_us', 'reference_per_sample_ms'}
+    """
+    net = cached_tables(scaled_spec(factor), cache_dir)
+    start = time.perf_counter()
+    study = MonteCarloStudy(net, 'max', r_fault_ohm=(0., 5.), seed=0)
+    prepare_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = study.run(n_samples)
+    evaluate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result.bus_envelope()
+    result.setpoint_envelope()
+    envelope_s = time.perf_counter() - start
+
+    return {
+        'buses': len(net.bus),
+        'prepare_s': prepare_s,
+        'evaluate_s': evaluate_s,
+        'envelope_s': envelope_s,
+        'per_sample_us': evaluate_s / n_samples * 1e6,
+        'reference_per_sample_ms': _reference_seconds(net, n_reference) * 1e3,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='蒙特卡洛短路计算基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='放大倍数')
+    parser.add_argument('--samples', type=int, default=100000, help='样本数')
+    parser.add_argument('--reference', type=int, default=20, help='逐样本对照计算的样本数')
+    parser.add_argument('--cache-dir', help='网络缓存目录')
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6}{'buses':>8}{'prepare s':>11}{'evaluate s':>12}{'envelope s':>12}"
+          f"{'us/sample':>11}{'ref ms/sample':>15}{'speedup':>10}")
+    for factor in args.scales:
+        r = run_scale(factor, args.samples, args.reference, args.cache_dir)
+        print(f"{factor:>5}x{r['buses']:>8}{r['prepare_s']:>11.2f}{r['evaluate_s']:>12.2f}{r['envelope_s']:>12.2f}"
+              f"{r['per_sample_us']:>11.1f}{r['reference_per_sample_ms']:>15.2f}"
+              f"{r['reference_per_sample_ms'] * 1e3 / r['per_sample_us']:>9.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from equipment_rating import rating_table  # noqa: E402
+from network_factory import build_network, cached_tables  # noqa: E402
+from result_assembly import line_end_table, transformer_side_table  # noqa: E402
+from results_sink import ParquetResultStore, long_results  # noqa: E402
+from sc_sweep import FAULT_TYPES, QUANTITIES, SequenceModel, calc_sc_sweep, sweep_tables  # noqa: E402
+from setpoint_engine import SetpointEngine  # noqa: E402
+from synthetic import scaled_spec  # noqa: E402
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# 计算流程各阶段的耗时与峰值内存基准
+# 每个规模（原变电站的 1/10/100/1000 倍馈线）依次运行下列阶段：
+#     build              由定义批量建网（network_factory.build_network）
+#     load_cached        从磁盘缓存读取表格视图
+#     calc_sc_3ph/2ph/1ph  pandapower sc.calc_sc（原脚本的做法，可用 --skip-legacy 跳过）
+#     calc_sc_bus_loop   原脚本逐条母线 sc.calc_sc(bus=...) 的循环；每次调用都对整个网络求解，耗时与母线数成正比，
+#                        母线数超过 --bus-loop-sample 时只对均匀抽取的母线计时，再按母线数线性折算（buses_timed 记录抽取数）
+#     line_end_loop      原脚本逐条线路/变压器 .at 取值的循环
+#     assembly           同样的两张表由 result_assembly 按母线位置一次取值（与 line_end_loop 对照）
+#     setpoints_legacy   1+整定计算.py 的 calculate_protection_setpoints
+#     excel_export       原 main() 的六张表 Excel 输出
+#     sweep              calc_sc_sweep（一次分解求全部母线三种故障）
+#     sweep_tables       由母线结果整理四张结果表
+#     sweep_quantities   calc_sc_sweep 一次求解 ikss/ip/ith/ib（方法 C 另分解一次等效频率网络）
+#     rating             断路器、电缆短路耐受校验（equipment_rating.rating_table）
+#     setpoints          SetpointEngine 向量化定值
+#     parquet_export     写入分区 Parquet 结果库
+# 耗时取 --repeat 次中的最小值；峰值内存另行在 tracemalloc 下运行一次测得（Python 与 NumPy 分配）。
+# 用法：
+#     python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+#     python benchmarks/bench_pipeline.py --scales 1 10 100 --baseline benchmarks/baseline.json
+# 与基线比较时，基线中没有的规模或阶段同样报告并以返回码 1 退出（新增阶段后需重新保存基线）
+
+DEFAULT_SCALES = (1, 10, 100, 1000)
+
+# 逐母线 calc_sc 循环最多计时的母线数
+DEFAULT_BUS_LOOP_SAMPLE = 50
+
+# 回归判定：比基线慢 tolerance 以上且绝对差超过 MIN_DELTA_S 秒（避免毫秒级阶段的计时噪声）
+DEFAULT_TOLERANCE = 0.25
+MIN_DELTA_S = 0.005
+
+
+def _load_script(filename, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(PROJECT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _legacy_line_end_loop(net, sc_results):
+    # 与 1+.py 中 run_short_circuit_calculation 的循环相同
+    rows = []
+    for line in net.line.index:
+        from_bus = net.line.at[line, 'from_bus']
+        to_bus = net.line.at[line, 'to_bus']
+        rows.append({"line_name": net.line.at[line, 'name'],
+                     "from_bus_3ph_ikss_ka": sc_results.at[from_bus, 'ikss_ka'],
+                     "to_bus_3ph_ikss_ka": sc_results.at[to_bus, 'ikss_ka']})
+    line_df = pd.DataFrame(rows)
+    rows = []
+    for trafo in net.trafo.index:
+        hv_bus = net.trafo.at[trafo, 'hv_bus']
+        lv_bus = net.trafo.at[trafo, 'lv_bus']
+        rows.append({"transformer_name": net.trafo.at[trafo, 'name'],
+                     "hv_bus_3ph_ikss_ka": sc_results.at[hv_bus, 'ikss_ka'],
+                     "lv_bus_3ph_ikss_ka": sc_results.at[lv_bus, 'ikss_ka']})
+    return line_df, pd.DataFrame(rows)
+
+
+def _loop_buses(n_bus, sample):
+    # 均匀抽取的母线位置，母线数不超过 sample 时为全部母线
+    return np.unique(np.linspace(0, n_bus - 1, min(n_bus, sample)).round().astype(int))
+
+
+def _stages(spec, workdir, legacy, bus_sample=DEFAULT_BUS_LOOP_SAMPLE):
+    """
+    返回 [(阶段名, 函数)]，函数之间通过 state 字典传递中间结果
+    """
+    state = {}
+
+    def build():
+        state['net'] = build_network(spec)
+
+    def load_cached():
+        state['tables'] = cached_tables(spec, os.path.join(workdir, 'cache'))
+
+    def calc_sc(fault):
+        def run():
+            import pandapower.shortcircuit as sc
+            sc.calc_sc(state['net'], fault=fault, case='max')
+            state[f'res_{fault}'] = state['net'].res_bus_sc.copy()
+        return run
+
+    def bus_loop():
+        # 与 1.py / 1+整定计算.py 原 run_short_circuit_calculation 中的母线循环相同
+        import pandapower.shortcircuit as sc
+        net = state['net']
+        for bus in net.bus.index[_loop_buses(len(net.bus), bus_sample)]:
+            sc.calc_sc(net, fault="3ph", case='max', bus=bus)
+            net.res_bus_sc.at[bus, 'ikss_ka']
+
+    def line_end_loop():
+        _legacy_line_end_loop(state['net'], state['res_3ph'])
+
+    def assembly():
+        bus_ikss = state['res_3ph'][['ikss_ka']].rename(columns={'ikss_ka': '3ph_ikss_ka'})
+        line_end_table(state['net'], bus_ikss)
+        transformer_side_table(state['net'], bus_ikss)
+
+    def sweep():
+        state['bus_results'] = calc_sc_sweep(state['tables'], 'max', model=SequenceModel(state['tables'], 'max'))
+
+    def tables():
+        state['sweep_tables'] = sweep_tables(state['tables'], state['bus_results'])
+
+    def sweep_quantities():
+        state['peak_results'] = calc_sc_sweep(state['tables'], 'max', model=SequenceModel(state['tables'], 'max'),
+                                              quantities=QUANTITIES)
+
+    def rating():
+        rating_table(state['tables'], state['peak_results'])
+
+    def setpoints_legacy():
+        script = state.setdefault('script', _load_script('1+整定计算.py', 'setpoint_script'))
+        script.calculate_protection_setpoints(state['sweep_tables'][0].copy())
+
+    def setpoints():
+        SetpointEngine(CT_ratio=60., stage_factors=(1., 1.5, 1.8)).setpoint_table(state['tables'],
+                                                                                state['bus_results'])
+
+    def excel_export():
+        with pd.ExcelWriter(os.path.join(workdir, 'short_circuit_results.xlsx')) as writer:
+            for label in ('Max Mode', 'Min Mode'):
+                short_circuit_results, line_df, trafo_df, _ = state['sweep_tables']
+                short_circuit_results.to_excel(writer, sheet_name=f'{label} Bus', index=False)
+                line_df.to_excel(writer, sheet_name=f'{label} Line Ends', index=False)
+                trafo_df.to_excel(writer, sheet_name=f'{label} Transformer', index=False)
+
+    def parquet_export():
+        store = ParquetResultStore(os.path.join(workdir, 'store'))
+        for case in ('max', 'min'):
+            store.write(long_results(state['tables'], state['bus_results']), substation='bench',
+                        scenario='base', case=case)
+
+    stages = [('build', build), ('load_cached', load_cached)]
+    if legacy:
+        stages += [(f'calc_sc_{fault}', calc_sc(fault)) for fault in FAULT_TYPES]
+        stages += [('calc_sc_bus_loop', bus_loop), ('line_end_loop', line_end_loop), ('assembly', assembly)]
+    stages += [('sweep', sweep), ('sweep_tables', tables), ('sweep_quantities', sweep_quantities),
+               ('rating', rating)]
+    if legacy:
+        stages += [('setpoints_legacy', setpoints_legacy)]
+    stages += [('setpoints', setpoints), ('parquet_export', parquet_export)]
+    if legacy:
+        stages += [('excel_export', excel_export)]
+    return stages
+
+
+def run_scale(factor, repeat=3, legacy=True, bus_sample=DEFAULT_BUS_LOOP_SAMPLE):
+    """
+    :param bus_sample: 逐母线 calc_sc 循环最多计时的母线数
+    :return: {阶段名: {'time_s': 最小耗时, 'peak_mb': 峰值内存}}，另含 'size' 网络规模
+    """
+    spec = scaled_spec(factor)
+    workdir = tempfile.mkdtemp(prefix='sc_bench_')
+    # 模块导入和首次写缓存不计入各阶段耗时
+    import pandapower.shortcircuit  # noqa: F401
+    cached_tables(spec, os.path.join(workdir, 'cache'))
+    try:
+        times = {}
+        for _ in range(repeat):
+            for name, stage in _stages(spec, workdir, legacy, bus_sample):
+                gc.collect()
+                start = time.perf_counter()
+                stage()
+                elapsed = time.perf_counter() - start
+                times[name] = min(times.get(name, np.inf), elapsed)
+
+        peaks = {}
+        for name, stage in _stages(spec, workdir, legacy, bus_sample):
+            gc.collect()
+            tracemalloc.start()
+            stage()
+            peaks[name] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {name: {'time_s': times[name], 'peak_mb': peaks[name]} for name in times}
+    if 'calc_sc_bus_loop' in result:
+        n_bus = len(spec['buses'])
+        timed = len(_loop_buses(n_bus, bus_sample))
+        result['calc_sc_bus_loop'].update(time_s=times['calc_sc_bus_loop'] * n_bus / timed, buses_timed=timed)
+    result['size'] = {'buses': len(spec['buses']), 'lines': len(spec['lines']), 'loads': len(spec['loads'])}
+    return result
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线比较
+    :return: 回归列表 [(规模, 阶段, 指标, 基线值, 当前值)]；基线中没有的阶段指标为 'missing'，基线值为 None
+    """
+    regressions = []
+    for scale, stages in results['scales'].items():
+        base_stages = baseline.get('scales', {}).get(scale, {})
+        for stage, metrics in stages.items():
+            if stage == 'size':
+                continue
+            if stage not in base_stages:
+                regressions.append((scale, stage, 'missing', None, metrics['time_s']))
+                continue
+            base = base_stages[stage]
+            if (metrics['time_s'] > base['time_s'] * (1 + tolerance)
+                    and metrics['time_s'] - base['time_s'] > MIN_DELTA_S):
+                regressions.append((scale, stage, 'time_s', base['time_s'], metrics['time_s']))
+            if metrics['peak_mb'] > base['peak_mb'] * (1 + tolerance) and metrics['peak_mb'] - base['peak_mb'] > 1:
+                regressions.append((scale, stage, 'peak_mb', base['peak_mb'], metrics['peak_mb']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='短路计算流程基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='放大倍数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过 pandapower calc_sc 等原脚本阶段')
+    parser.add_argument('--bus-loop-sample', type=int, default=DEFAULT_BUS_LOOP_SAMPLE,
+                        help='逐母线 calc_sc 循环最多计时的母线数，其余按母线数折算')
+    parser.add_argument('--baseline', help='基线 JSON，存在回归时以返回码 1 退出')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的相对退化')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线 JSON')
+    args = parser.parse_args(argv)
+
+    results = {'python': platform.python_version(), 'machine': platform.machine(), 'scales': {}}
+    for factor in args.scales:
+        scale = str(factor)
+        results['scales'][scale] = run_scale(factor, args.repeat, legacy=not args.skip_legacy,
+                                               bus_sample=args.bus_loop_sample)
+        size = results['scales'][scale]['size']
+        print(f"scale {factor}x  ({size['buses']} buses, {size['lines']} lines, {size['loads']} loads)")
+        for stage, metrics in results['scales'][scale].items():
+            if stage != 'size':
+                print(f"    {stage:<18}{metrics['time_s'] * 1000:10.1f} ms{metrics['peak_mb']:10.1f} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for scale, stage, metric, base, current in regressions:
+            if metric == 'missing':
+                print(f"NO BASELINE scale {scale}x {stage} (re-save the baseline to cover it)")
+            else:
+                print(f"REGRESSION scale {scale}x {stage} {metric}: {base:.4g} -> {current:.4g}")
+        if regressions:
+            return 1
+        print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
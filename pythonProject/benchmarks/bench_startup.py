@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 命令行冷启动耗时基准：每个命令以独立进程运行若干次，取中位数；
+# 同时检查各命令实际导入了哪些重量级模块。
+# 用法：python benchmarks/bench_startup.py [--repeat 5] [--json 结果.json]
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(PROJECT_DIR, 'cli.py')
+
+HEAVY_MODULES = ('pandapower', 'pandapower.plotting', 'pandapower.shortcircuit', 'matplotlib', 'openpyxl',
+                 'pyarrow')
+
+# 作为对照：原脚本在模块顶层导入 pandapower、绘图模块和短路模块
+LEGACY_IMPORTS = "import pandapower, pandapower.plotting, pandapower.shortcircuit"
+
+
+def _commands(workdir):
+    return {
+        'legacy imports': [sys.executable, '-c', LEGACY_IMPORTS],
+        'cli --help': [sys.executable, CLI, '--help'],
+        'cli compute': [sys.executable, CLI, 'compute', '--output', os.path.join(workdir, 'compute.csv')],
+        'cli setpoints': [sys.executable, CLI, 'setpoints', '--output', os.path.join(workdir, 'setpoints.csv')],
+        'cli export': [sys.executable, CLI, 'export', '--store', os.path.join(workdir, 'store')],
+    }
+
+
+def _imported_modules(command):
+    # 在子进程中执行同样的命令，退出前报告已导入的重量级模块
+    if command[1] != CLI:
+        probe = f"{command[2]}\n"
+    else:
+        probe = (f"import sys; sys.path.insert(0, {PROJECT_DIR!r}); import cli\n"
+                 f"try:\n    cli.main({command[2:]!r})\nexcept SystemExit:\n    pass\n")
+    probe += f"import sys, json; print('MODULES', json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, '-c', probe], cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.rsplit('MODULES', 1)[1])
+
+
+def run(repeat=5):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONWARNINGS='ignore')
+        for name, command in _commands(workdir).items():
+            # 先运行一次以生成网络缓存、预热文件系统缓存
+            subprocess.run(command, cwd=PROJECT_DIR, env=env, capture_output=True, check=True)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=PROJECT_DIR, env=env, capture_output=True, check=True)
+                times.append(time.perf_counter() - start)
+            results[name] = {
+                'median_s': statistics.median(times),
+                'min_s': min(times),
+                'heavy_modules': _imported_modules(command),
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='命令行冷启动耗时基准')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    for name, r in results.items():
+        print(f"{name:<16} median {r['median_s'] * 1000:8.1f} ms   min {r['min_s'] * 1000:8.1f} ms   "
+              f"imports: {', '.join(r['heavy_modules']) or '-'}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
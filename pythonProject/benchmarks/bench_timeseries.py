@@ -0,0 +1,105 @@
+import argparse
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from results_sink import ParquetResultStore  # noqa: E402
+from sc_sweep import calc_sc_sweep  # noqa: E402
+from substation import load_tables  # noqa: E402
+from timeseries import TimeSeriesStudy  # noqa: E402
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# 短路电流时间序列基准：原变电站一年 15 分钟一点的运行曲线
+#     Bus Coupler        工作日 8:00-20:00 闭合
+#     6109&1#电容器       7:00-23:00 投入
+#     6104&1#消弧线圈     每月第一周检修退出
+#     s_sc_max_mva       系统最大方式短路容量按小时在四档之间变化
+# 记录去重后的状态数、分解次数、求解与写入 Parquet 的耗时，并与逐时段 calc_sc_sweep 的耗时（按 --reference 个时段外推）对照。
+# 用法：python benchmarks/bench_timeseries.py [--days 365] [--reference 50]
+
+STEP = '15min'
+SOURCE_LEVELS_MVA = (300., 340., 380., 407.38)
+
+
+def daily_switching_profile(days=365, start='2026-01-01'):
+    """
+    示例运行曲线
+    """
+    times = pd.date_range(start, periods=days * 96, freq=STEP, name='time')
+    hour = times.hour
+    level = np.asarray(SOURCE_LEVELS_MVA)[(times.dayofyear.values * 24 + hour.values) % len(SOURCE_LEVELS_MVA)]
+    return pd.DataFrame({
+        'Bus Coupler': (times.dayofweek < 5) & (hour >= 8) & (hour < 20),
+        '6109&1#电容器': (hour >= 7) & (hour < 23),
+        '6104&1#消弧线圈': times.day > 7,
+        's_sc_max_mva': level,
+    }, index=times)
+
+
+def _reference_seconds(net, profile, n_reference):
+    # 逐时段施加状态后整网重算
+    rows = profile.iloc[np.linspace(0, len(profile) - 1, n_reference).astype(int)]
+    start = time.perf_counter()
+    for _, row in rows.iterrows():
+        trial = copy.copy(net)
+        for name in ('switch', 'line', 'ext_grid'):
+            trial[name] = net[name].copy()
+        trial.switch.loc[trial.switch['name'] == 'Bus Coupler', 'closed'] = bool(row['Bus Coupler'])
+        names = trial.line['name'].str.strip()
+        trial.line.loc[names == '6109&1#电容器', 'in_service'] = bool(row['6109&1#电容器'])
+        trial.line.loc[names == '6104&1#消弧线圈', 'in_service'] = bool(row['6104&1#消弧线圈'])
+        trial.ext_grid['s_sc_max_mva'] = row['s_sc_max_mva']
+        calc_sc_sweep(trial, 'max')
+    return (time.perf_counter() - start) / n_reference
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='短路电流时间序列基准')
+    parser.add_argument('--days', type=int, default=365, help='天数')
+    parser.add_argument('--reference', type=int, default=50, help='逐时段对照计算的时段数')
+    args = parser.parse_args(argv)
+
+    net = load_tables()
+    profile = daily_switching_profile(args.days)
+    study = TimeSeriesStudy(net, cases=('max',))
+
+    start = time.perf_counter()
+    result = study.solve(profile)
+    solve_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame = result.to_compact('max')
+    compact_s = time.perf_counter() - start
+
+    root = tempfile.mkdtemp(prefix='bench_timeseries_')
+    try:
+        start = time.perf_counter()
+        rows = TimeSeriesStudy(net, cases=('max',)).write(ParquetResultStore(root), profile)
+        write_s = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    reference_s = _reference_seconds(net, profile, args.reference)
+    stats = study.stats()
+    print(f"steps {stats['steps']}, states {stats['states']}, factorizations {stats['factorizations']}")
+    print(f"solve {solve_s:.2f} s, columnar frame {compact_s:.2f} s ({len(frame)} rows, "
+          f"{frame.nbytes / 2 ** 20:.1f} MB), stream to Parquet {write_s:.2f} s ({rows} rows)")
+    print(f"per-step calc_sc_sweep {reference_s * 1e3:.2f} ms -> {reference_s * len(profile):.1f} s for the profile, "
+          f"{reference_s * len(profile) / solve_s:.0f}x slower than the deduplicated solve")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network_factory import normalize_spec  # noqa: E402
+from substation import substation_spec  # noqa: E402
+
+# 按倍数放大的合成变电站：每个副本新增两条 6kV 负荷母线，
+# 把原有 21 条馈线和 26 个负荷复制一份接到新母线上，电源与主变不变。
+# factor=10 即 210 条馈线、26 条母线；factor=1000 即 21000 条馈线、2006 条母线。
+
+LOAD_BUSES = ("6kV Load 1", "6kV Load 2")
+
+
+def _replica(name, r):
+    return f"{name} #{r}"
+
+
+def scaled_spec(factor):
+    """
+    :param factor: 放大倍数（馈线数为原来的 factor 倍）
+    :return: 变电站定义
+    """
+    spec = normalize_spec(substation_spec())
+    if factor <= 1:
+        return spec
+    buses, lines, loads = [spec['buses']], [spec['lines']], [spec['loads']]
+    base_buses = spec['buses'][spec['buses']['name'].isin(LOAD_BUSES)]
+    for r in range(1, factor):
+        rename = {bus: _replica(bus, r) for bus in LOAD_BUSES}
+        buses.append(base_buses.assign(name=base_buses['name'].map(rename)))
+        lines.append(spec['lines'].assign(to_bus=spec['lines']['to_bus'].replace(rename),
+                                          name=spec['lines']['name'].map(lambda n: _replica(n, r))))
+        loads.append(spec['loads'].assign(bus=spec['loads']['bus'].replace(rename),
+                                          name=spec['loads']['name'].map(lambda n: _replica(n, r))))
+    spec['buses'] = pd.concat(buses, ignore_index=True)
+    spec['lines'] = pd.concat(lines, ignore_index=True)
+    spec['loads'] = pd.concat(loads, ignore_index=True)
+    return spec
@@ -0,0 +1,378 @@
+import argparse
+import os
+import sys
+
+# 命令行入口：
+#     python cli.py compute   [--substation 目录或YAML] [--case max|min|both] [--output 文件]
+#     python cli.py setpoints [--ct-ratio 60] [--stage-factors 1 1.5 1.8] [--output 文件]
+#     python cli.py sensitivity [--ct-ratio 60] [--failures] [--output 文件]     最小方式灵敏系数校验
+#     python cli.py rating    [--tk 1] [--breaking-ka 31.5] [--failures] [--output 文件]   断路器、电缆短路耐受校验
+#     python cli.py montecarlo [--samples 100000] [--r-fault 0 5] [--setpoints 文件] [--output 文件]   短路电流分位数包络
+#     python cli.py timeseries --profile 运行曲线.csv [--store 结果库目录 | --output 文件]   按时段的短路电流
+#     python cli.py export    --store 结果库目录 [--data 数据目录]         计算并写入 Parquet 结果库
+#     python cli.py export    --store 结果库目录 --report 报表.xlsx --name 变电站
+#     python cli.py plot      [--output 图片]
+#     python cli.py serve     [--port 8765 | --socket 路径] [--workers 4]        作业服务（见 job_service.py）
+# 全局选项 --trace 文件 记录各阶段耗时（见 instrumentation.py）。
+# 模块顶层只导入标准库；pandapower（导入需数秒并连带导入 matplotlib）只在 plot 或缓存未命中时导入，
+# Excel、Parquet 相关模块只在输出到对应格式时导入。
+
+CASES = {'max': ('max',), 'min': ('min',), 'both': ('max', 'min')}
+
+
+def _spec(args):
+    if args.substation:
+        from substation_loader import read_substation
+        return read_substation(args.substation)
+    from substation import substation_spec
+    return substation_spec()
+
+
+def _substation_name(args):
+    if args.name:
+        return args.name
+    if args.substation:
+        return os.path.splitext(os.path.basename(os.path.normpath(args.substation)))[0]
+    return 'default'
+
+
+def _load_tables(args):
+    from network_factory import build_network, cached_tables, network_tables
+    spec = _spec(args)
+    return network_tables(build_network(spec)) if args.no_cache else cached_tables(spec)
+
+
+def _bus_results(args, net):
+    from sc_sweep import calc_sc_sweep
+    for case in CASES[args.case]:
+        yield case, calc_sc_sweep(net, case, args.lv_tol)
+
+
+def _write_frame(frame, output):
+    if output is None:
+        print(frame.to_string(index=False))
+        return
+    from instrumentation import span
+    with span('export.file', format=os.path.splitext(output)[1]) as s:
+        if output.endswith('.xlsx'):
+            frame.to_excel(output, index=False)
+        elif output.endswith('.parquet'):
+            frame.to_parquet(output, index=False)
+        else:
+            frame.to_csv(output, index=False, encoding='utf-8-sig')
+        s.rows = len(frame)
+
+
+def cmd_compute(args):
+    import pandas as pd
+    from results_sink import long_results
+
+    net = _load_tables(args)
+    if args.output is None:
+        from sc_sweep import sweep_tables
+        for case, bus_results in _bus_results(args, net):
+            print(f"[{case}]")
+            print(sweep_tables(net, bus_results)[0].to_string())
+        return 0
+
+    frames = []
+    for case, bus_results in _bus_results(args, net):
+        frame = long_results(net, bus_results)
+        frame.insert(0, 'case', case)
+        frames.append(frame)
+    _write_frame(pd.concat(frames, ignore_index=True), args.output)
+    return 0
+
+
+def cmd_setpoints(args):
+    import pandas as pd
+    from setpoint_engine import SetpointEngine
+
+    net = _load_tables(args)
+    engine = SetpointEngine(CT_ratio=args.ct_ratio, stage_factors=args.stage_factors)
+    frames = []
+    for case, bus_results in _bus_results(args, net):
+        frame = engine.setpoint_table(net, bus_results).to_frame()
+        frame.insert(0, 'case', case)
+        frames.append(frame)
+    _write_frame(pd.concat(frames, ignore_index=True), args.output)
+    return 0
+
+
+def cmd_sensitivity(args):
+    from sc_sweep import calc_sc_sweep
+    from sensitivity import sensitivity_summary, sensitivity_table
+    from setpoint_engine import SetpointEngine
+
+    net = _load_tables(args)
+    bus_results = {case: calc_sc_sweep(net, case, args.lv_tol) for case in ('max', 'min')}
+    engine = SetpointEngine(CT_ratio=args.ct_ratio, stage_factors=args.stage_factors, basis=args.basis,
+                            lv_tol_percent=args.lv_tol)
+    table = sensitivity_table(net, bus_results, engine.setpoint_table(net, bus_results[engine.reference_case]),
+                              args.ct_ratio, lv_tol_percent=args.lv_tol)
+    if args.output is None:
+        print(sensitivity_summary(table).to_string())
+    _write_frame(table[table['status'] == 'fail'] if args.failures else table, args.output)
+    return 0
+
+
+def cmd_rating(args):
+    from equipment_rating import rating_summary, rating_table
+    from sc_sweep import QUANTITIES, calc_sc_sweep
+
+    net = _load_tables(args)
+    bus_results = calc_sc_sweep(net, 'max', args.lv_tol, quantities=QUANTITIES, tk_s=args.tk)
+    table = rating_table(net, bus_results, tk_s=args.tk, breaking_ka=args.breaking_ka,
+                         rated_duration_s=args.rated_duration, loading=args.loading)
+    if args.output is None:
+        print(rating_summary(table).to_string())
+    _write_frame(table[table['status'] == 'fail'] if args.failures else table, args.output)
+    return 0
+
+
+def cmd_transformer(args):
+    from sc_sweep import calc_sc_sweep
+    from transformer_protection import transformer_protection_table
+
+    net = _load_tables(args)
+    bus_results = {case: calc_sc_sweep(net, case, args.lv_tol) for case in ('max', 'min')}
+    table = transformer_protection_table(net, bus_results, args.lv_tol, ct_hv_a=args.ct_hv, ct_lv_a=args.ct_lv,
+                                         zero_sequence_elimination=not args.no_i0_elimination)
+    _write_frame(table, args.output)
+    return 0
+
+
+def cmd_arcflash(args):
+    from arc_flash import arc_flash_labels, arc_flash_table
+    from sc_sweep import calc_sc_sweep
+    from setpoint_engine import SetpointEngine
+
+    net = _load_tables(args)
+    bus_results = dict(_bus_results(args, net))
+    engine = SetpointEngine(CT_ratio=args.ct_ratio, stage_factors=args.stage_factors, basis=args.basis,
+                            lv_tol_percent=args.lv_tol)
+    reference = engine.reference_case
+    setpoints = engine.setpoint_table(net, bus_results[reference] if reference in bus_results
+                                      else calc_sc_sweep(net, reference, args.lv_tol))
+    table = arc_flash_table(net, bus_results, setpoints, args.ct_ratio, breaker_time_s=args.breaker_time,
+                            max_arc_duration_s=None if args.no_max_duration else args.max_arc_duration)
+    _write_frame(arc_flash_labels(table) if args.labels else table, args.output)
+    return 0
+
+
+def cmd_montecarlo(args):
+    from monte_carlo import MonteCarloStudy
+    from setpoint_engine import SetpointEngine
+
+    net = _load_tables(args)
+    study = MonteCarloStudy(net, 'min' if args.case == 'min' else 'max', args.lv_tol, taps=not args.no_taps,
+                            r_fault_ohm=args.r_fault, seed=args.seed)
+    result = study.run(args.samples)
+    envelope = result.bus_envelope(args.percentiles)
+    _write_frame(envelope.rename_axis('bus').reset_index(), args.output)
+    if args.setpoints:
+        engine = SetpointEngine(CT_ratio=args.ct_ratio, stage_factors=args.stage_factors)
+        _write_frame(result.setpoint_envelope(engine, args.percentiles), args.setpoints)
+    return 0
+
+
+def cmd_timeseries(args):
+    from timeseries import TimeSeriesStudy, read_profile
+
+    net = _load_tables(args)
+    study = TimeSeriesStudy(net, CASES[args.case], args.lv_tol)
+    profile = read_profile(args.profile)
+    if args.store:
+        from results_sink import ParquetResultStore
+        rows = study.write(ParquetResultStore(args.store), profile, _substation_name(args), args.chunk_steps,
+                           scenario=args.scenario)
+        print(f"wrote {rows} rows to {args.store}")
+    else:
+        import pandas as pd
+        frames = [frame.to_frame(categorical=False, float64=True)
+                  for _, frame in study.stream(profile, args.chunk_steps)]
+        _write_frame(pd.concat(frames, ignore_index=True), args.output)
+    stats = study.stats()
+    print(f"{stats['steps']} steps, {stats['states']} distinct states, {stats['factorizations']} factorizations",
+          file=sys.stderr)
+    return 0
+
+
+def cmd_export(args):
+    from results_sink import ParquetResultStore, long_results
+
+    store = ParquetResultStore(args.store, run_id=None if args.report else args.run)
+    if args.report:
+        store.excel_report(args.report, _substation_name(args), scenario=args.scenario, run=args.run or 'latest')
+        return 0
+
+    if args.data:
+        from substation_loader import export_fleet
+        names = export_fleet(args.data, store, cases=CASES[args.case], lv_tol_percent=args.lv_tol,
+                             cache=not args.no_cache)
+        print(f"wrote {len(names)} substations to {args.store} (run {store.run_id})")
+        return 0
+
+    net = _load_tables(args)
+    name = _substation_name(args)
+    for case, bus_results in _bus_results(args, net):
+        store.write(long_results(net, bus_results), substation=name, scenario=args.scenario, case=case)
+    print(f"wrote {name} to {args.store} (run {store.run_id})")
+    return 0
+
+
+def cmd_plot(args):
+    from network_factory import build_network, cached_network
+    spec = _spec(args)
+    net = build_network(spec) if args.no_cache else cached_network(spec)
+    if args.output:
+        # 批处理服务器上没有显示设备，使用非交互后端直接保存图片
+        import matplotlib
+        matplotlib.use('Agg')
+    import pandapower.plotting as plot
+    ax = plot.simple_plot(net, show_plot=args.output is None)
+    if args.output:
+        ax.figure.savefig(args.output, dpi=150)
+    return 0
+
+
+def cmd_serve(args):
+    import asyncio
+    from job_service import JobService
+
+    service = JobService(max_workers=args.workers, max_jobs=args.max_jobs)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='变电站短路计算与保护整定')
+    parser.add_argument('--trace', help='记录各阶段耗时的文件（.jsonl 或 Prometheus 文本格式 .prom）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(p):
+        p.add_argument('--substation', help='变电站定义目录或 YAML 文件，缺省为 substations/35kV_substation')
+        p.add_argument('--name', help='写入结果时使用的变电站名称')
+        p.add_argument('--case', choices=sorted(CASES), default='both', help='计算方式')
+        p.add_argument('--lv-tol', type=float, default=6, help='低压电网电压偏差（%%）')
+        p.add_argument('--no-cache', action='store_true', help='不使用网络缓存，重新建网')
+
+    p = sub.add_parser('compute', help='计算各母线三相/两相/单相短路电流')
+    add_common(p)
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_compute)
+
+    p = sub.add_parser('setpoints', help='计算保护定值')
+    add_common(p)
+    p.add_argument('--ct-ratio', type=float, default=1., help='电流互感器变比')
+    p.add_argument('--stage-factors', type=float, nargs=3, default=(1., 1., 1.), help='各段附加倍数')
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_setpoints)
+
+    p = sub.add_parser('sensitivity', help='用最小方式短路电流校验各段保护的灵敏系数')
+    add_common(p)
+    p.add_argument('--ct-ratio', type=float, default=1., help='电流互感器变比')
+    p.add_argument('--stage-factors', type=float, nargs=3, default=(1., 1., 1.), help='各段附加倍数')
+    p.add_argument('--failures', action='store_true', help='只输出不合格的项')
+    p.add_argument('--basis', choices=('zone_min', 'bus'), default='zone_min',
+                   help="动作电流基准：zone_min 为最小方式保护范围末端流过装置的电流（缺省），bus 为所在母线最大方式电流（原脚本）")
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_sensitivity)
+
+    p = sub.add_parser('rating', help='用最大方式 ip/ith/ib 校验断路器开断、关合、短时耐受和电缆热稳定')
+    add_common(p)
+    p.add_argument('--tk', type=float, default=1., help='短路持续时间（s）')
+    p.add_argument('--breaking-ka', type=float, default=31.5, help='断路器额定短路开断电流（kA）')
+    p.add_argument('--rated-duration', type=float, default=4., help='断路器额定短时耐受时间（s）')
+    p.add_argument('--loading', type=float, default=1., help='电缆短路前负载率（决定短路前导体温度）')
+    p.add_argument('--failures', action='store_true', help='只输出不合格的项')
+    p.add_argument('--basis', choices=('zone_min', 'bus'), default='zone_min',
+                   help="动作电流基准：zone_min 为最小方式保护范围末端流过装置的电流（缺省），bus 为所在母线最大方式电流（原脚本）")
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_rating)
+
+    p = sub.add_parser('transformer', help='计算变压器差动、差动速断和高压侧电流速断定值，校验区外故障稳定性和灵敏度')
+    add_common(p)
+    p.add_argument('--ct-hv', type=float, help='高压侧电流互感器一次额定电流（A），缺省按额定电流选取')
+    p.add_argument('--ct-lv', type=float, help='低压侧电流互感器一次额定电流（A），缺省按额定电流选取')
+    p.add_argument('--no-i0-elimination', action='store_true', help='差动保护不消除中性点接地侧的零序电流')
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_transformer)
+
+    p = sub.add_parser('arcflash', help='按 IEEE 1584-2018 计算各装置各保护段切除电弧时的入射能量和电弧闪络边界')
+    add_common(p)
+    p.add_argument('--ct-ratio', type=float, default=1., help='电流互感器变比')
+    p.add_argument('--stage-factors', type=float, nargs=3, default=(1., 1., 1.), help='各段附加倍数')
+    p.add_argument('--breaker-time', type=float, default=0.06, help='断路器分闸时间（s）')
+    p.add_argument('--max-arc-duration', type=float, default=2., help='没有保护段能切除电弧时的最长燃弧时间（s）')
+    p.add_argument('--no-max-duration', action='store_true', help='不计算最长燃弧时间，没有保护段能切除电弧时标为 no_trip')
+    p.add_argument('--basis', choices=('zone_min', 'bus'), default='zone_min',
+                   help="动作电流基准：zone_min 为最小方式保护范围末端流过装置的电流（缺省），bus 为所在母线最大方式电流（原脚本）")
+    p.add_argument('--labels', action='store_true', help='只输出每个装置的标签值（能动作的最快一段、各方式最大值）')
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_arcflash)
+
+    p = sub.add_parser('montecarlo', help='电源容量、短路电压、分接位置和过渡电阻随机取值，给出短路电流与定值的分位数包络')
+    add_common(p)
+    p.add_argument('--samples', type=int, default=100000, help='样本数')
+    p.add_argument('--percentiles', type=float, nargs='+', default=[1., 5., 50., 95., 99.], help='输出的分位数（%%）')
+    p.add_argument('--r-fault', type=float, nargs=2, default=(0., 0.), help='单相接地过渡电阻范围（Ω）')
+    p.add_argument('--no-taps', action='store_true', help='不抽取分接位置，按额定变比计算')
+    p.add_argument('--seed', type=int, help='随机数种子')
+    p.add_argument('--ct-ratio', type=float, default=1., help='电流互感器变比')
+    p.add_argument('--stage-factors', type=float, nargs=3, default=(1., 1., 1.), help='各段附加倍数')
+    p.add_argument('--setpoints', help='定值包络输出文件（.csv/.xlsx/.parquet）')
+    p.add_argument('--output', help='母线包络输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_montecarlo)
+
+    p = sub.add_parser('timeseries', help='按运行曲线（开关状态、元件投退、电源强度）逐时段计算短路电流')
+    add_common(p)
+    p.add_argument('--profile', required=True, help='运行曲线文件（.csv/.xlsx/.parquet），第一列为时间')
+    p.add_argument('--chunk-steps', type=int, default=96 * 30, help='每段计算和写出的时段数')
+    p.add_argument('--store', help='结果库目录（Parquet，逐段写入）')
+    p.add_argument('--scenario', default='timeseries', help='写入结果库时的运行方式名称')
+    p.add_argument('--output', help='输出文件（.csv/.xlsx/.parquet），缺省打印到屏幕')
+    p.set_defaults(func=cmd_timeseries)
+
+    p = sub.add_parser('export', help='写入 Parquet 结果库，或由结果库生成 Excel 报表')
+    add_common(p)
+    p.add_argument('--store', required=True, help='结果库目录')
+    p.add_argument('--data', help='变电站数据目录（逐站计算全部变电站）')
+    p.add_argument('--scenario', default='base', help='运行方式名称')
+    p.add_argument('--report', help='由结果库生成的 Excel 报表路径')
+    p.add_argument('--run', help='写入时为本次导出的标识，缺省为当前时间；生成报表时选择的导出，缺省为最新一次')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('plot', help='绘制网络拓扑图')
+    p.add_argument('--substation', help='变电站定义目录或 YAML 文件')
+    p.add_argument('--no-cache', action='store_true', help='不使用网络缓存，重新建网')
+    p.add_argument('--output', help='保存图片路径，缺省弹出窗口')
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser('serve', help='启动本机作业服务，接收变电站定义和运行方式并流式返回结果')
+    p.add_argument('--host', default='127.0.0.1', help='监听地址')
+    p.add_argument('--port', type=int, default=8765, help='监听端口')
+    p.add_argument('--socket', help='Unix 套接字路径（给定时不监听 TCP）')
+    p.add_argument('--workers', type=int, help='工作进程数，缺省为 CPU 核数')
+    p.add_argument('--max-jobs', type=int, default=16, help='同时进行的作业数上限')
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.trace:
+        return args.func(args)
+    import instrumentation
+    instrumentation.enable(instrumentation.sink_for_path(args.trace))
+    try:
+        return args.func(args)
+    finally:
+        instrumentation.disable()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+import numpy as np
+import pandas as pd
+
+from sc_sweep import FAULT_TYPES, element_ends
+
+# 紧凑结果表示（用于变电站群、上千个运行方式的大批量结果）
+# CompactFrame 是列式（struct-of-arrays）容器，每列单独保存为 NumPy 数组：
+#     categorical  名称等文本列：整数编码（按类别数取 int8/int16/int32）+ 类别数组；
+#                  相同内容的类别数组在进程内只保留一份（intern）
+#     numeric      数值列：float64 在 float32 能表示（相对误差不超过 FLOAT32_RTOL）时存为 float32
+#     constants    整列相同的值只作为元数据保存一次（如各段延时），不占每行的存储
+# 只有调用 to_frame() 时才生成 DataFrame；memory_usage() 报告各列实际占用的字节数。
+
+# 转为 float32 允许的最大相对误差（短路电流、定值保留约 6 位有效数字）
+FLOAT32_RTOL = 1e-6
+
+# 进程内共享的类别数组，键为类别内容
+_interned = {}
+
+
+def intern_categories(categories):
+    """
+    返回与给定内容相同的共享类别数组，多个结果表引用同一份名称
+    """
+    categories = np.asarray(categories, dtype=object)
+    key = tuple(categories.tolist())
+    shared = _interned.get(key)
+    if shared is None:
+        shared = _interned[key] = categories
+    return shared
+
+
+def _codes(codes, n_categories):
+    # 编码取能容纳类别数的最小整数类型（-1 表示缺失）
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return np.asarray(codes).astype(dtype, copy=False)
+    return np.asarray(codes, dtype=np.int64)
+
+
+def _encode(values):
+    # 文本列 -> (整数编码, 共享类别数组)，缺失值编码为 -1
+    if isinstance(values, pd.Categorical) or isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        categorical = pd.Categorical(values)
+        return _codes(categorical.codes, len(categorical.categories)), intern_categories(categorical.categories.values)
+    codes, categories = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+    return _codes(codes, len(categories)), intern_categories(categories)
+
+
+def _compact_float(values, rtol=FLOAT32_RTOL):
+    values = np.asarray(values)
+    if values.dtype != np.float64:
+        return values
+    narrow = values.astype(np.float32)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        error = np.abs(narrow.astype(np.float64) - values)
+        ok = np.isnan(values) | (error <= rtol * np.abs(values))
+    return narrow if ok.all() else values
+
+
+def _constant(values):
+    # 整列相同（含全为 NaN）时返回该值，否则返回 None
+    values = np.asarray(values)
+    if not len(values):
+        return None
+    first = values[0]
+    if values.dtype.kind == 'f':
+        same = np.isnan(values).all() if np.isnan(first) else (values == first).all()
+    elif values.dtype == object:
+        same = all(v == first for v in values) if not isinstance(first, float) else False
+    else:
+        same = (values == first).all()
+    if not same:
+        return None
+    return first.item() if hasattr(first, 'item') else first
+
+
+class CompactFrame:
+    """
+    列式紧凑结果表
+    :param length: 行数
+    :param categorical: {列名: (整数编码, 类别数组)}
+    :param numeric: {列名: 数值数组}
+    :param constants: {列名: 标量}，整列相同的值
+    :param order: 列顺序，缺省为 categorical、numeric、constants 的顺序
+    """
+
+    def __init__(self, length, categorical=None, numeric=None, constants=None, order=None):
+        self.length = int(length)
+        self.categorical = dict(categorical or {})
+        self.numeric = dict(numeric or {})
+        self.constants = dict(constants or {})
+        self.order = list(order) if order is not None else \
+            list(self.categorical) + list(self.numeric) + list(self.constants)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def columns(self):
+        return list(self.order)
+
+    @classmethod
+    def from_frame(cls, frame, rtol=FLOAT32_RTOL, constants=True):
+        """
+        由 DataFrame 转换：文本/分类列编码，float64 列按精度转 float32，整列相同的列存为常量
+        :param constants: 为 False 时不提取常量列
+        """
+        categorical, numeric, constant = {}, {}, {}
+        for column in frame.columns:
+            values = frame[column]
+            value = _constant(values.values) if constants and not isinstance(values.dtype, pd.CategoricalDtype) \
+                else None
+            if value is not None:
+                constant[column] = value
+            elif values.dtype == object or isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                categorical[column] = _encode(values.values)
+            else:
+                numeric[column] = _compact_float(values.to_numpy(), rtol)
+        return cls(len(frame), categorical, numeric, constant, order=list(frame.columns))
+
+    def column(self, name):
+        """
+        解码一列（文本列为 object 数组，常量列展开为整列）
+        """
+        if name in self.categorical:
+            codes, categories = self.categorical[name]
+            if (codes < 0).any():
+                return np.asarray(pd.Categorical.from_codes(codes, categories=categories), dtype=object)
+            return categories[codes]
+        if name in self.numeric:
+            return self.numeric[name]
+        if name in self.constants:
+            return np.full(self.length, self.constants[name],
+                           dtype=object if isinstance(self.constants[name], str) else None)
+        raise KeyError(name)
+
+    def to_frame(self, categorical=True, float64=False):
+        """
+        转换为 DataFrame
+        :param categorical: 文本列保持 pandas 分类类型（不复制名称），为 False 时解码为 object
+        :param float64: 数值列恢复为 float64
+        """
+        data = {}
+        for name in self.order:
+            if name in self.categorical and categorical:
+                codes, categories = self.categorical[name]
+                data[name] = pd.Categorical.from_codes(codes, categories=categories)
+            elif name in self.numeric and float64 and self.numeric[name].dtype == np.float32:
+                data[name] = self.numeric[name].astype(np.float64)
+            else:
+                data[name] = self.column(name)
+        return pd.DataFrame(data, columns=self.order)
+
+    def filter(self, **conditions):
+        """
+        按列取值筛选行，文本列直接比较编码，不解码
+        :param conditions: 列 -> 值或值列表
+        :return: 新的 CompactFrame
+        """
+        mask = np.ones(self.length, dtype=bool)
+        for name, value in conditions.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if name in self.categorical:
+                codes, categories = self.categorical[name]
+                wanted = pd.Index(categories).get_indexer(values)
+                mask &= np.isin(codes, wanted[wanted >= 0])
+            elif name in self.constants:
+                mask &= self.constants[name] in values
+            else:
+                mask &= np.isin(self.numeric[name], values)
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, rows):
+        return CompactFrame(len(rows), {k: (codes[rows], cats) for k, (codes, cats) in self.categorical.items()},
+                            {k: v[rows] for k, v in self.numeric.items()}, self.constants, self.order)
+
+    def memory_usage(self):
+        """
+        各列占用的字节数（与 DataFrame.memory_usage(deep=True) 口径相同，类别数组计入所在列）
+        :return: 以列名为索引的 Series，常量列为 0
+        """
+        usage = {}
+        for name in self.order:
+            if name in self.categorical:
+                codes, categories = self.categorical[name]
+                usage[name] = codes.nbytes + int(pd.Series(categories).memory_usage(deep=True, index=False))
+            elif name in self.numeric:
+                usage[name] = self.numeric[name].nbytes
+            else:
+                usage[name] = 0
+        return pd.Series(usage, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return int(self.memory_usage().sum())
+
+    @staticmethod
+    def concat(frames):
+        """
+        纵向拼接，类别不同的文本列合并类别后重新编码；各表常量不同的列展开为普通列
+        """
+        frames = list(frames)
+        if not frames:
+            return CompactFrame(0)
+        order = frames[0].order
+        for frame in frames[1:]:
+            if frame.order != order:
+                raise ValueError("frames to concat must have the same columns")
+        length = sum(len(frame) for frame in frames)
+        categorical, numeric, constants = {}, {}, {}
+        for name in order:
+            kinds = {'categorical' if name in f.categorical else 'numeric' if name in f.numeric else 'constant'
+                     for f in frames}
+            if kinds == {'constant'} and len({_key(f.constants[name]) for f in frames}) == 1:
+                constants[name] = frames[0].constants[name]
+            elif any(name in f.categorical or isinstance(f.constants.get(name), str) for f in frames):
+                categorical[name] = _concat_categorical([_as_categorical(f, name) for f in frames])
+            else:
+                parts = [f.numeric[name] if name in f.numeric else np.full(len(f), f.constants[name]) for f in frames]
+                dtype = np.result_type(*parts)
+                numeric[name] = np.concatenate([np.asarray(p, dtype=dtype) for p in parts])
+        return CompactFrame(length, categorical, numeric, constants, order)
+
+
+def _key(value):
+    # 常量比较：NaN 视为相同
+    return 'nan' if isinstance(value, float) and np.isnan(value) else value
+
+
+def _as_categorical(frame, name):
+    if name in frame.categorical:
+        return frame.categorical[name]
+    value = frame.constants[name] if name in frame.constants else None
+    if value is None:
+        return _encode(frame.numeric[name].astype(object))
+    return np.zeros(len(frame), dtype=np.int8), intern_categories([value])
+
+
+def _concat_categorical(parts):
+    first = parts[0][1]
+    if all(cats is first for _, cats in parts):
+        return np.concatenate([codes for codes, _ in parts]), first
+    union = pd.Index(first)
+    for _, cats in parts[1:]:
+        union = union.append(pd.Index(cats)[~pd.Index(cats).isin(union)])
+    remapped = []
+    for codes, cats in parts:
+        lookup = _codes(np.append(union.get_indexer(cats), -1), len(union))
+        remapped.append(lookup[codes])
+    return np.concatenate(remapped), intern_categories(union.values)
+
+
+def element_labels(net):
+    """
+    element_ends 的标签编码（每个网络算一次，全部运行方式、方式共用）
+    :return: {'element_type'/'element'/'side'/'bus': (整数编码, 类别数组)}
+    """
+    ends = element_ends(net)
+    bus_names = pd.Series(net.bus['name'].values, index=net.bus.index).reindex(ends['bus']).values
+    return {'element_type': _encode(ends['element_type']), 'element': _encode(ends['element']),
+            'side': _encode(ends['side']), 'bus': _encode(bus_names)}
+
+
+def compact_long_results(net, bus_results, labels=None, **keys):
+    """
+    results_sink.long_results 的紧凑版本，行顺序与列相同，直接由母线结果生成，不经过 object 列
+    :param labels: element_labels(net) 的结果，批量计算时传入以免重复编码
+    :param keys: 整批相同的列（如 scenario='...', case='max'），存为常量，位于最前
+    :return: CompactFrame
+    """
+    labels = element_labels(net) if labels is None else labels
+    ends_bus = element_ends(net)['bus']
+    pos = pd.Index(bus_results.index).get_indexer(ends_bus)
+    ikss = bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]].values[pos]
+    n, n_fault = len(pos), len(FAULT_TYPES)
+    categorical = {'fault': (np.repeat(np.arange(n_fault, dtype=np.int8), n), intern_categories(FAULT_TYPES))}
+    for name, (codes, categories) in labels.items():
+        categorical[name] = (np.tile(codes, n_fault), categories)
+    numeric = {'ikss_ka': _compact_float(ikss.T.ravel())}
+    order = list(keys) + ['fault', 'element_type', 'element', 'side', 'bus', 'ikss_ka']
+    return CompactFrame(n * n_fault, categorical, numeric, keys, order)
@@ -0,0 +1,402 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from instrumentation import context, span
+from sc_sweep import ELEMENT_TYPES, FAULT_TYPES, SEQUENCES, SequenceModel, fault_currents
+from scenarios import DEFAULT_CASES, _copy_for_scenario, _element_index, apply_scenario
+from substation import load_tables
+
+# N-1 / N-2 停运短路筛查
+# 每个停运方式（contingency）使用与运行方式相同的字典格式，只包含停运元件：
+#     {"name": "trafo Transformer 1", "out_of_service": {"trafo": ["Transformer 1"]}}
+# 每个开关状态、每个方式(case)只分解一次基础导纳矩阵；停运元件的导纳元素作为低秩修正 ΔY 从基础矩阵中减去，
+# 由 Woodbury 公式（见 incremental.py）得到全部母线的新戴维南阻抗。
+# 停运造成的孤岛（失去电源或零序接地点的节点）在其受影响节点上临时加单位对地导纳，使修正后的矩阵仍可逆，
+# 孤岛与带电部分已无联系，带电部分的阻抗不受影响；孤岛母线的短路电流记为 NaN。
+# 受影响节点超过 max_rank 时对该停运方式重新建模求解。
+
+# 孤岛节点上临时附加的对地导纳（标幺值）
+_ISLAND_SHUNT = 1.
+
+# 工作进程内缓存的网络与筛查引擎
+_base_net = None
+_engines = None
+
+
+def _label(net, element_type, index):
+    # 元件名称为空时（如外部电网）使用索引
+    name = net[element_type].at[index, 'name'] if 'name' in net[element_type].columns else None
+    return f"{element_type} {index if name is None or pd.isna(name) else name}"
+
+
+def n1_contingencies(net, element_types=ELEMENT_TYPES):
+    """
+    单一元件停运方式清单（只含投运元件）
+    :param element_types: 参与停运的元件类型
+    """
+    contingencies = []
+    for element_type in element_types:
+        table = net[element_type]
+        for index in table.index[table.in_service.values.astype(bool)]:
+            contingencies.append({'name': _label(net, element_type, index),
+                                  'out_of_service': {element_type: [index]}})
+    return contingencies
+
+
+def incomer_elements(net):
+    """
+    进线电源元件：外部电网及其所在母线上的变压器
+    :return: [(元件类型, 索引)]
+    """
+    eg = net.ext_grid[net.ext_grid.in_service.values.astype(bool)]
+    trafo = net.trafo[net.trafo.in_service.values.astype(bool) & net.trafo.hv_bus.isin(eg.bus).values]
+    return [('ext_grid', index) for index in eg.index] + [('trafo', index) for index in trafo.index]
+
+
+def n2_contingencies(net, elements=None):
+    """
+    两元件同时停运方式清单
+    :param elements: [(元件类型, 索引或名称)]，缺省为进线电源元件（incomer_elements）
+    """
+    elements = incomer_elements(net) if elements is None else elements
+    contingencies = []
+    for (type_a, a), (type_b, b) in itertools.combinations(elements, 2):
+        out_of_service = {}
+        out_of_service.setdefault(type_a, []).append(a)
+        out_of_service.setdefault(type_b, []).append(b)
+        name_a = _label(net, type_a, _element_index(net[type_a], a))
+        name_b = _label(net, type_b, _element_index(net[type_b], b))
+        contingencies.append({'name': f"{name_a} + {name_b}",
+                              'out_of_service': out_of_service})
+    return contingencies
+
+
+def switch_states(net, switches=None):
+    """
+    母线开关（母联）分合状态的全部组合
+    :param switches: 开关名称或索引列表，缺省为全部母线-母线开关
+    :return: {状态名称: {开关: 是否闭合}}
+    """
+    if switches is None:
+        switches = net.switch.index[net.switch.et.values == 'b'].tolist()
+    labels = [str(net.switch.at[_element_index(net.switch, sw), 'name']) for sw in switches]
+    states = {}
+    for closed in itertools.product((False, True), repeat=len(switches)):
+        name = ', '.join(f"{label} {'closed' if c else 'open'}" for label, c in zip(labels, closed)) or 'as-is'
+        states[name] = dict(zip(switches, closed))
+    return states
+
+
+def _outage_keys(net, contingency):
+    # 停运方式 -> [(元件类型序号, 索引)]
+    keys = []
+    for element_type, elements in contingency.get('out_of_service', {}).items():
+        if element_type not in ELEMENT_TYPES:
+            raise ValueError(f"outages of {element_type} are not supported, use one of {ELEMENT_TYPES}")
+        table = net[element_type]
+        keys.extend((ELEMENT_TYPES.index(element_type), int(_element_index(table, element)))
+                    for element in elements)
+    return keys
+
+
+class _SequenceStamps:
+    """
+    一个序网的导纳元素，按所属元件分组，并预先建立去掉并联支路后的简化拓扑，用于快速判断孤岛
+    """
+
+    def __init__(self, model, sequence):
+        stamps = model.element_stamps(sequence)
+        self.n_node = model.n_node
+        self.rows = stamps['rows']
+        self.cols = stamps['cols']
+        self.vals = stamps['vals']
+        nonzero = np.abs(self.vals) > 0
+
+        # 元件 -> 元素位置
+        order = np.lexsort((stamps['element'], stamps['element_type']))
+        keys = np.stack([stamps['element_type'][order], stamps['element'][order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+        ends = np.r_[starts[1:], len(order)]
+        self.entries = {(int(keys[s, 0]), int(keys[s, 1])): order[s:e] for s, e in zip(starts, ends)}
+
+        # 简化拓扑：节点对 -> 支路数；节点 -> 对地元素数
+        branch = nonzero & (self.rows < self.cols)
+        pair_keys, inverse = np.unique(np.stack([self.rows[branch], self.cols[branch]], axis=1), axis=0,
+                                       return_inverse=True)
+        self.pair_of_entry = np.full(len(self.rows), -1)
+        self.pair_of_entry[branch] = inverse.ravel()
+        self.pair_nodes = pair_keys.reshape(-1, 2)
+        self.pair_count = np.bincount(inverse.ravel(), minlength=len(self.pair_nodes))
+        shunt = stamps['shunt'] & nonzero
+        self.shunt_of_entry = np.where(shunt, self.rows, -1)
+        self.shunt_count = np.bincount(self.rows[shunt], minlength=self.n_node)
+
+    def energized(self, removed):
+        """去掉 removed 位置的元素后与电源（接地点）相连的节点"""
+        pair_count = self.pair_count.copy()
+        pairs = self.pair_of_entry[removed]
+        np.subtract.at(pair_count, pairs[pairs >= 0], 1)
+        shunt_count = self.shunt_count.copy()
+        shunts = self.shunt_of_entry[removed]
+        np.subtract.at(shunt_count, shunts[shunts >= 0], 1)
+
+        edges = self.pair_nodes[pair_count > 0]
+        graph = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(self.n_node, self.n_node))
+        n_comp, labels = connected_components(graph, directed=False)
+        grounded = np.zeros(n_comp, dtype=bool)
+        grounded[labels[shunt_count > 0]] = True
+        return grounded[labels]
+
+
+class ContingencyEngine:
+    """
+    某一开关状态、某一方式(case)下的停运筛查
+    :param net: pandapower 网络（不会被修改）
+    :param case: 'max' 或 'min'
+    :param lv_tol_percent: 低压电网电压偏差
+    :param max_rank: 低秩修正的最大节点数，超过后对该停运方式重新建模
+    """
+
+    def __init__(self, net, case='max', lv_tol_percent=6, max_rank=64, r_fault_ohm=0., x_fault_ohm=0.):
+        self.net = net
+        self.case = case
+        self.lv_tol_percent = lv_tol_percent
+        self.max_rank = max_rank
+        self.r_fault_ohm = r_fault_ohm
+        self.x_fault_ohm = x_fault_ohm
+        with span('contingency.model', case=case) as s:
+            self.model = SequenceModel(net, case, lv_tol_percent)
+            self.stamps = {sequence: _SequenceStamps(self.model, sequence) for sequence in SEQUENCES}
+            self.z = {sequence: self.model.zbus_diagonal(sequence) for sequence in SEQUENCES}
+            s.rows = self.model.n_node
+        # 已求出的阻抗矩阵列：节点 -> 列号
+        self._column_of = {sequence: np.full(self.model.n_node, -1) for sequence in SEQUENCES}
+        self._columns = {sequence: np.zeros((self.model.n_node, 0), dtype=np.complex128) for sequence in SEQUENCES}
+
+    def _removed_entries(self, sequence, keys):
+        entries = self.stamps[sequence].entries
+        found = [entries[key] for key in keys if key in entries]
+        return np.concatenate(found) if found else np.array([], dtype=np.int64)
+
+    def _touched_nodes(self, sequence, removed):
+        stamps = self.stamps[sequence]
+        nodes = np.unique(np.concatenate([stamps.rows[removed], stamps.cols[removed]]))
+        return nodes[self.model.energized[sequence][nodes]]
+
+    def _zbus_columns(self, sequence, nodes):
+        # 基础阻抗矩阵的若干列，已求过的列直接复用
+        column_of = self._column_of[sequence]
+        missing = np.unique(nodes[column_of[nodes] < 0])
+        if len(missing):
+            column_of[missing] = self._columns[sequence].shape[1] + np.arange(len(missing))
+            self._columns[sequence] = np.hstack([self._columns[sequence],
+                                                 self.model._zbus_node_columns(sequence, missing)])
+        return self._columns[sequence][:, column_of[nodes]]
+
+    def prepare(self, contingencies):
+        """一次求出全部停运方式涉及节点的阻抗矩阵列，避免逐个求解"""
+        keys = [key for contingency in contingencies for key in _outage_keys(self.net, contingency)]
+        for sequence in SEQUENCES:
+            with span('contingency.columns', case=self.case, sequence=sequence) as s:
+                nodes = self._touched_nodes(sequence, self._removed_entries(sequence, keys))
+                self._zbus_columns(sequence, nodes)
+                s.rows = len(nodes)
+
+    def _outage_diagonal(self, sequence, keys):
+        """
+        停运后各母线的戴维南阻抗；受影响节点过多时返回 None
+        """
+        model = self.model
+        stamps = self.stamps[sequence]
+        removed = self._removed_entries(sequence, keys)
+        if len(removed) == 0:
+            return self.z[sequence]
+        nodes = self._touched_nodes(sequence, removed)
+        if len(nodes) > self.max_rank:
+            return None
+
+        energized = stamps.energized(removed)
+        local = np.full(model.n_node, -1)
+        local[nodes] = np.arange(len(nodes))
+        keep = (local[stamps.rows[removed]] >= 0) & (local[stamps.cols[removed]] >= 0)
+        d = coo_matrix((-stamps.vals[removed][keep],
+                        (local[stamps.rows[removed][keep]], local[stamps.cols[removed][keep]])),
+                       shape=(len(nodes), len(nodes))).toarray()
+        # 孤岛节点临时接地，保证修正后的矩阵可逆
+        d[np.arange(len(nodes)), np.arange(len(nodes))] += np.where(energized[nodes], 0., _ISLAND_SHUNT)
+
+        z_cols = self._zbus_columns(sequence, nodes)
+        m = np.linalg.solve(np.eye(len(nodes)) + d @ z_cols[nodes], d)
+        alive = energized[model.node_of_bus]
+        rows = z_cols[model.node_of_bus[alive]]
+        diag = np.full(len(model.bus_index), np.inf + 0j)
+        diag[alive] = self.z[sequence][alive] - np.einsum('ik,kl,il->i', rows, m, rows)
+        return diag
+
+    def _full_diagonal(self, contingency):
+        net = apply_scenario(_copy_for_scenario(self.net, contingency), contingency)
+        model = SequenceModel(net, self.case, self.lv_tol_percent)
+        return {sequence: model.zbus_diagonal(sequence) for sequence in SEQUENCES}
+
+    def impedances(self, contingency):
+        """
+        :return: {序网: 各母线戴维南阻抗（标幺值）}，孤岛母线为 inf
+        """
+        keys = _outage_keys(self.net, contingency)
+        z = {sequence: self._outage_diagonal(sequence, keys) for sequence in SEQUENCES}
+        if any(v is None for v in z.values()):
+            z = self._full_diagonal(contingency)
+        return z
+
+    def currents(self, contingency):
+        """
+        :return: 形状为 (母线数, 故障类型数) 的 ikss（kA），孤岛母线为 NaN
+        """
+        z = self.impedances(contingency)
+        currents = fault_currents(self.model, z['positive'], z['zero'], self.r_fault_ohm, self.x_fault_ohm)
+        return np.stack([currents[fault] for fault in FAULT_TYPES], axis=1)
+
+    def screen(self, contingencies):
+        """
+        :return: 形状为 (停运方式数, 母线数, 故障类型数) 的 ikss（kA）
+        """
+        contingencies = list(contingencies)
+        self.prepare(contingencies)
+        with span('contingency.screen', case=self.case) as s:
+            result = np.stack([self.currents(contingency) for contingency in contingencies]) if contingencies \
+                else np.zeros((0, len(self.model.bus_index), len(FAULT_TYPES)))
+            s.rows = len(contingencies)
+        return result
+
+
+class ContingencyResult:
+    """
+    筛查结果
+    ikss 的形状为 (开关状态数, 方式数, 停运方式数, 母线数, 故障类型数)
+    """
+
+    def __init__(self, net, states, cases, contingencies, ikss):
+        self.bus_index = net.bus.index.values
+        self.bus_names = net.bus['name'].values
+        self.states = list(states)
+        self.cases = list(cases)
+        self.contingencies = [c['name'] for c in contingencies]
+        self.ikss = ikss
+
+    def envelope(self):
+        """
+        各开关状态、方式、故障类型下每条母线在全部停运方式中的最小/最大短路电流
+        :return: DataFrame，列为 switch_state, case, fault, bus, bus_name, ikss_min_ka, ikss_max_ka,
+                 min_contingency, max_contingency, n_dead（母线失电的停运方式数）
+        """
+        # (停运方式, 开关状态, 方式, 故障类型, 母线)
+        values = np.moveaxis(self.ikss, 2, 0).transpose(0, 1, 2, 4, 3)
+        dead = np.isnan(values)
+        all_dead = dead.all(axis=0)
+        names = np.array(self.contingencies, dtype=object)
+        arg_min = np.where(dead, np.inf, values).argmin(axis=0)
+        arg_max = np.where(dead, -np.inf, values).argmax(axis=0)
+        with np.errstate(all='ignore'):
+            low = np.where(all_dead, np.nan, np.take_along_axis(values, arg_min[None], 0)[0])
+            high = np.where(all_dead, np.nan, np.take_along_axis(values, arg_max[None], 0)[0])
+
+        shape = low.shape
+        grid = np.meshgrid(*(np.arange(n) for n in shape), indexing='ij')
+        return pd.DataFrame({
+            'switch_state': np.array(self.states, dtype=object)[grid[0].ravel()],
+            'case': np.array(self.cases, dtype=object)[grid[1].ravel()],
+            'fault': np.array(FAULT_TYPES, dtype=object)[grid[2].ravel()],
+            'bus': self.bus_index[grid[3].ravel()],
+            'bus_name': self.bus_names[grid[3].ravel()],
+            'ikss_min_ka': low.ravel(),
+            'ikss_max_ka': high.ravel(),
+            'min_contingency': np.where(all_dead, None, names[arg_min]).ravel(),
+            'max_contingency': np.where(all_dead, None, names[arg_max]).ravel(),
+            'n_dead': dead.sum(axis=0).ravel(),
+        })
+
+    def to_frame(self):
+        """
+        全部停运方式的明细（长格式）：switch_state, case, contingency, fault, bus, ikss_ka
+        """
+        shape = self.ikss.shape
+        grid = np.meshgrid(*(np.arange(n) for n in shape), indexing='ij')
+        return pd.DataFrame({
+            'switch_state': np.array(self.states, dtype=object)[grid[0].ravel()],
+            'case': np.array(self.cases, dtype=object)[grid[1].ravel()],
+            'contingency': np.array(self.contingencies, dtype=object)[grid[2].ravel()],
+            'fault': np.array(FAULT_TYPES, dtype=object)[grid[4].ravel()],
+            'bus': self.bus_index[grid[3].ravel()],
+            'ikss_ka': self.ikss.ravel(),
+        })
+
+
+def _build_engines(net, states, cases, lv_tol_percent, max_rank):
+    engines = {}
+    for state, switches in states.items():
+        state_net = apply_scenario(_copy_for_scenario(net, {'switches': switches}), {'switches': switches})
+        for case in cases:
+            with context(scenario=state):
+                engines[state, case] = ContingencyEngine(state_net, case, lv_tol_percent, max_rank)
+    return engines
+
+
+def _screen_chunk(engines, states, cases, contingencies):
+    return np.stack([np.stack([engines[state, case].screen(contingencies) for case in cases])
+                     for state in states])
+
+
+def _init_worker(network_builder, states, cases, lv_tol_percent, max_rank):
+    global _base_net, _engines
+    _base_net = network_builder()
+    _engines = _build_engines(_base_net, states, cases, lv_tol_percent, max_rank)
+
+
+def _run_in_worker(args):
+    states, cases, contingencies = args
+    return _screen_chunk(_engines, states, cases, contingencies)
+
+
+def run_contingency_screening(contingencies=None, network_builder=load_tables, states=None, cases=DEFAULT_CASES,
+                              lv_tol_percent=6, max_rank=64, max_workers=None, chunksize=None):
+    """
+    N-1 / N-2 停运短路筛查
+    :param contingencies: 停运方式字典列表，缺省为全部 N-1 加进线电源 N-2；N-0（'base'）总是包含在内
+    :param network_builder: 建立基础网络的顶层函数（需可被 pickle）
+    :param states: {状态名称: {开关: 是否闭合}}，缺省为母联分/合（switch_states）
+    :param cases: 计算方式
+    :param max_workers: 进程数，None 为 CPU 核数，0 表示在当前进程内顺序计算
+    :param chunksize: 每次分发给工作进程的停运方式数量
+    :return: ContingencyResult
+    """
+    net = network_builder()
+    if contingencies is None:
+        contingencies = n1_contingencies(net) + n2_contingencies(net)
+    contingencies = [{'name': 'base', 'out_of_service': {}}] + list(contingencies)
+    names = [c['name'] for c in contingencies]
+    if len(set(names)) != len(names):
+        raise ValueError("contingency names must be unique")
+    states = switch_states(net) if states is None else states
+    cases = list(cases)
+
+    with span('contingency.run') as s:
+        if max_workers == 0:
+            engines = _build_engines(net, states, cases, lv_tol_percent, max_rank)
+            ikss = _screen_chunk(engines, states, cases, contingencies)
+        else:
+            workers = max_workers or os.cpu_count() or 1
+            if chunksize is None:
+                chunksize = max(1, -(-len(contingencies) // (4 * workers)))
+            chunks = [(states, cases, contingencies[i:i + chunksize])
+                      for i in range(0, len(contingencies), chunksize)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(network_builder, states, cases, lv_tol_percent, max_rank)) as executor:
+                ikss = np.concatenate(list(executor.map(_run_in_worker, chunks)), axis=2)
+        s.rows = len(contingencies)
+    return ContingencyResult(net, states, cases, contingencies, ikss)
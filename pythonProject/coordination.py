@@ -0,0 +1,357 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from sc_sweep import ELEMENT_TYPES, FAULT_TYPES, SEQUENCES, SequenceModel, calc_sc_sweep
+from setpoint_engine import PROTECTION_TYPES
+from topology_index import ZONE_KINDS, TopologyIndex
+
+# 保护配合校核
+# 每个继电器有若干段（与 SetpointEngine 的保护段对应），每段为定时限或 IEC/IEEE 反时限特性：
+#     t = TMS·(A / (M^p - 1) + B) + 附加延时,  M = I / 动作电流
+# 定时限段 A = B = 0，动作时间即延时。全部继电器 × 故障电流的动作时间由一次广播运算得到。
+#
+# 上下级关系由网络拓扑（topology_index.TopologyIndex）确定：以外部电网为起点按支路数求各母线的电源距离，元件靠近电源一端的继电器向下游保护该元件，
+# 远离电源一端的继电器（如变压器低压侧）作为所在母线的进线保护。配合对为：
+#     近电源端继电器 -> 所在母线的进线继电器（没有进线继电器时为向该母线供电元件的近电源端继电器）
+#     进线继电器     -> 同一元件近电源端的继电器
+# 即 35kV 进线 -> 变压器 -> 6.3kV 母线 -> 馈线。
+#
+# 继电器电流由节点阻抗矩阵的分布系数得到：母线 k 故障时从母线 i 流入元件的各序电流为
+#     d_k = -Σ_j Y_元件[i, j]·Z[j, k]（每单位故障电流）
+# 负序与正序分布系数相同；经过一次 D/Y 变压器的继电器，正/负序电流分别移相 ±30°，零序电流不能通过。
+# 由各序分布系数和各故障类型的序电流比例合成三相电流，取最大相。
+
+# 曲线常数 (A, p, B)
+CURVES = {
+    'DT': (0., 1., 0.),
+    'IEC_SI': (0.14, 0.02, 0.),
+    'IEC_VI': (13.5, 1., 0.),
+    'IEC_EI': (80., 2., 0.),
+    'IEC_LTI': (120., 1., 0.),
+    'IEEE_MI': (0.0515, 0.02, 0.114),
+    'IEEE_VI': (19.61, 2., 0.491),
+    'IEEE_EI': (28.2, 2., 0.1217),
+}
+CURVE_NAMES = tuple(CURVES)
+_CURVE_CONSTANTS = np.array([CURVES[name] for name in CURVE_NAMES])
+
+# 默认配合级差（秒）
+DEFAULT_MARGIN = 0.3
+
+# 各故障类型的序电流 (I1, I2, I0)，以故障电流为 1
+_SEQUENCE_SHARES = {
+    '3ph': (1., 0., 0.),
+    '2ph': (1 / np.sqrt(3), -1 / np.sqrt(3), 0.),
+    '1ph': (1 / 3, 1 / 3, 1 / 3),
+}
+
+_A = np.exp(2j * np.pi / 3)
+# 相电流 = 零序 + a^k·正序 + a^-k·负序（k = 0, 2, 1 对应 a, b, c 相）
+_PHASE_ROTATION = np.array([1., _A ** 2, _A])
+
+
+def operating_times(current_ka, pickup_ka, curve, tms, delay):
+    """
+    继电器各段动作时间，取各段的最小值（可广播）
+    :param current_ka: 继电器电流，形状 (..., 点数)
+    :param pickup_ka: 各段动作电流，形状 (..., 段数)，NaN 表示该段退出
+    :param curve: 各段曲线在 CURVE_NAMES 中的序号，形状 (..., 段数)
+    :param tms: 各段时间倍数
+    :param delay: 各段附加延时（定时限段即动作延时）
+    :return: 形状 (..., 点数) 的动作时间（秒），不动作为 inf
+    """
+    constants = _CURVE_CONSTANTS[np.asarray(curve)]
+    a, p, b = (constants[..., i][..., np.newaxis, :] for i in range(3))
+    pickup = np.asarray(pickup_ka, dtype=np.float64)[..., np.newaxis, :]
+    m = np.asarray(current_ka, dtype=np.float64)[..., np.newaxis] / pickup
+    definite = a == 0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        t = np.asarray(tms)[..., np.newaxis, :] * (np.where(definite, 0., a / (m ** p - 1)) + b) \
+            + np.asarray(delay)[..., np.newaxis, :]
+        operates = np.where(definite, m >= 1, m > 1)
+    return np.where(operates, t, np.inf).min(axis=-1)
+
+
+class RelaySettings:
+    """
+    继电器整定表
+    :param labels: dict，等长数组 element_type / element / side / bus（与 element_ends 相同）
+    :param pickup_ka: 动作电流（一次值，kA），形状 (继电器数, 故障类型数, 段数)
+    :param curve: 曲线名称或序号，形状 (继电器数, 段数)
+    :param tms: 时间倍数，形状 (继电器数, 段数)
+    :param delay: 附加延时（秒），形状 (继电器数, 段数)
+    """
+
+    def __init__(self, labels, pickup_ka, curve, tms, delay, stages=PROTECTION_TYPES):
+        self.labels = labels
+        self.pickup_ka = np.asarray(pickup_ka, dtype=np.float64)
+        n_relay, _, n_stage = self.pickup_ka.shape
+        curve = np.broadcast_to(np.asarray(curve), (n_relay, n_stage))
+        self.curve = np.vectorize(CURVE_NAMES.index, otypes=[np.int64])(curve) if curve.dtype.kind in 'UO' \
+            else curve.astype(np.int64)
+        self.tms = np.broadcast_to(np.asarray(tms, dtype=np.float64), (n_relay, n_stage))
+        self.delay = np.broadcast_to(np.asarray(delay, dtype=np.float64), (n_relay, n_stage))
+        self.stages = tuple(stages)
+
+    def __len__(self):
+        return len(self.pickup_ka)
+
+    def names(self):
+        return np.array([f"{element} {side}".strip() for element, side in
+                         zip(pd.Series(self.labels['element']).astype(str).str.strip(), self.labels['side'])],
+                        dtype=object)
+
+    @classmethod
+    def from_setpoints(cls, setpoint_table, CT_ratio=1., curves=None):
+        """
+        由 SetpointTable 建立整定表，各段默认为定时限，延时取定值表的延时
+        :param CT_ratio: 计算定值时使用的电流互感器变比
+        :param curves: {保护段: (曲线名称, TMS)}，把某段改为反时限，例如 {'time_graded': ('IEC_SI', 0.1)}
+        """
+        ct = np.asarray(CT_ratio, dtype=np.float64)
+        ct = ct[:, np.newaxis, np.newaxis] if ct.ndim else ct
+        pickup = setpoint_table.setpoints * ct / 1000.
+        n_relay = len(setpoint_table)
+        curve = np.full((n_relay, len(PROTECTION_TYPES)), CURVE_NAMES.index('DT'))
+        tms = np.ones((n_relay, len(PROTECTION_TYPES)))
+        delay = np.tile(setpoint_table.delays, (n_relay, 1))
+        for stage, (name, value) in (curves or {}).items():
+            j = PROTECTION_TYPES.index(stage)
+            curve[:, j] = CURVE_NAMES.index(name)
+            tms[:, j] = value
+            delay[:, j] = 0.
+        return cls(setpoint_table.labels, pickup, curve, tms, delay)
+
+    def operating_times(self, current_ka, relays=None):
+        """
+        :param current_ka: 继电器电流（kA），形状 (继电器数, 故障类型数, 点数)
+        :param relays: 继电器位置数组，None 为全部继电器
+        :return: 同形状的动作时间（秒）
+        """
+        r = slice(None) if relays is None else np.asarray(relays)
+        return operating_times(current_ka, self.pickup_ka[r], self.curve[r][:, np.newaxis],
+                               self.tms[r][:, np.newaxis], self.delay[r][:, np.newaxis])
+
+
+# ---------------------------------------------------------------------- 拓扑
+def coordination_pairs(net, relays, topology=None):
+    """
+    由拓扑确定上下级继电器对
+    :param relays: RelaySettings
+    :param topology: TopologyIndex，缺省时由 net 建立
+    :return: DataFrame，列为 downstream, upstream（继电器位置）, location（下级继电器为 'feeder' 或 'incomer'）
+    """
+    topology = TopologyIndex(net) if topology is None else topology
+    return _pairs(_relay_frame(relays, topology), topology)
+
+
+def _pairs(rel, topology):
+    # 拓扑索引中的继电器位置 -> RelaySettings 中的位置
+    relay = np.full(len(topology.relay_branch), -1)
+    relay[rel['position'].values] = rel['relay'].values
+    present = relay >= 0
+    down, up, incomer = topology.coordination_pairs(present)
+    return pd.DataFrame({'downstream': relay[down], 'upstream': relay[up],
+                         'location': np.where(incomer, 'incomer', 'feeder').astype(object)})
+
+
+# ---------------------------------------------------------------------- 继电器电流
+class _RelayStamps:
+    """
+    各继电器所在节点上其元件的导纳元素，用于由阻抗矩阵列求分布系数
+    """
+
+    def __init__(self, model, sequence, relays):
+        stamps = model.element_stamps(sequence)
+        frame = pd.DataFrame({'element_type': np.array(ELEMENT_TYPES, dtype=object)[stamps['element_type']],
+                              'element_index': stamps['element'], 'node': stamps['rows'],
+                              'col': stamps['cols'], 'val': stamps['vals']})
+        merged = relays[['relay', 'element_type', 'element_index', 'node']].merge(
+            frame, on=['element_type', 'element_index', 'node']).sort_values('relay', kind='stable')
+        self.col = merged['col'].values
+        self.val = merged['val'].values
+        n_relay = int(relays['relay'].max()) + 1 if len(relays) else 0
+        self.count = np.bincount(merged['relay'].values, minlength=n_relay)
+        self.start = np.r_[0, np.cumsum(self.count)[:-1]]
+
+    def factors(self, z_columns, relays, columns):
+        """
+        :param z_columns: 阻抗矩阵若干列，形状 (节点数, 列数)
+        :param relays: 继电器位置数组
+        :param columns: 每个继电器对应的故障列号
+        :return: 每单位故障电流从继电器所在节点流入其元件的电流
+        """
+        count = self.count[relays]
+        request = np.repeat(np.arange(len(relays)), count)
+        offset = np.arange(len(request)) - np.repeat(np.cumsum(count) - count, count)
+        entry = self.start[relays][request] + offset
+        with np.errstate(invalid='ignore'):
+            contrib = self.val[entry] * z_columns[self.col[entry], columns[request]]
+        return -(np.bincount(request, contrib.real, len(relays)) + 1j * np.bincount(request, contrib.imag, len(relays)))
+
+
+def _phase_current(d1, d0, shift):
+    """
+    各故障类型下的最大相电流（每单位故障电流），形状 (请求数, 故障类型数)
+    :param shift: 继电器与故障点之间是否相差 30°（经过 D/Y 变压器）
+    """
+    turn = np.where(shift, np.exp(1j * np.pi / 6), 1.)[:, np.newaxis]
+    result = []
+    for fault in FAULT_TYPES:
+        s1, s2, s0 = _SEQUENCE_SHARES[fault]
+        positive = (d1 * turn[:, 0] * s1)[:, np.newaxis] * _PHASE_ROTATION
+        negative = (d1 * np.conj(turn[:, 0]) * s2)[:, np.newaxis] * np.conj(_PHASE_ROTATION)
+        zero = (d0 * s0)[:, np.newaxis]
+        result.append(np.abs(positive + negative + zero).max(axis=1))
+    return np.stack(result, axis=1)
+
+
+def _relay_frame(relays, topology):
+    # 继电器 -> 元件、所在节点、对端节点、是否靠近电源（只含投运线路/变压器上的继电器）
+    t = topology
+    position = t.relay_positions(relays.labels)
+    keep = position >= 0
+    keep[keep] = (t.relay_branch[position[keep]] >= 0) & t.relay_active[position[keep]]
+    position = position[keep]
+    branch = t.relay_branch[position]
+    return pd.DataFrame({
+        'relay': np.flatnonzero(keep),
+        'position': position,
+        'element_type': np.array(ZONE_KINDS, dtype=object)[1 + t.branch_type[branch]],
+        'element_index': t.branch_element[branch],
+        'bus_pos': t.relay_bus_pos[position],
+        'far_bus_pos': t.relay_far_bus_pos[position],
+        'node': t.relay_node[position],
+        'far_node': t.relay_far_node[position],
+        'near': t.relay_near[position],
+        'far': t.relay_far[position],
+    })
+
+
+def _fault_points(rel, pairs):
+    """
+    每个配合对的故障点：馈线对为下级继电器出口（'close-in'）和元件对端母线（'remote'），进线对为所在母线（'bus'）
+    :return: DataFrame，列为 pair, downstream, upstream, point, fault_bus_pos, close_in
+    """
+    down = rel.set_index('relay').loc[pairs['downstream'].values]
+    feeder = (pairs['location'] == 'feeder').values
+    frames = []
+    for point, mask, bus_column, close_in in (('close-in', feeder, 'bus_pos', True),
+                                              ('remote', feeder, 'far_bus_pos', False),
+                                              ('bus', ~feeder, 'bus_pos', False)):
+        frames.append(pd.DataFrame({'pair': np.flatnonzero(mask), 'downstream': pairs['downstream'].values[mask],
+                                    'upstream': pairs['upstream'].values[mask], 'point': point,
+                                    'fault_bus_pos': down[bus_column].values[mask], 'close_in': close_in}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def relay_currents(model, rel, relays, fault_bus_pos, close_in, bus_results, topology):
+    """
+    继电器在各故障点、各故障类型下的最大相电流（kA）
+    :param rel: _relay_frame 的结果
+    :param relays: 继电器位置数组
+    :param fault_bus_pos: 故障母线位置数组
+    :param close_in: 故障点是否在继电器出口（元件侧）
+    :param bus_results: calc_sc_sweep 的母线结果
+    :param topology: TopologyIndex（与 model 的开关状态相同）
+    :return: 形状 (请求数, 故障类型数)
+    """
+    nob = model.node_of_bus
+    fault_nodes, columns = np.unique(nob[fault_bus_pos], return_inverse=True)
+    columns = columns.ravel()
+    d = {}
+    for sequence in SEQUENCES:
+        z_columns = model._zbus_node_columns(sequence, fault_nodes)
+        d[sequence] = _RelayStamps(model, sequence, rel).factors(z_columns, relays, columns)
+        d[sequence] = np.where(close_in, d[sequence] + 1., d[sequence])
+    relay_bus = rel.set_index('relay').loc[relays, 'bus_pos'].values
+    parity = topology.bus_parity()
+    shift = parity[relay_bus] != parity[fault_bus_pos]
+    share = _phase_current(d['positive'], d['zero'], shift)
+    ikss = bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]].values[fault_bus_pos]
+    return share * ikss * (model.vn_kv[fault_bus_pos] / model.vn_kv[relay_bus])[:, np.newaxis]
+
+
+def zone_end_currents(net, bus_results, case='min', lv_tol_percent=6, topology=None):
+    """
+    各装置（element_ends 顺序）在保护范围末端（TopologyIndex.zone_end_bus_pos）故障时的电流（kA）：
+    线路/变压器装置为流过装置的最大相电流（计入并联支路分流），母线装置为母线电流，所在元件停运的装置为 NaN
+    :param bus_results: 与 case 相同方式的 calc_sc_sweep 母线结果
+    :param case: 计算方式
+    :param topology: TopologyIndex，缺省时由 net 建立
+    :return: 形状 (装置数, 故障类型数)
+    """
+    topology = TopologyIndex(net) if topology is None else topology
+    end = topology.zone_end_bus_pos
+    bus_current = bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]] \
+        .reindex(pd.Index(topology.bus_index)).values
+    current = np.where((topology.relay_branch < 0)[:, np.newaxis], bus_current[end], np.nan)
+    # 继电器编号即拓扑索引中的位置
+    rel = _relay_frame(topology, topology)
+    relays = rel['relay'].values
+    if len(relays):
+        model = SequenceModel(net, case, lv_tol_percent)
+        current[relays] = relay_currents(model, rel, relays, end[relays], np.zeros(len(relays), dtype=bool),
+                                         bus_results, topology)
+    return current
+
+
+def check_coordination(net, relays, cases=('max', 'min'), lv_tol_percent=6, margin=DEFAULT_MARGIN):
+    """
+    校核全部上下级继电器对在各故障点、各故障类型、各方式下的配合
+    :param net: pandapower 网络
+    :param relays: RelaySettings，现场实际整定的动作电流和时间特性，或由能动作的定值表转换，例如
+                   RelaySettings.from_setpoints(SetpointEngine(basis='zone_min').setpoint_table(net, 最小方式结果))；
+                   SetpointEngine 缺省的 'bus' 基准定值高于继电器能看到的故障电流，下级继电器都不动作（'no_trip'）
+    :param cases: 计算方式
+    :param margin: 要求的配合级差（秒）
+    :return: DataFrame，列为 case, fault, downstream, upstream, point, fault_bus, i_down_ka, i_up_ka,
+             t_down_s, t_up_s, margin_s, status；status 为 'ok' / 'violation'（级差不足）/
+             'no_backup'（上级不动作）/ 'no_trip'（下级不动作）/ 'no_fault'（故障点失电）
+    """
+    names = relays.names()
+    bus_names = net.bus['name'].values
+    topology = TopologyIndex(net)
+    rel = _relay_frame(relays, topology)
+    points = _fault_points(rel, _pairs(rel, topology))
+    fault_bus = points['fault_bus_pos'].values
+    close_in = points['close_in'].values
+    frames = []
+    for case in cases:
+        with span('coordination', case=case) as s:
+            model = SequenceModel(net, case, lv_tol_percent)
+            bus_results = calc_sc_sweep(net, case, lv_tol_percent, model=model)
+            i_down = relay_currents(model, rel, points['downstream'].values, fault_bus, close_in, bus_results,
+                                    topology)
+            i_up = relay_currents(model, rel, points['upstream'].values, fault_bus, np.zeros_like(close_in),
+                                  bus_results, topology)
+            t_down = relays.operating_times(i_down[..., np.newaxis], points['downstream'].values)[..., 0]
+            t_up = relays.operating_times(i_up[..., np.newaxis], points['upstream'].values)[..., 0]
+            with np.errstate(invalid='ignore'):
+                grading = t_up - t_down
+            status = np.select([np.isnan(i_down), ~np.isfinite(t_down), ~np.isfinite(t_up), grading < margin],
+                               ['no_fault', 'no_trip', 'no_backup', 'violation'], 'ok')
+
+            n_point, n_fault = i_down.shape
+            frames.append(pd.DataFrame({
+                'case': case,
+                'fault': np.tile(np.array(FAULT_TYPES, dtype=object), n_point),
+                'downstream': np.repeat(names[points['downstream'].values], n_fault),
+                'upstream': np.repeat(names[points['upstream'].values], n_fault),
+                'point': np.repeat(points['point'].values, n_fault),
+                'fault_bus': np.repeat(bus_names[fault_bus], n_fault),
+                'i_down_ka': i_down.ravel(),
+                'i_up_ka': i_up.ravel(),
+                't_down_s': t_down.ravel(),
+                't_up_s': t_up.ravel(),
+                'margin_s': np.where(np.isfinite(t_down) & np.isfinite(t_up), grading, np.nan).ravel(),
+                'status': status.ravel(),
+            }))
+            s.rows = len(frames[-1])
+            if (status != 'no_fault').any() and not np.isfinite(t_down).any():
+                warnings.warn(f"no downstream relay trips in case '{case}': relay pickups exceed every fault current "
+                              f"the relays see, check that RelaySettings holds the actual relay settings", stacklevel=2)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, QUANTITIES, calc_sc_sweep
+
+# 设备短路耐受校验（最大方式）
+# 全部断路器、全部电缆的校验量由母线结果按位置数组一次取出，不逐元件循环：
+#     breaking       开断电流 ib ≤ 额定短路开断电流 Isc
+#     making         冲击电流 ip ≤ 额定短路关合电流（Isc 的 2.5 倍，60 Hz 为 2.6 倍，IEC 62271-100）
+#     short_time     热等效电流 ith ≤ Isc·√(tkr/tk)（额定短时耐受电流等于 Isc，持续时间 tkr）
+#     cable_thermal  每回电缆的 ith ≤ 允许短时电流 Ithr(tk)
+# 开断电流取三种故障类型的最大值；ip/ith 只取三相、两相短路（DUTY_FAULT_TYPES）：calc_sc 不给出单相短路的
+# ip/ith，calc_sc_sweep 对单相短路按正序 κ 外推的值不作为校验依据。
+# 断路器位于线路两端、变压器两侧和母线-母线开关处，按所在母线（母联开关取两侧较大者）的短路电流校验，
+# 与 sensitivity.py 相同不计并联支路间的分流。
+# 电缆允许短时电流按 IEC 60949 的绝热公式由每回导体截面计算：
+#     Ithr(tk) = K · S · √(ln((θf + β) / (θi + β)) / tk)
+#     K、β 取决于导体材料（CONDUCTORS），θf 为绝缘的短路允许温度，θi 为短路前导体温度（INSULATION_CLASSES）：
+#     θi = 环境温度 + (长期允许工作温度 − 环境温度) × 负载率²
+# 满载时即 IEC 60364-5-54 的 k·S/√tk（铜芯 XLPE k = 143，铜芯 PVC k = 115）。
+# 每条线路的截面、导体材料、绝缘类别取自 net.line 的 conductor_mm2 / conductor / insulation 列
+# （可在变电站定义的 lines 表中给出），没有截面的线路校验结果为 'no_rating'。
+
+RATING_CHECKS = ('breaking', 'making', 'short_time', 'cable_thermal')
+
+RATING_COLUMNS = ['element_type', 'element', 'side', 'bus', 'check', 'duty_ka', 'rating_ka', 'utilization', 'status']
+
+# 断路器额定短路开断电流（kA）：标量，{母线额定电压: kA}，或与 breaker_list 等长的数组
+DEFAULT_BREAKING_KA = 31.5
+# 额定短时耐受时间（s）
+DEFAULT_RATED_DURATION_S = 4.
+MAKING_FACTOR = {50.: 2.5, 60.: 2.6}
+
+# 只取这些故障类型的 ip/ith 作为校验量
+DUTY_FAULT_TYPES = ('3ph', '2ph')
+
+# 导体材料：(K A·√s/mm², β ℃)，IEC 60949 表 1
+CONDUCTORS = {'Cu': (226., 234.5), 'Al': (148., 228.)}
+# 绝缘类别：(长期允许工作温度 ℃, 短路允许温度 ℃)，IEC 60364-5-54 表 A.54
+INSULATION_CLASSES = {'PVC': (70., 160.), 'XLPE': (90., 250.), 'EPR': (90., 250.)}
+DEFAULT_CONDUCTOR = 'Cu'
+DEFAULT_INSULATION = 'XLPE'
+AMBIENT_DEGREE = 20.
+
+
+def breaker_list(net):
+    """
+    断路器清单：线路两端、变压器两侧、母线-母线开关
+    :return: dict，包含等长数组 element_type / element / side / bus / other_bus（母联开关另一侧母线，其余同 bus）
+    """
+    sw = net.switch[net.switch['et'].values == 'b']
+    parts = [
+        ('line', net.line['name'].values, 'from', net.line.from_bus.values, net.line.from_bus.values),
+        ('line', net.line['name'].values, 'to', net.line.to_bus.values, net.line.to_bus.values),
+        ('trafo', net.trafo['name'].values, 'hv', net.trafo.hv_bus.values, net.trafo.hv_bus.values),
+        ('trafo', net.trafo['name'].values, 'lv', net.trafo.lv_bus.values, net.trafo.lv_bus.values),
+        ('switch', sw['name'].values, '', sw.bus.values, sw.element.values),
+    ]
+    return {
+        'element_type': np.concatenate([np.full(len(names), et, dtype=object) for et, names, _, _, _ in parts]),
+        'element': np.concatenate([np.asarray(names, dtype=object) for _, names, _, _, _ in parts]),
+        'side': np.concatenate([np.full(len(names), side, dtype=object) for _, names, side, _, _ in parts]),
+        'bus': np.concatenate([buses for _, _, _, buses, _ in parts]).astype(np.int64),
+        'other_bus': np.concatenate([other for _, _, _, _, other in parts]).astype(np.int64),
+    }
+
+
+def _worst(bus_results, quantity, pos, faults=FAULT_TYPES):
+    # 各故障类型中的最大值，按母线位置取出（全部失电为 NaN）
+    columns = [f'{fault}_{quantity}_ka' for fault in faults]
+    missing = [column for column in columns if column not in bus_results.columns]
+    if missing:
+        raise KeyError(f"bus results are missing {missing}, compute them with calc_sc_sweep(..., quantities=QUANTITIES)")
+    values = bus_results[columns].to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        worst = np.fmax.reduce(values, axis=1)
+    return worst[pos]
+
+
+def _breaking_ratings(breaking_ka, vn_kv, n):
+    if isinstance(breaking_ka, dict):
+        return pd.Series(breaking_ka, dtype=np.float64).reindex(vn_kv).values
+    return np.broadcast_to(np.asarray(breaking_ka, dtype=np.float64), (n,)).copy()
+
+
+def _line_column(line, column, value, default):
+    # 参数优先，其次 net.line 中的列（缺失值取 default）
+    if value is not None:
+        return np.broadcast_to(np.asarray(value, dtype=object), (len(line),))
+    if column not in line:
+        return np.full(len(line), default, dtype=object)
+    return line[column].where(line[column].notna(), default).values
+
+
+def cable_thermal_rating(net, tk_s=1., loading=1., section_mm2=None, conductor=None, insulation=None,
+                         ambient_degree=AMBIENT_DEGREE):
+    """
+    各线路每回电缆的允许短时电流 Ithr(tk)（kA），IEC 60949 绝热公式
+    :param tk_s: 短路持续时间（s）
+    :param loading: 短路前负载率（相对长期允许电流），缺省按满载
+    :param section_mm2: 每回导体截面（mm²），标量或每条线路一个值，缺省取 net.line['conductor_mm2']
+    :param conductor: 导体材料（CONDUCTORS 的键），缺省取 net.line['conductor']，再缺省为 DEFAULT_CONDUCTOR
+    :param insulation: 绝缘类别（INSULATION_CLASSES 的键），缺省取 net.line['insulation']，再缺省为 DEFAULT_INSULATION
+    :return: 与 net.line 同序的数组，没有截面的线路为 NaN
+    """
+    line = net.line
+    section = _line_column(line, 'conductor_mm2', section_mm2, np.nan).astype(np.float64)
+    conductor = _line_column(line, 'conductor', conductor, DEFAULT_CONDUCTOR)
+    insulation = _line_column(line, 'insulation', insulation, DEFAULT_INSULATION)
+    unknown = (set(conductor) - set(CONDUCTORS)) | (set(insulation) - set(INSULATION_CLASSES))
+    if unknown:
+        raise ValueError(f"unknown conductor material or insulation class {sorted(map(str, unknown))}, "
+                         f"expected one of {sorted(CONDUCTORS)} / {sorted(INSULATION_CLASSES)}")
+    k, beta = np.array([CONDUCTORS[c] for c in conductor], dtype=np.float64).reshape(-1, 2).T
+    operating, limit = np.array([INSULATION_CLASSES[i] for i in insulation], dtype=np.float64).reshape(-1, 2).T
+    initial = ambient_degree + (operating - ambient_degree) * loading ** 2
+    rise = np.log(np.clip((limit + beta) / (initial + beta), 1., None))
+    return k * section * np.sqrt(rise / tk_s) / 1000.
+
+
+def rating_table(net, bus_results=None, tk_s=1., breaking_ka=DEFAULT_BREAKING_KA,
+                 rated_duration_s=DEFAULT_RATED_DURATION_S, loading=1., lv_tol_percent=6):
+    """
+    全部断路器和电缆的短路耐受校验
+    :param net: pandapower 网络
+    :param bus_results: calc_sc_sweep(..., quantities=QUANTITIES, tk_s=tk_s) 的最大方式母线结果，
+                        缺省时按 tk_s 计算
+    :param tk_s: 短路持续时间（s），须与 bus_results 计算 ith 时一致
+    :param breaking_ka: 断路器额定短路开断电流，见 DEFAULT_BREAKING_KA
+    :param rated_duration_s: 断路器额定短时耐受时间
+    :param loading: 电缆短路前负载率
+    :return: 每个元件每项校验一行的 DataFrame，列为 RATING_COLUMNS；
+             status 为 'pass' / 'fail' / 'no_fault'（所在母线失电）/ 'no_rating'（无额定值，如电缆没有截面）
+    """
+    if bus_results is None:
+        bus_results = calc_sc_sweep(net, 'max', lv_tol_percent, quantities=QUANTITIES, tk_s=tk_s)
+    with span('rating') as s:
+        bus_index = pd.Index(bus_results.index)
+        vn = pd.Series(net.bus['vn_kv'].values.astype(np.float64), index=net.bus.index)
+
+        # 断路器：开断、关合、短时耐受
+        breakers = breaker_list(net)
+        pos = bus_index.get_indexer(breakers['bus'])
+        other = bus_index.get_indexer(breakers['other_bus'])
+        faults = {'ib': FAULT_TYPES, 'ip': DUTY_FAULT_TYPES, 'ith': DUTY_FAULT_TYPES}
+        duty = {q: np.fmax(_worst(bus_results, q, pos, faults[q]), _worst(bus_results, q, other, faults[q]))
+                for q in faults}
+        isc = _breaking_ratings(breaking_ka, vn.reindex(breakers['bus']).values, len(pos))
+        making = MAKING_FACTOR.get(float(net.f_hz), MAKING_FACTOR[50.])
+        breaker_duty = np.concatenate([duty['ib'], duty['ip'], duty['ith']])
+        breaker_rating = np.concatenate([isc, making * isc, isc * np.sqrt(rated_duration_s / tk_s)])
+
+        # 电缆：两端母线中较大的 ith，按并联回数分摊到每回
+        line = net.line
+        parallel = line['parallel'].values.astype(np.float64) if 'parallel' in line else np.ones(len(line))
+        ith_line = np.fmax(_worst(bus_results, 'ith', bus_index.get_indexer(line.from_bus.values), DUTY_FAULT_TYPES),
+                           _worst(bus_results, 'ith', bus_index.get_indexer(line.to_bus.values),
+                                  DUTY_FAULT_TYPES)) / parallel
+        cable_rating = cable_thermal_rating(net, tk_s, loading)
+
+        n_breaker = len(pos)
+        duty_ka = np.concatenate([breaker_duty, ith_line])
+        rating_ka = np.concatenate([breaker_rating, cable_rating])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            utilization = duty_ka / rating_ka
+        status = np.select([np.isnan(duty_ka), np.isnan(rating_ka), duty_ka <= rating_ka],
+                           ['no_fault', 'no_rating', 'pass'], 'fail')
+
+        bus_names = pd.Series(net.bus['name'].values, index=net.bus.index)
+        result = pd.DataFrame({
+            'element_type': np.concatenate([np.tile(breakers['element_type'], 3), np.full(len(line), 'line', dtype=object)]),
+            'element': np.concatenate([np.tile(breakers['element'], 3), line['name'].values.astype(object)]),
+            'side': np.concatenate([np.tile(breakers['side'], 3), np.full(len(line), '', dtype=object)]),
+            'bus': np.concatenate([np.tile(bus_names.reindex(breakers['bus']).values, 3),
+                                   bus_names.reindex(line.from_bus.values).values]),
+            'check': np.repeat(np.array(RATING_CHECKS, dtype=object), [n_breaker] * 3 + [len(line)]),
+            'duty_ka': duty_ka,
+            'rating_ka': rating_ka,
+            'utilization': utilization,
+            'status': status,
+        }, columns=RATING_COLUMNS)
+        s.rows = len(result)
+    return result
+
+
+def rating_summary(table):
+    """
+    按元件类型和校验项统计合格、不合格数
+    :param table: rating_table 的结果
+    :return: 以 (element_type, check) 为索引、pass/fail/no_fault/no_rating 为列的 DataFrame
+    """
+    return pd.crosstab([table['element_type'], table['check']], table['status']) \
+        .reindex(columns=['pass', 'fail', 'no_fault', 'no_rating'], fill_value=0)
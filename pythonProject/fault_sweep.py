@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, SequenceModel, fault_currents
+from setpoint_engine import PROTECTION_TYPES
+
+# 沿线路的故障位置扫描
+# 线路 f-t（阻抗 z）上距首端 x（0~1，线路长度的比例）处故障时，故障点的戴维南阻抗为
+#     Z_pp = (1-x)^2·Z_ff + x^2·Z_tt + 2x(1-x)·Z_ft + x(1-x)·z
+# 正序、零序分别计算，Z_ff、Z_tt 为节点阻抗矩阵对角元，Z_ft 取自各线路首端节点的阻抗矩阵列，
+# 因此全部线路、全部故障位置、三种故障类型由一次数组运算得到，不插入临时母线，也不重新分解。
+# 线路电容只在两端计入（与 sc_sweep 的 π 型模型一致），沿线的分布电容忽略；
+# 并联回路按等值线路处理（故障同时发生在各回路的同一位置）。
+# 故障点的额定电压和电压系数按两端母线的值沿线线性插值，两端（x = 0、1）与对应母线的结果相同。
+
+
+def _fractions(points):
+    if np.isscalar(points):
+        if points < 2:
+            raise ValueError("at least two fault positions (both line ends) are needed")
+        return np.linspace(0., 1., int(points))
+    fractions = np.asarray(points, dtype=np.float64)
+    if ((fractions < 0) | (fractions > 1)).any() or (np.diff(fractions) <= 0).any():
+        raise ValueError("fault positions must be increasing fractions of the line length in [0, 1]")
+    return fractions
+
+
+def _intermediate_impedance(model, sequence, z_line, x):
+    # 各线路各位置故障点的戴维南阻抗，形状 (线路数, 位置数)
+    f = model.node_of_bus[model.line_from]
+    t = model.node_of_bus[model.line_to]
+    first, col = np.unique(f, return_inverse=True)
+    z_ft = model._zbus_node_columns(sequence, first)[t, col.ravel()][:, np.newaxis]
+    diag = model.zbus_diagonal(sequence)
+    z_ff = diag[model.line_from][:, np.newaxis]
+    z_tt = diag[model.line_to][:, np.newaxis]
+    with np.errstate(invalid='ignore'):
+        return (1 - x) ** 2 * z_ff + x ** 2 * z_tt + 2 * x * (1 - x) * z_ft + x * (1 - x) * z_line[:, np.newaxis]
+
+
+def line_fault_sweep(net, case='max', lv_tol_percent=6, points=11, r_fault_ohm=0., x_fault_ohm=0., model=None):
+    """
+    计算每条投运线路上若干位置的三种故障短路电流
+    :param net: pandapower 网络
+    :param case: 'max' 或 'min'
+    :param lv_tol_percent: 低压电网电压偏差
+    :param points: 每条线路的故障点数（含两端，等间距），或 0~1 之间递增的位置数组
+    :param model: 已建立的 SequenceModel，可与 calc_sc_sweep 共用
+    :return: LineFaultSweep
+    """
+    x = _fractions(points)
+    if model is None:
+        model = SequenceModel(net, case, lv_tol_percent)
+    with span('line_sweep', case=model.case) as s:
+        z1 = _intermediate_impedance(model, 'positive', model.line_z1, x)
+        z0 = _intermediate_impedance(model, 'zero', model.line_z0, x)
+        # 故障点的额定电压、电压系数由两端母线的值按位置插值
+        f, t = model.line_from[:, np.newaxis], model.line_to[:, np.newaxis]
+        vn = (1 - x) * model.vn_kv[f] + x * model.vn_kv[t]
+        c = (1 - x) * model.c[f] + x * model.c[t]
+        currents = fault_currents(model, z1, z0, r_fault_ohm, x_fault_ohm, vn_kv=vn, c=c)
+        ikss = np.stack([currents[fault] for fault in FAULT_TYPES], axis=1)
+        lines = net.line.loc[model.line_index]
+        result = LineFaultSweep(model.line_index, lines['name'].values, lines['length_km'].values.astype(np.float64),
+                                x, ikss)
+        s.rows = ikss.size
+    return result
+
+
+class LineFaultSweep:
+    """
+    线路故障位置扫描结果
+    ikss 的形状为 (线路数, 故障类型数, 位置数)，位置为 fractions（距首端的长度比例）
+    """
+
+    def __init__(self, line_index, line_names, length_km, fractions, ikss):
+        self.line_index = line_index
+        self.line_names = line_names
+        self.length_km = length_km
+        self.fractions = fractions
+        self.ikss = ikss
+
+    def __len__(self):
+        return len(self.line_index)
+
+    def line(self, name):
+        """
+        某条线路的结果（名称两端空格忽略）
+        :return: 以距首端距离（km）为索引、各故障类型为列的 DataFrame
+        """
+        matches = np.flatnonzero(pd.Series(self.line_names).astype(str).str.strip() == str(name).strip())
+        if len(matches) == 0:
+            raise KeyError(f"line '{name}' is not in the sweep")
+        i = matches[0]
+        return pd.DataFrame({f'{fault}_ikss_ka': self.ikss[i, k] for k, fault in enumerate(FAULT_TYPES)},
+                            index=pd.Index(self.fractions * self.length_km[i], name='distance_km'))
+
+    def to_frame(self):
+        """长格式：line, fault, fraction, distance_km, ikss_ka"""
+        n_line, n_fault, n_point = self.ikss.shape
+        line, fault, point = np.meshgrid(np.arange(n_line), np.arange(n_fault), np.arange(n_point), indexing='ij')
+        return pd.DataFrame({
+            'line': self.line_names[line.ravel()],
+            'fault': np.array(FAULT_TYPES, dtype=object)[fault.ravel()],
+            'fraction': self.fractions[point.ravel()],
+            'distance_km': (self.fractions[point] * self.length_km[line]).ravel(),
+            'ikss_ka': self.ikss.ravel(),
+        })
+
+    def _pickups(self, pickup_ka):
+        # 动作电流统一为 (线路数, 故障类型数) 数组；按名称给出的动作电流与扫描中的线路对齐（名称两端空格忽略）
+        if isinstance(pickup_ka, (pd.Series, pd.DataFrame)):
+            names = pd.Index(self.line_names).astype(str).str.strip()
+            pickup_ka = pickup_ka.set_axis(pickup_ka.index.astype(str).str.strip(), axis=0)
+            if isinstance(pickup_ka, pd.DataFrame):
+                pickup_ka = pickup_ka.reindex(columns=list(FAULT_TYPES))
+            pickup_ka = pickup_ka.reindex(names).values
+        pickup = np.asarray(pickup_ka, dtype=np.float64)
+        if pickup.ndim == 1:
+            pickup = pickup[:, np.newaxis]
+        return np.broadcast_to(pickup, self.ikss.shape[:2])
+
+    def reach(self, pickup_ka):
+        """
+        保护范围：从首端起短路电流不低于动作电流的长度比例（相邻位置间线性插值）
+        :param pickup_ka: 动作电流（一次值，kA），标量、(线路数,) 或 (线路数, 故障类型数) 数组，
+                          或以线路名称为索引的 Series / 以故障类型为列的 DataFrame（如 setpoint_pickups 的结果）
+        :return: 形状为 (线路数, 故障类型数) 的比例，首端即低于动作电流时为 0，全线都满足时为 1
+        """
+        pickup = self._pickups(pickup_ka)[..., np.newaxis]
+        covered = self.ikss >= pickup
+        # 第一个不满足的位置
+        first_out = np.where(covered.all(axis=2), self.ikss.shape[2], covered.argmin(axis=2))
+        j = np.clip(first_out, 1, self.ikss.shape[2] - 1)
+        i_prev = np.take_along_axis(self.ikss, (j - 1)[..., np.newaxis], 2)[..., 0]
+        i_next = np.take_along_axis(self.ikss, j[..., np.newaxis], 2)[..., 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.clip((i_prev - pickup[..., 0]) / (i_prev - i_next), 0., 1.)
+        reach = self.fractions[j - 1] + share * (self.fractions[j] - self.fractions[j - 1])
+        reach = np.where(first_out == 0, 0., np.where(first_out == self.ikss.shape[2], self.fractions[-1], reach))
+        return np.where(np.isnan(pickup[..., 0]) | np.isnan(self.ikss[..., 0]), np.nan, reach)
+
+    def coverage(self, pickup_ka):
+        """
+        保护范围报表
+        :param pickup_ka: 动作电流（一次值，kA），形状同 reach
+        :return: DataFrame，列为 line, fault, pickup_ka, reach_km, coverage_percent
+        """
+        reach = self.reach(pickup_ka)
+        pickup = self._pickups(pickup_ka)
+        return pd.DataFrame({
+            'line': np.repeat(self.line_names, len(FAULT_TYPES)),
+            'fault': np.tile(np.array(FAULT_TYPES, dtype=object), len(self)),
+            'pickup_ka': pickup.ravel(),
+            'reach_km': (reach * self.length_km[:, np.newaxis]).ravel(),
+            'coverage_percent': reach.ravel() * 100,
+        })
+
+
+def setpoint_pickups(setpoint_table, protection='instantaneous', CT_ratio=1.):
+    """
+    由 SetpointTable 中线路首端装置的定值换算动作电流（一次值，kA），供 reach/coverage 使用
+    :param setpoint_table: SetpointEngine.setpoint_table 的结果
+    :param protection: 保护段，PROTECTION_TYPES 之一
+    :param CT_ratio: 计算定值时使用的电流互感器变比（标量，或与定值表行数相同的数组）
+    :return: 以线路名称为索引、各故障类型为列的 DataFrame
+    """
+    labels = setpoint_table.labels
+    rows = np.flatnonzero((labels['element_type'] == 'line') & (labels['side'] == 'from'))
+    setpoints = setpoint_table.setpoints[rows, :, PROTECTION_TYPES.index(protection)]
+    ct = np.asarray(CT_ratio, dtype=np.float64)
+    if ct.ndim:
+        ct = ct[rows, np.newaxis]
+    return pd.DataFrame(setpoints * ct / 1000., index=pd.Index(labels['element'][rows], name='line'),
+                        columns=list(FAULT_TYPES))
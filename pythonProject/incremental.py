@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from sc_sweep import FAULT_TYPES, SEQUENCES, SequenceModel, bus_results_frame, element_ends, fault_currents, \
+    sweep_tables
+from setpoint_engine import SetpointEngine
+
+# 增量重算：交互整定时只修改个别线路/变压器/电源参数，无需重新分解导纳矩阵
+# 设基准导纳矩阵为 Y（已分解，Z = Y^-1），参数修改后 Y' = Y + E·ΔY·E^T，E 为受影响节点的单位列，
+# 由 Woodbury 公式：
+#     Z' = Z - Z·E·(I + ΔY·E^T·Z·E)^-1·ΔY·E^T·Z
+# 只需用原 LU 分解求解 k 列（k 为受影响节点数），即可得到全部母线的新戴维南阻抗。
+# 修改始终相对于基准分解累积，受影响节点超过 max_rank 或拓扑改变时重新分解并更新基准。
+
+# 参与比较的元件表
+TRACKED_TABLES = ('bus', 'line', 'trafo', 'ext_grid', 'switch')
+
+# 判断母线结果是否变化的相对容差
+CHANGE_RTOL = 1e-12
+
+
+def _changed_rows(old, new):
+    # 逐行比较两张表，NaN 与 NaN 视为相等
+    same = np.ones(len(new), dtype=bool)
+    for column in old.columns.intersection(new.columns):
+        a, b = old[column], new[column]
+        equal = (a == b).fillna(False).to_numpy(dtype=bool)
+        same &= equal | (a.isna() & b.isna()).to_numpy(dtype=bool)
+    return new.index[~same]
+
+
+class IncrementalSweep:
+    """
+    可增量更新的短路扫描与定值计算
+    修改 net 中的元件参数后调用 update()，只重算受影响的母线与定值行
+    :param net: pandapower 网络（调用者原地修改）
+    :param case: 'max' 或 'min'
+    :param lv_tol_percent: 低压电网电压偏差
+    :param engine: SetpointEngine，默认使用缺省 K 系数
+    :param max_rank: 低秩修正的最大节点数，超过后重新分解
+    """
+
+    def __init__(self, net, case='max', lv_tol_percent=6, engine=None, max_rank=64,
+                 r_fault_ohm=0., x_fault_ohm=0.):
+        self.net = net
+        self.case = case
+        self.lv_tol_percent = lv_tol_percent
+        self.engine = engine or SetpointEngine()
+        self.max_rank = max_rank
+        self.r_fault_ohm = r_fault_ohm
+        self.x_fault_ohm = x_fault_ohm
+        self._refactor()
+
+    # ------------------------------------------------------------------ 基准
+    def _refactor(self):
+        self.base = SequenceModel(self.net, self.case, self.lv_tol_percent)
+        self.model = self.base
+        self.z = {sequence: self.base.zbus_diagonal(sequence) for sequence in SEQUENCES}
+        self._base_z = dict(self.z)
+        self.bus_results = bus_results_frame(self.base, self.z['positive'], self.z['zero'], self.r_fault_ohm,
+                                             self.x_fault_ohm, index_name=self.net.bus.index.name)
+        self.setpoints = self.engine.setpoint_table(self.net, self.bus_results)
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        return {table: self.net[table].copy() for table in TRACKED_TABLES}
+
+    def changed_elements(self):
+        """
+        自上次求解以来参数发生变化的元件
+        :return: {元件表: 索引列表}
+        """
+        changed = {}
+        for table in TRACKED_TABLES:
+            old = self._snapshot[table]
+            new = self.net[table]
+            if not old.index.equals(new.index):
+                changed[table] = list(new.index.union(old.index))
+                continue
+            rows = _changed_rows(old, new)
+            if len(rows):
+                changed[table] = list(rows)
+        return changed
+
+    def _same_topology(self, model):
+        # 节点合并方式和带电节点集合不变时，基准分解仍可用于低秩修正
+        base = self.base
+        return (model.n_node == base.n_node and np.array_equal(model.bus_index, base.bus_index)
+                and np.array_equal(model.node_of_bus, base.node_of_bus)
+                and all(np.array_equal(model.energized[s], base.energized[s]) for s in SEQUENCES))
+
+    def _low_rank_diagonal(self, model, sequence):
+        """
+        相对基准分解的 Woodbury 修正，返回全部母线的新戴维南阻抗；受影响节点过多时返回 None
+        """
+        delta = (model.ybus[sequence] - self.base.ybus[sequence]).tocoo()
+        touched = np.abs(delta.data) > 0
+        nodes = np.unique(np.concatenate([delta.row[touched], delta.col[touched]]))
+        nodes = nodes[self.base.energized[sequence][nodes]]
+        if len(nodes) == 0:
+            return self._base_z[sequence]
+        if len(nodes) > self.max_rank:
+            return None
+
+        d = delta.tocsr()[nodes][:, nodes].toarray()
+        z_cols = self.base._zbus_node_columns(sequence, nodes)        # (节点数, k)
+        m = np.linalg.solve(np.eye(len(nodes)) + d @ z_cols[nodes], d)
+        rows = z_cols[model.node_of_bus]
+        energized = np.isfinite(rows).all(axis=1)
+        diag = self._base_z[sequence].copy()
+        diag[energized] -= np.einsum('ik,kl,il->i', rows[energized], m, rows[energized])
+        return diag
+
+    # ------------------------------------------------------------------ 更新
+    def update(self):
+        """
+        根据 net 的当前参数更新结果
+        :return: dict，elements 为变化的元件，buses 为结果变化的母线索引，
+                 rows 为重算的定值行位置，refactored 表示是否重新分解
+        """
+        elements = self.changed_elements()
+        if not elements:
+            return {'elements': {}, 'buses': np.array([], dtype=np.int64),
+                    'rows': np.array([], dtype=np.int64), 'refactored': False}
+
+        model = SequenceModel(self.net, self.case, self.lv_tol_percent)
+        z = None
+        if self._same_topology(model):
+            z = {sequence: self._low_rank_diagonal(model, sequence) for sequence in SEQUENCES}
+            if any(v is None for v in z.values()):
+                z = None
+        if z is None:
+            self._refactor()
+            return {'elements': elements, 'buses': self.base.bus_index.copy(),
+                    'rows': np.arange(len(self.setpoints)), 'refactored': True}
+
+        # 只重算阻抗发生变化的母线
+        changed = np.zeros(len(model.bus_index), dtype=bool)
+        for sequence in SEQUENCES:
+            old, new = self.z[sequence], z[sequence]
+            both = np.isfinite(old) & np.isfinite(new)
+            changed |= np.isfinite(old) != np.isfinite(new)
+            changed[both] |= np.abs(new[both] - old[both]) > CHANGE_RTOL * np.abs(old[both])
+        pos = np.flatnonzero(changed)
+        self.model = model
+        self.z = z
+        self._update_bus_rows(pos)
+        rows = self._update_setpoint_rows(pos)
+        self._snapshot = self._take_snapshot()
+        return {'elements': elements, 'buses': model.bus_index[pos], 'rows': rows, 'refactored': False}
+
+    def _update_bus_rows(self, pos):
+        if not len(pos):
+            return
+        z1, z0 = self.z['positive'][pos], self.z['zero'][pos]
+        currents = fault_currents(self.model, z1, z0, self.r_fault_ohm, self.x_fault_ohm, positions=pos)
+        base_z = self.model.base_z_ohm()[pos]
+        values = {f'{fault}_ikss_ka': currents[fault] for fault in FAULT_TYPES}
+        with np.errstate(invalid='ignore'):
+            values['rk_ohm'] = np.where(np.isfinite(z1), z1.real * base_z, np.nan)
+            values['xk_ohm'] = np.where(np.isfinite(z1), z1.imag * base_z, np.nan)
+            values['rk0_ohm'] = np.where(np.isfinite(z0), z0.real * base_z, np.nan)
+            values['xk0_ohm'] = np.where(np.isfinite(z0), z0.imag * base_z, np.nan)
+        for column, value in values.items():
+            self.bus_results.iloc[pos, self.bus_results.columns.get_loc(column)] = value
+
+    def _update_setpoint_rows(self, pos):
+        # 装置清单可能因改名或改接母线而变化，重新取标签；
+        # 只有所在母线结果变化或所接母线改变的行需要重算
+        table = self.setpoints
+        ends = element_ends(self.net)
+        if len(ends['bus']) != len(table):
+            self.setpoints = self.engine.setpoint_table(self.net, self.bus_results)
+            return np.arange(len(self.setpoints))
+        changed_bus = np.zeros(len(self.model.bus_index), dtype=bool)
+        changed_bus[pos] = True
+        end_pos = self.model.bus_positions(ends['bus'])
+        rows = np.flatnonzero(changed_bus[end_pos] | (ends['bus'] != table.labels['bus']))
+        table.labels = ends
+        if len(rows):
+            ikss = self.bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]].values[end_pos[rows]]
+            table.ikss_ka[rows] = ikss
+            table.setpoints[rows] = self.engine.compute(ikss)
+        return rows
+
+    # ------------------------------------------------------------------ 输出
+    def tables(self):
+        """
+        与 run_short_circuit_sweep 相同格式的四张结果表
+        """
+        return sweep_tables(self.net, self.bus_results)
@@ -0,0 +1,230 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+# 可选的分阶段计时：
+#     with span('sweep.solve', case='max', sequence='positive') as s:
+#         ...
+#         s.rows = n
+# 每个 span 记录 阶段、方式、故障类型、运行方式、耗时、行数、内存增量（进程 RSS）等字段，交给当前的 sink。
+# 未启用时 span() 直接返回一个共享的空对象，instrumented 装饰的函数直接调用原函数，开销只有一次全局变量判断。
+# 启用方式：
+#     instrumentation.enable(JsonLinesSink('trace.jsonl'))
+#     或设置环境变量 SC_TRACE=trace.jsonl（以 .prom 结尾时输出 Prometheus 文本格式）
+# 运行方式等上下文字段用 with context(scenario='...') 设置，对其中的全部 span 生效。
+
+TRACE_ENV = 'SC_TRACE'
+
+_sink = None
+_context = contextvars.ContextVar('instrumentation_context', default={})
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class _NullSpan:
+    # 未启用时使用的空 span，所有操作都不做任何事
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, sink, stage, attrs):
+        self.sink = sink
+        self.stage = stage
+        self.attrs = attrs
+        self.rows = None
+
+    def __enter__(self):
+        self._rss = _rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        record = {'stage': self.stage, **_context.get(), **self.attrs,
+                  'duration_s': duration, 'rows': self.rows,
+                  'memory_delta_bytes': _rss_bytes() - self._rss,
+                  'ok': exc_type is None, 'timestamp': time.time()}
+        self.sink.emit(record)
+        return False
+
+
+def span(stage, **attrs):
+    """
+    计时区段
+    :param stage: 阶段名称
+    :param attrs: 附加字段（case、fault、sequence 等）
+    """
+    if _sink is None:
+        return _NULL_SPAN
+    return Span(_sink, stage, attrs)
+
+
+class context:
+    """
+    为其中的全部 span 附加字段，例如 with context(scenario='母联合位'):
+    """
+
+    def __init__(self, **attrs):
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._token = _context.set({**_context.get(), **self.attrs})
+        return self
+
+    def __exit__(self, *exc):
+        _context.reset(self._token)
+        return False
+
+
+def instrumented(stage, fields=('case',)):
+    """
+    函数计时装饰器，fields 中列出的参数（按名称）记录为 span 字段，返回值的长度记为行数
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _sink is None:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            attrs = {name: bound.arguments[name] for name in fields if name in bound.arguments}
+            with span(stage, **attrs) as s:
+                result = func(*args, **kwargs)
+                first = result[0] if isinstance(result, tuple) and result else result
+                s.rows = len(first) if hasattr(first, '__len__') else None
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# ---------------------------------------------------------------------- sinks
+class MemorySink:
+    """把 span 保存在列表中，便于在交互环境中查看"""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """每个 span 追加一行 JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PrometheusTextSink:
+    """
+    按 (stage, case, fault) 汇总次数和总耗时，关闭时写出 Prometheus 文本格式
+    （供 node_exporter textfile collector 采集）
+    """
+
+    LABELS = ('stage', 'case', 'fault', 'scenario')
+
+    def __init__(self, path, prefix='sc_pipeline'):
+        self.path = path
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.count = {}
+        self.seconds = {}
+        self.rows = {}
+
+    def emit(self, record):
+        key = tuple(str(record.get(label, '')) for label in self.LABELS)
+        with self._lock:
+            self.count[key] = self.count.get(key, 0) + 1
+            self.seconds[key] = self.seconds.get(key, 0.) + record['duration_s']
+            self.rows[key] = self.rows.get(key, 0) + (record['rows'] or 0)
+
+    def _labels(self, key):
+        return ','.join(f'{name}="{value}"' for name, value in zip(self.LABELS, key) if value)
+
+    def close(self):
+        lines = []
+        for metric, kind, values in (('span_seconds_total', 'counter', self.seconds),
+                                     ('span_count_total', 'counter', self.count),
+                                     ('span_rows_total', 'counter', self.rows)):
+            lines.append(f'# TYPE {self.prefix}_{metric} {kind}')
+            lines.extend(f'{self.prefix}_{metric}{{{self._labels(key)}}} {value}'
+                         for key, value in sorted(values.items()))
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+def sink_for_path(path):
+    return PrometheusTextSink(path) if path.endswith('.prom') else JsonLinesSink(path)
+
+
+def enable(sink):
+    """启用计时并设置 sink，返回原来的 sink"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def disable():
+    """停止计时并关闭当前 sink"""
+    global _sink
+    sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+
+
+def enabled():
+    return _sink is not None
+
+
+def _enable_from_env():
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        enable(sink_for_path(path))
+        atexit.register(disable)
+
+
+_enable_from_env()
@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import context, span
+from network_factory import cached_tables
+from results_sink import long_results
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+from scenarios import DEFAULT_CASES, _copy_for_scenario, apply_scenario
+from setpoint_engine import PROTECTION_TYPES, SetpointEngine
+
+# 短路计算与保护整定的异步作业服务（只用标准库 asyncio，本机 TCP 或 Unix 套接字）
+#     POST /jobs   请求体为 JSON：
+#         {
+#             "name": "某变电站",
+#             "substation": {"buses": [...], "lines": [...], ...},   # network_factory 的定义，各表为记录列表
+#             "scenarios": [{"name": "base"}, ...],                  # scenarios.py 中的运行方式字典，缺省只算基础方式
+#             "setpoints": {"CT_ratio": 60, "stage_factors": [1, 1.5, 1.8],
+#                           "K_values": {"3ph": {"instantaneous": 1.2, ...}, ...}}
+#         }
+#         响应为 NDJSON 流，每个 运行方式 × 方式 算完即输出一行：
+#             {"event": "accepted", "job": 作业号, "tasks": 任务数, "shared": 是否与进行中的相同作业合并}
+#             {"event": "result", "scenario": ..., "case": ..., "results": [...], "setpoints": [...]}
+#             {"event": "error", "scenario": ..., "case": ..., "error": ...}
+#             {"event": "done", "job": 作业号, "errors": 出错任务数}
+#     GET /health  {"status": "ok", "workers": ..., "jobs": 进行中的作业数}
+# 内容相同的请求（规范化 JSON 的哈希相同）在计算期间只算一次，后到的请求从头回放已完成的结果并继续接收后续结果。
+# 计算在固定大小的进程池中进行，工作进程启动时预先导入 pandapower 并在进程内缓存已建立的网络，
+# 服务启动时即把全部工作进程拉起，第一个请求不必等待进程启动和导入。
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 同时进行的作业数上限，超过时返回 503
+DEFAULT_MAX_JOBS = 16
+
+# 工作进程内按定义哈希缓存的网络
+_networks = {}
+
+
+def _init_worker():
+    # 网络缓存未命中时建网需要 pandapower，预先导入，避免在第一个请求里花数秒导入
+    try:
+        import pandapower.shortcircuit  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _network(key, spec):
+    net = _networks.get(key)
+    if net is None:
+        net = _networks[key] = cached_tables(spec)
+    return net
+
+
+def _setpoint_engine(options):
+    # JSON 中的 K 系数为 {故障类型: {保护段: K}}
+    options = dict(options or {})
+    k_values = options.pop('K_values', None)
+    if k_values is not None:
+        options['K_values'] = {(fault, protection): k for fault, stages in k_values.items()
+                               for protection, k in stages.items()
+                               if fault in FAULT_TYPES and protection in PROTECTION_TYPES}
+    return SetpointEngine(**options)
+
+
+def _records(frame):
+    # NaN 输出为 null
+    return json.loads(frame.to_json(orient='records', force_ascii=False, double_precision=15))
+
+
+def _run_case(key, spec, scenario, case, setpoint_options):
+    """
+    工作进程中计算一个 运行方式 × 方式：短路电流长表和定值表
+    """
+    with context(scenario=scenario['name']):
+        net = _network(key, spec)
+        with span('scenario.apply'):
+            net = apply_scenario(_copy_for_scenario(net, scenario), scenario)
+        bus_results = calc_sc_sweep(net, case, scenario.get('lv_tol_percent', 6))
+        setpoints = _setpoint_engine(setpoint_options).setpoint_table(net, bus_results).to_frame()
+        return {'event': 'result', 'scenario': scenario['name'], 'case': case,
+                'results': _records(long_results(net, bus_results)), 'setpoints': _records(setpoints)}
+
+
+def request_key(request):
+    """
+    作业请求的内容哈希（键顺序无关），用于合并相同的进行中请求
+    """
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _tasks(request):
+    scenarios = request.get('scenarios') or [{'name': 'base'}]
+    names = [s['name'] for s in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("scenario names must be unique")
+    return [(scenario, case) for scenario in scenarios for case in scenario.get('cases', DEFAULT_CASES)]
+
+
+class _Job:
+    """
+    一个进行中的作业：已产生的事件列表，订阅者按序号读取，新事件到达时唤醒
+    """
+
+    def __init__(self, key, n_tasks):
+        self.key = key
+        self.n_tasks = n_tasks
+        self.events = []
+        self.done = False
+        self.task = None
+        self.changed = asyncio.Condition()
+
+    async def publish(self, event, done=False):
+        async with self.changed:
+            self.events.append(event)
+            self.done = done
+            self.changed.notify_all()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.events) > i or self.done)
+                events = self.events[i:]
+                finished = self.done
+            for event in events:
+                yield event
+            i += len(events)
+            if finished and i == len(self.events):
+                return
+
+
+class JobService:
+    """
+    :param max_workers: 工作进程数，None 为 CPU 核数
+    :param max_jobs: 同时进行的作业数上限
+    """
+
+    def __init__(self, max_workers=None, max_jobs=DEFAULT_MAX_JOBS):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.executor = None
+        self.jobs = {}
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+        # 进程池按需启动进程，提交与进程数相同的空任务把全部进程拉起并完成导入
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.max_workers)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def submit(self, request):
+        """
+        提交作业，内容相同的作业正在进行时直接返回该作业
+        :return: (作业, 是否与进行中的作业合并)
+        """
+        key = request_key(request)
+        job = self.jobs.get(key)
+        if job is not None:
+            return job, True
+        if len(self.jobs) >= self.max_jobs:
+            raise OverflowError("too many jobs in progress")
+        tasks = _tasks(request)
+        job = self.jobs[key] = _Job(key, len(tasks))
+        # 保留任务引用，避免计算中的任务被回收
+        job.task = asyncio.get_running_loop().create_task(self._run(job, request, tasks))
+        return job, False
+
+    async def _run(self, job, request, tasks):
+        loop = asyncio.get_running_loop()
+        spec = request['substation']
+        spec_key = request_key(spec)
+        errors = 0
+
+        async def run_one(scenario, case):
+            nonlocal errors
+            try:
+                event = await loop.run_in_executor(self.executor, _run_case, spec_key, spec, scenario, case,
+                                                   request.get('setpoints'))
+            except Exception as e:
+                errors += 1
+                event = {'event': 'error', 'scenario': scenario['name'], 'case': case,
+                         'error': f"{type(e).__name__}: {e}"}
+            await job.publish(event)
+
+        try:
+            await asyncio.gather(*(run_one(scenario, case) for scenario, case in tasks))
+        finally:
+            # 先移出进行中列表再发结束事件，之后到达的相同请求重新计算
+            self.jobs.pop(job.key, None)
+            await job.publish({'event': 'done', 'job': job.key[:12], 'errors': errors}, done=True)
+
+    # ------------------------------------------------------------------ HTTP
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await _read_request(reader)
+            if method == 'GET' and path == '/health':
+                await _respond(writer, 200, [{'status': 'ok', 'workers': self.max_workers, 'jobs': len(self.jobs)}])
+            elif method == 'POST' and path == '/jobs':
+                await self._stream_job(writer, body)
+            else:
+                await _respond(writer, 404, [{'event': 'error', 'error': f"no route for {method} {path}"}])
+        except (ValueError, KeyError) as e:
+            await _respond(writer, 400, [{'event': 'error', 'error': str(e)}])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_job(self, writer, body):
+        request = json.loads(body)
+        if not isinstance(request, dict) or 'substation' not in request:
+            raise ValueError("request must be a JSON object with a 'substation' definition")
+        try:
+            job, shared = self.submit(request)
+        except OverflowError as e:
+            await _respond(writer, 503, [{'event': 'error', 'error': str(e)}])
+            return
+        await _respond(writer, 200, [{'event': 'accepted', 'job': job.key[:12], 'tasks': job.n_tasks,
+                                      'shared': shared}])
+        async for event in job.subscribe():
+            writer.write(_line(event))
+            await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        """
+        启动服务并一直运行；给定 path 时监听 Unix 套接字
+        """
+        await self.start()
+        try:
+            if path:
+                server = await asyncio.start_unix_server(self.handle, path=path)
+            else:
+                server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+def _line(event):
+    return (json.dumps(event, ensure_ascii=False) + '\n').encode()
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) < 2:
+        raise ValueError("malformed request line")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return request_line[0].upper(), request_line[1], body
+
+
+async def _respond(writer, status, events):
+    # 响应不定长，以关闭连接结束（Connection: close）
+    writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/x-ndjson\r\n"
+                 f"Connection: close\r\n\r\n".encode())
+    for event in events:
+        writer.write(_line(event))
+    await writer.drain()
+
+
+# ---------------------------------------------------------------------- 客户端
+async def submit_job(request, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    """
+    向本机服务提交作业并逐个产出事件（异步生成器）
+    :param request: 作业请求字典（见模块说明）
+    :param path: Unix 套接字路径，给定时忽略 host/port
+    """
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(request, ensure_ascii=False).encode()
+    writer.write(f"POST /jobs HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    try:
+        status = (await reader.readline()).decode('latin-1').split()
+        while (await reader.readline()).strip():
+            pass
+        async for line in reader:
+            if line.strip():
+                event = json.loads(line)
+                if status[1] != '200' and event.get('event') == 'error':
+                    raise RuntimeError(f"job rejected ({status[1]}): {event['error']}")
+                yield event
+    finally:
+        writer.close()
+
+
+def run_job(request, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    """
+    同步版本：提交作业并返回全部事件列表
+    """
+    async def collect():
+        return [event async for event in submit_job(request, host, port, path)]
+    return asyncio.run(collect())
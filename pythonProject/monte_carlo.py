@@ -0,0 +1,343 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, SEQUENCES, SequenceModel, fault_currents
+from setpoint_engine import SetpointEngine
+
+# 蒙特卡洛短路计算：电源短路容量、变压器短路电压（制造公差）、分接位置和单相接地过渡电阻随机取值，
+# 给出每条母线短路电流、每个保护装置定值的分位数包络。
+# 全部样本共用一次基准 LU 分解。采样参数只改变电源母线和变压器两侧节点上的导纳元素，
+# 设这些节点为 U（k 个），第 s 个样本的导纳矩阵为 Y + E·ΔY_s·E^T，由 Woodbury 公式（同 incremental.py）：
+#     diag(Z_s) = diag(Z) - diag(Z_U · M_s · Z_U^T)，M_s = (I + ΔY_s·Z_UU)^-1·ΔY_s
+# Z_U 为基准阻抗矩阵的 k 列，只求一次；各样本的 ΔY_s 叠成 (样本, k, k) 数组批量求 M_s，
+# 全部母线的对角元由一次矩阵乘法 (样本, k²) @ (k², 母线) 得到，不逐样本调用 calc_sc。
+# 这一批量求解（BatchedFaultModel）也用于 timeseries.py 中同一拓扑下不同电源强度的时段。
+# 抽样的分接位置按潮流模型计入变比与阻抗；不抽分接位置时按额定变比计算（同 sc_sweep.py 与 pandapower 的 calc_sc）。
+# 样本的短路电流以 float32 保存（样本数 × 母线数 × 3），十万个样本、两百条母线约 240 MB。
+
+# 缺省输出的分位数（%）
+DEFAULT_PERCENTILES = (1., 5., 50., 95., 99.)
+
+# 变压器短路电压允许偏差（IEC 60076-1）：vk < 10% 时 ±10%，否则 ±7.5%
+VK_TOLERANCE = ((10., 10.), (np.inf, 7.5))
+
+# 每批样本中间数组（样本 × 母线 × k²）的上限字节数
+_BATCH_BYTES = 64 * 2 ** 20
+
+
+def vk_tolerance_percent(vk_percent):
+    """
+    各变压器短路电压的允许偏差（相对值，%）
+    """
+    vk_percent = np.asarray(vk_percent, dtype=np.float64)
+    tolerance = np.full(vk_percent.shape, np.nan)
+    for upper, value in reversed(VK_TOLERANCE):
+        tolerance[vk_percent < upper] = value
+    return tolerance
+
+
+def _percentile_name(q):
+    return f'p{q:g}'
+
+
+class BatchedFaultModel:
+    """
+    同一拓扑下一批参数（电源短路容量、短路电压、分接位置、单相过渡电阻）的短路电流，共用一次基准分解
+    :param net: pandapower 网络
+    :param case: 运行方式（电压系数、电源 R/X、线路温度取自该方式）
+    """
+
+    def __init__(self, net, case='max', lv_tol_percent=6):
+        self.net = net
+        with span('monte_carlo.factor', case=case):
+            self.model = model = SequenceModel(net, case, lv_tol_percent)
+            for sequence in SEQUENCES:
+                model.factor(sequence)
+        self._prepare()
+
+    # ------------------------------------------------------------------ 基准
+    def _prepare(self):
+        # 受采样影响的节点及基准阻抗矩阵的对应列
+        model = self.model
+        nob = model.node_of_bus
+        nodes = np.unique(nob[np.concatenate([model.ext_grid_bus, model.trafo_hv, model.trafo_lv])])
+        self._base = {}
+        for sequence in SEQUENCES:
+            touched = nodes[model.energized[sequence][nodes]]
+            z_cols = model._zbus_node_columns(sequence, touched)          # (节点数, k)
+            rows = z_cols[nob]
+            energized = np.isfinite(rows).all(axis=1)
+            # 对角元修正量 = M_s 展平后与 rows_ik·rows_il 的乘积之和
+            pairs = (rows[energized, :, np.newaxis] * rows[energized, np.newaxis, :]).reshape(energized.sum(), -1)
+            local = np.full(model.n_node, -1)
+            local[touched] = np.arange(len(touched))
+            self._base[sequence] = {
+                'diag': model.zbus_diagonal(sequence),
+                'z_uu': z_cols[touched],
+                'pairs': pairs,
+                'energized': energized,
+                'local': local,
+            }
+        self._base_stamps = {sequence: self._stamps(sequence, *self._impedances()) for sequence in SEQUENCES}
+
+    def _impedances(self, samples=None):
+        # (变比, 变压器 z1, 变压器 z0, 电源 z1, 电源 z0)，样本给定时带前导样本维
+        model = self.model
+        samples = samples or {}
+        ratio, _, tz1, tz0 = model.transformer_impedances(samples.get('vk_percent'), samples.get('tap_pos'))
+        ez1, ez0 = model.ext_grid_impedances(samples.get('s_sc_mva'))
+        return ratio, tz1, tz0, ez1, ez0
+
+    def _stamps(self, sequence, ratio, tz1, tz0, ez1, ez0):
+        # 受采样影响的导纳元素：[(局部行, 局部列, 值)]，值的最后一维为元件，与 element_stamps 一致
+        model = self.model
+        local = self._base[sequence]['local']
+        nob = model.node_of_bus
+        hv, lv, eg = local[nob[model.trafo_hv]], local[nob[model.trafo_lv]], local[nob[model.ext_grid_bus]]
+        if sequence == 'positive':
+            y = 1 / tz1
+            return [(hv, hv, y / ratio ** 2), (lv, lv, y), (hv, lv, -y / ratio), (lv, hv, -y / ratio),
+                    (eg, eg, 1 / ez1)]
+        vg = np.char.lower(model.trafo_vector_group.astype('U8'))
+        dyn = np.isin(vg, ('dyn', 'yyn'))
+        ynd = np.isin(vg, ('ynd', 'yny'))
+        y0 = 1 / tz0
+        return [(lv[dyn], lv[dyn], y0[..., dyn]), (hv[ynd], hv[ynd], y0[..., ynd]), (eg, eg, 1 / ez0)]
+
+    def base_samples(self, n_samples, **values):
+        """
+        各参数取网络中的原值（分接头取额定位置 tap_neutral，或 values 中给定的值）的一组样本，格式同 MonteCarloStudy.draw()
+        :param values: s_sc_mva / vk_percent / tap_pos / r_fault_ohm，可广播到 (样本, 元件) 或 (样本,)
+        """
+        p = self.model.trafo_params
+        samples = {'s_sc_mva': self.model.ext_grid_params['s_sc_mva'], 'vk_percent': p['vk_percent'],
+                   'tap_pos': p['tap_neutral'], 'r_fault_ohm': 0.}
+        shapes = {name: np.shape(value) for name, value in samples.items()}
+        samples.update(values)
+        return {name: np.broadcast_to(np.asarray(value, dtype=np.float64), (n_samples,) + shapes[name]).copy()
+                for name, value in samples.items()}
+
+    # ------------------------------------------------------------------ 求解
+    def _diagonals(self, sequence, stamps):
+        # 一批样本的戴维南阻抗 (样本, 母线)
+        base = self._base[sequence]
+        n_samples = len(next(iter(stamps))[2])
+        k = len(base['z_uu'])
+        diag = np.broadcast_to(base['diag'], (n_samples, len(base['diag']))).copy()
+        if not k:
+            return diag
+        delta = np.zeros((n_samples, k, k), dtype=np.complex128)
+        for (rows, cols, vals), (_, _, base_vals) in zip(stamps, self._base_stamps[sequence]):
+            change = vals - base_vals
+            for j in np.flatnonzero((rows >= 0) & (cols >= 0)):
+                delta[:, rows[j], cols[j]] += change[:, j]
+        m = np.linalg.solve(np.eye(k) + delta @ base['z_uu'], delta)
+        diag[:, base['energized']] -= m.reshape(n_samples, -1) @ base['pairs'].T
+        return diag
+
+    def currents(self, samples):
+        """
+        计算给定样本的短路电流
+        :param samples: base_samples() / MonteCarloStudy.draw() 格式的样本
+        :return: 形状为 (样本, 母线, 3) 的 float32 数组（kA），列顺序同 FAULT_TYPES
+        """
+        n_samples = len(samples['r_fault_ohm'])
+        n_bus = len(self.model.bus_index)
+        k = max(len(base['z_uu']) for base in self._base.values())
+        batch = max(1, int(_BATCH_BYTES // (16 * max(n_bus, 1) * max(k * k, 1))))
+        currents = np.empty((n_samples, n_bus, len(FAULT_TYPES)), dtype=np.float32)
+        with span('monte_carlo.evaluate', samples=n_samples) as s:
+            for start in range(0, n_samples, batch):
+                part = slice(start, min(start + batch, n_samples))
+                chunk = {name: values[part] for name, values in samples.items()}
+                impedances = self._impedances(chunk)
+                z1, z0 = (self._diagonals(sequence, self._stamps(sequence, *impedances)) for sequence in SEQUENCES)
+                bolted = fault_currents(self.model, z1)
+                ground = fault_currents(self.model, z1, z0, chunk['r_fault_ohm'][:, np.newaxis])
+                currents[part, :, 0] = bolted['3ph']
+                currents[part, :, 1] = bolted['2ph']
+                currents[part, :, 2] = ground['1ph']
+            s.rows = n_samples * n_bus
+        return currents
+
+
+class MonteCarloStudy(BatchedFaultModel):
+    """
+    短路电流蒙特卡洛计算，各参数在给定范围内均匀分布
+    :param net: pandapower 网络
+    :param case: 基准运行方式（电压系数、电源 R/X、线路温度取自该方式）
+    :param s_sc_mva: 电源短路容量范围 (下限, 上限)，标量或每个电源一个值；
+                     缺省为各电源的 s_sc_min_mva ~ s_sc_max_mva
+    :param correlated_source: 为 True 时各电源在各自范围内取相同的相对位置（同一系统运行状态）
+    :param vk_tolerance: 短路电压相对偏差（%），标量或每台变压器一个值，缺省按 VK_TOLERANCE；0 表示不变
+    :param taps: 是否在 tap_min ~ tap_max 内随机取分接位置（为 False 或未定义分接头的变压器按额定变比）
+    :param r_fault_ohm: 单相接地过渡电阻范围 (下限, 上限)，三相、两相短路按金属性短路计算
+    :param seed: 随机数种子
+    """
+
+    def __init__(self, net, case='max', lv_tol_percent=6, s_sc_mva=None, correlated_source=True, vk_tolerance=None,
+                 taps=True, r_fault_ohm=(0., 0.), seed=None):
+        super().__init__(net, case, lv_tol_percent)
+        self.correlated_source = correlated_source
+        self.taps = taps
+        self.r_fault_ohm = tuple(np.broadcast_to(np.asarray(r_fault_ohm, dtype=np.float64), (2,)))
+        self.rng = np.random.default_rng(seed)
+        model = self.model
+
+        eg = net.ext_grid.loc[model.ext_grid_index]
+        if s_sc_mva is None:
+            for col in ('s_sc_min_mva', 's_sc_max_mva'):
+                if col not in eg.columns:
+                    raise ValueError(f"{col} needs to be specified for external grid, or pass s_sc_mva")
+            s_sc_mva = (eg['s_sc_min_mva'].values, eg['s_sc_max_mva'].values)
+        n_eg = len(model.ext_grid_index)
+        self.s_sc_range = tuple(np.broadcast_to(np.asarray(s, dtype=np.float64), (n_eg,)) for s in s_sc_mva)
+
+        vk = model.trafo_params['vk_percent']
+        tolerance = vk_tolerance_percent(vk) if vk_tolerance is None else \
+            np.broadcast_to(np.asarray(vk_tolerance, dtype=np.float64), vk.shape)
+        self.vk_range = (vk * (1 - tolerance / 100), vk * (1 + tolerance / 100))
+
+        p = model.trafo_params
+        self.has_tap = np.isfinite(p['tap_min']) & np.isfinite(p['tap_max']) & np.isfinite(p['tap_step_percent']) \
+            & np.isin(p['tap_side'], ('hv', 'lv'))
+
+    def draw(self, n_samples):
+        """
+        抽取样本
+        :return: dict，s_sc_mva (样本, 电源)、vk_percent / tap_pos (样本, 变压器)、r_fault_ohm (样本,)
+        """
+        rng = self.rng
+        n_eg = len(self.model.ext_grid_index)
+        low, high = self.s_sc_range
+        u = rng.random((n_samples, 1)) if self.correlated_source else rng.random((n_samples, n_eg))
+        samples = {'s_sc_mva': low + u * (high - low)}
+
+        low, high = self.vk_range
+        samples['vk_percent'] = low + rng.random((n_samples, len(low))) * (high - low)
+
+        p = self.model.trafo_params
+        tap_pos = np.broadcast_to(p['tap_neutral'], (n_samples, len(p['tap_neutral']))).copy()
+        if self.taps and self.has_tap.any():
+            t = self.has_tap
+            tap_pos[:, t] = rng.integers(p['tap_min'][t].astype(np.int64), p['tap_max'][t].astype(np.int64),
+                                         size=(n_samples, t.sum()), endpoint=True)
+        samples['tap_pos'] = tap_pos
+
+        low, high = self.r_fault_ohm
+        samples['r_fault_ohm'] = low + rng.random(n_samples) * (high - low)
+        return samples
+
+    def evaluate(self, samples):
+        """
+        计算给定样本的短路电流
+        :param samples: draw() 的结果（或相同格式的自定义样本）
+        :return: MonteCarloResult
+        """
+        return MonteCarloResult(self.net, self.model, samples, self.currents(samples))
+
+    def run(self, n_samples):
+        """
+        抽样并计算
+        :return: MonteCarloResult
+        """
+        return self.evaluate(self.draw(n_samples))
+
+
+class MonteCarloResult:
+    """
+    :param samples: 样本参数
+    :param currents: 短路电流（kA），形状为 (样本, 母线, 3)，列顺序同 FAULT_TYPES，失电母线为 NaN
+    """
+
+    def __init__(self, net, model, samples, currents):
+        self.net = net
+        self.model = model
+        self.samples = samples
+        self.currents = currents
+        self._percentiles = {}
+
+    def __len__(self):
+        return self.currents.shape[0]
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        """
+        :return: 形状为 (分位数, 母线, 3) 的数组（按分位数组合缓存）
+        """
+        key = tuple(float(q) for q in percentiles)
+        if key not in self._percentiles:
+            with span('monte_carlo.percentiles', samples=len(self)):
+                # 样本维放到最后并连续存放，按行求分位数
+                values = np.ascontiguousarray(self.currents.reshape(len(self), -1).T)
+                self._percentiles[key] = np.percentile(values, key, axis=1).astype(np.float64) \
+                    .reshape(len(key), *self.currents.shape[1:])
+        return self._percentiles[key]
+
+    def _bus_frame(self, values):
+        # (母线, 3) 数组 -> calc_sc_sweep 格式的母线结果
+        return pd.DataFrame({f'{fault}_ikss_ka': values[:, i] for i, fault in enumerate(FAULT_TYPES)},
+                            index=pd.Index(self.model.bus_index, name=self.net.bus.index.name))
+
+    def percentile_results(self, q):
+        """
+        某一分位数的母线结果，格式同 calc_sc_sweep（以母线索引为索引，列为 {故障}_ikss_ka），
+        可直接用于 SetpointEngine.setpoint_table 等
+        """
+        return self._bus_frame(self.percentiles((q,))[0])
+
+    def bus_envelope(self, percentiles=DEFAULT_PERCENTILES):
+        """
+        各母线短路电流的分位数包络
+        :return: 以母线索引为索引的 DataFrame，列为 bus_name、各故障类型的 {故障}_ikss_{p分位数}_ka
+                 以及 {故障}_ikss_min_ka / {故障}_ikss_max_ka
+        """
+        values = self.percentiles(percentiles)
+        data = {'bus_name': self.net.bus['name'].reindex(self.model.bus_index).values}
+        with np.errstate(invalid='ignore'):
+            low, high = self.currents.min(axis=0), self.currents.max(axis=0)
+        for i, fault in enumerate(FAULT_TYPES):
+            data[f'{fault}_ikss_min_ka'] = low[:, i].astype(np.float64)
+            for j, q in enumerate(percentiles):
+                data[f'{fault}_ikss_{_percentile_name(q)}_ka'] = values[j, :, i]
+            data[f'{fault}_ikss_max_ka'] = high[:, i].astype(np.float64)
+        return pd.DataFrame(data, index=pd.Index(self.model.bus_index, name=self.net.bus.index.name))
+
+    def setpoint_envelope(self, engine=None, percentiles=DEFAULT_PERCENTILES):
+        """
+        各保护装置定值的分位数包络。定值与短路电流成正比（K、变比为正），
+        装置定值的分位数即所在母线短路电流分位数对应的定值
+        :param engine: SetpointEngine，缺省使用缺省 K 系数
+        :return: 每个分位数一组行的长格式 DataFrame，首列为 percentile，其余列同 SetpointTable.to_frame()
+        """
+        engine = engine or SetpointEngine()
+        values = self.percentiles(percentiles)
+        frames = []
+        for q, bus_values in zip(percentiles, values):
+            frame = engine.setpoint_table(self.net, self._bus_frame(bus_values)).to_frame()
+            frame.insert(0, 'percentile', q)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def samples_frame(self):
+        """
+        样本参数表：每个样本一行，列为 s_sc_mva_{电源}、vk_percent_{变压器}、tap_pos_{变压器}、r_fault_ohm
+        """
+        data = {}
+        for name, index in (('s_sc_mva', self.model.ext_grid_index), ('vk_percent', self.model.trafo_index),
+                            ('tap_pos', self.model.trafo_index)):
+            for j, element in enumerate(index):
+                data[f'{name}_{element}'] = self.samples[name][:, j]
+        data['r_fault_ohm'] = self.samples['r_fault_ohm']
+        return pd.DataFrame(data)
+
+
+def monte_carlo_study(net, n_samples, case='max', lv_tol_percent=6, engine=None, percentiles=DEFAULT_PERCENTILES,
+                      **kwargs):
+    """
+    一次完成抽样、计算和包络
+    :param kwargs: 传给 MonteCarloStudy（s_sc_mva、vk_tolerance、taps、r_fault_ohm、seed 等）
+    :return: (母线包络, 定值包络)
+    """
+    result = MonteCarloStudy(net, case, lv_tol_percent, **kwargs).run(n_samples)
+    return result.bus_envelope(percentiles), result.setpoint_envelope(engine, percentiles)
@@ -0,0 +1,260 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+import pandas as pd
+
+# 网络工厂：由表格形式的变电站定义批量建立 pandapower 网络，并按内容哈希缓存到磁盘
+# 定义（spec）是一个字典，键为下列表名，值为 DataFrame（或可转换为 DataFrame 的记录列表），
+# 母线一律用名称引用：
+#     buses      name, vn_kv
+#     switches   bus, element, et, closed, name          （et='b' 时 element 为母线名称）
+#     ext_grids  bus, vm_pu, s_sc_max_mva, s_sc_min_mva, rx_max, rx_min, x0x_max, ...
+#     trafos     hv_bus, lv_bus, 以及 create_transformers_from_parameters 的参数
+#     lines      from_bus, to_bus, length_km, r_ohm_per_km, x_ohm_per_km, name, ...
+#     loads      bus, p_mw, q_mvar, name
+
+SPEC_TABLES = ('buses', 'switches', 'ext_grids', 'trafos', 'lines', 'loads')
+
+# 线路缺省参数，与原 add_elements 中的取值一致
+LINE_DEFAULTS = {'c_nf_per_km': 0., 'max_i_ka': 1., 'c0_nf_per_km': 0., 'endtemp_degree': 80.}
+
+# 修改建网逻辑时递增，使旧缓存失效
+FACTORY_VERSION = 1
+
+CACHE_DIR_ENV = 'SC_NETWORK_CACHE'
+
+# 导入 pandapower 需要数秒（会连带导入绘图、Excel 等模块），因此只在真正建网时导入；
+# 只做短路计算的调用者可使用 cached_tables，全程无需导入 pandapower
+NET_SCALARS = ('name', 'f_hz', 'sn_mva')
+
+
+def normalize_spec(spec):
+    """
+    把定义中的各表统一为 DataFrame，缺失的表视为空表
+    """
+    normalized = {}
+    for table in SPEC_TABLES:
+        value = spec.get(table)
+        if value is None:
+            value = pd.DataFrame()
+        elif not isinstance(value, pd.DataFrame):
+            value = pd.DataFrame(value)
+        normalized[table] = value.reset_index(drop=True)
+    return normalized
+
+
+def _bus_ids(bus_lookup, names, table):
+    ids = bus_lookup.reindex(names).values
+    if np.isnan(ids.astype(np.float64)).any():
+        missing = sorted(set(np.asarray(names)[np.isnan(ids.astype(np.float64))]))
+        raise KeyError(f"{table} reference unknown buses: {missing}")
+    return ids.astype(np.int64)
+
+
+def _kwargs(df, exclude):
+    return {col: df[col].values for col in df.columns if col not in exclude}
+
+
+def add_spec_elements(net, spec):
+    """
+    按定义向 net 批量添加母线、开关、外部电网、变压器、线路和负荷
+    :param net: pandapower 网络
+    :param spec: 变电站定义
+    :return: 母线名称 -> 母线索引 的 Series
+    """
+    import pandapower as pp
+
+    spec = normalize_spec(spec)
+
+    # 母线
+    buses = spec['buses']
+    if buses['name'].duplicated().any():
+        raise ValueError("bus names must be unique within a substation")
+    bus_index = pp.create_buses(net, len(buses), vn_kv=buses['vn_kv'].values, name=buses['name'].values,
+                                **_kwargs(buses, ('name', 'vn_kv')))
+    bus_lookup = pd.Series(np.asarray(bus_index), index=buses['name'].values)
+
+    # 外部电网（数量很少，逐个创建，但零序参数直接作为参数传入）
+    ext_grids = spec['ext_grids']
+    if len(ext_grids):
+        eg_buses = _bus_ids(bus_lookup, ext_grids['bus'].values, 'ext_grids')
+        for eg_bus, (_, row) in zip(eg_buses, ext_grids.iterrows()):
+            pp.create_ext_grid(net, bus=eg_bus, **row.drop('bus').dropna().to_dict())
+
+    # 变压器
+    trafos = spec['trafos']
+    if len(trafos):
+        pp.create_transformers_from_parameters(
+            net, hv_buses=_bus_ids(bus_lookup, trafos['hv_bus'].values, 'trafos'),
+            lv_buses=_bus_ids(bus_lookup, trafos['lv_bus'].values, 'trafos'),
+            **_kwargs(trafos, ('hv_bus', 'lv_bus')))
+
+    # 线路：零序参数缺省与正序相同
+    lines = spec['lines']
+    if len(lines):
+        lines = lines.copy()
+        for col, default in LINE_DEFAULTS.items():
+            if col not in lines.columns:
+                lines[col] = default
+        if 'r0_ohm_per_km' not in lines.columns:
+            lines['r0_ohm_per_km'] = lines['r_ohm_per_km']
+        if 'x0_ohm_per_km' not in lines.columns:
+            lines['x0_ohm_per_km'] = lines['x_ohm_per_km']
+        pp.create_lines_from_parameters(
+            net, from_buses=_bus_ids(bus_lookup, lines['from_bus'].values, 'lines'),
+            to_buses=_bus_ids(bus_lookup, lines['to_bus'].values, 'lines'),
+            **_kwargs(lines, ('from_bus', 'to_bus')))
+
+    # 负荷
+    loads = spec['loads']
+    if len(loads):
+        pp.create_loads(net, buses=_bus_ids(bus_lookup, loads['bus'].values, 'loads'),
+                        **_kwargs(loads, ('bus',)))
+
+    # 开关（最后创建，线路/变压器开关可按名称引用已建立的元件）
+    switches = spec['switches']
+    if len(switches):
+        et = switches['et'].values
+        elements = np.empty(len(switches), dtype=np.int64)
+        for kind, table in (('b', None), ('l', net.line), ('t', net.trafo)):
+            mask = et == kind
+            if not mask.any():
+                continue
+            if table is None:
+                elements[mask] = _bus_ids(bus_lookup, switches['element'].values[mask], 'switches')
+            else:
+                lookup = pd.Series(table.index.values, index=table['name'].values)
+                elements[mask] = _bus_ids(lookup, switches['element'].values[mask], 'switches')
+        pp.create_switches(net, buses=_bus_ids(bus_lookup, switches['bus'].values, 'switches'),
+                           elements=elements, et=et, **_kwargs(switches, ('bus', 'element', 'et')))
+
+    return bus_lookup
+
+
+def build_network(spec):
+    """
+    由定义建立新的网络
+    """
+    import pandapower as pp
+
+    net = pp.create_empty_network()
+    add_spec_elements(net, spec)
+    return net
+
+
+def _pandapower_version():
+    try:
+        return version('pandapower')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def spec_hash(spec):
+    """
+    变电站定义的内容哈希（同时包含 pandapower 版本与工厂版本）
+    """
+    spec = normalize_spec(spec)
+    digest = hashlib.sha256()
+    digest.update(f"pandapower={_pandapower_version()};factory={FACTORY_VERSION}".encode())
+    for table in SPEC_TABLES:
+        df = spec[table]
+        digest.update(f"\n[{table}]\n".encode())
+        digest.update(df.to_csv(index=False, float_format='%.17g').encode())
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'sc_networks')
+
+
+def _cache_path(spec, cache_dir, suffix):
+    cache_dir = cache_dir or default_cache_dir()
+    return os.path.join(cache_dir, f"{spec_hash(spec)}{suffix}")
+
+
+def _load_pickle(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _dump_pickle(obj, path):
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写临时文件再原子替换，避免并发进程读到半个文件
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cached_network(spec, cache_dir=None):
+    """
+    读取（或建立并写入）按内容哈希缓存的网络
+    网络以 pickle 二进制格式保存，读取只需毫秒级；定义改变后哈希随之改变，旧文件自然失效
+    :param spec: 变电站定义
+    :param cache_dir: 缓存目录，默认取环境变量 SC_NETWORK_CACHE 或 ~/.cache/sc_networks
+    :return: 新的网络对象（每次调用互不影响）
+    """
+    path = _cache_path(spec, cache_dir, '.pkl')
+    net = _load_pickle(path)
+    if net is None:
+        net = build_network(spec)
+        try:
+            _dump_pickle(net, path)
+        except OSError:
+            # 磁盘缓存只是加速手段，目录不可写时直接返回新建的网络
+            pass
+    return net
+
+
+class NetworkTables(dict):
+    """
+    网络的只读表格视图：只含元件表（DataFrame）和 sn_mva、f_hz 等标量，支持 net.bus 式属性访问，
+    可直接传给 SequenceModel / calc_sc_sweep，序列化与读取都不需要 pandapower
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def network_tables(net):
+    """
+    从 pandapower 网络提取元件表（不含结果表）
+    """
+    tables = NetworkTables({key: value for key, value in net.items()
+                            if isinstance(value, pd.DataFrame) and not key.startswith('res_')})
+    for key in NET_SCALARS:
+        tables[key] = net[key]
+    return tables
+
+
+def cached_tables(spec, cache_dir=None):
+    """
+    读取（或生成并写入）按内容哈希缓存的网络表格视图
+    缓存命中时不导入 pandapower，适合只做短路计算的短生命周期进程
+    :return: NetworkTables
+    """
+    path = _cache_path(spec, cache_dir, '.tables.pkl')
+    tables = _load_pickle(path)
+    if tables is None:
+        tables = network_tables(cached_network(spec, cache_dir))
+        try:
+            _dump_pickle(tables, path)
+        except OSError:
+            pass
+    return tables
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# 结果表组装：由母线结果得到线路两端、变压器两侧、母线三张表
+# 母线结果（以母线索引为索引，每列一种结果，如 3ph_ikss_ka/2ph_ikss_ka/1ph_ikss_ka 或 res_bus_sc 的 ikss_ka）
+# 先转换为二维数组，再用 from_bus/to_bus/hv_bus/lv_bus 的位置数组一次取出全部元件端的值，
+# 不逐行 .at 取值，也不逐行拼字典。列名为 {端}_bus_{结果列}，与原脚本一致。
+
+# (表名, 名称列, 各端)
+ELEMENT_SIDES = {
+    'line': ('line_name', ('from', 'to')),
+    'trafo': ('transformer_name', ('hv', 'lv')),
+}
+
+
+def _bus_values(bus_results, columns=None):
+    # 母线结果 -> (母线索引, 数组, 列名)
+    frame = bus_results if isinstance(bus_results, pd.DataFrame) else bus_results.to_frame()
+    if columns is not None:
+        frame = frame[list(columns)]
+    return pd.Index(frame.index), frame.to_numpy(dtype=np.float64), list(frame.columns)
+
+
+def _take(index, values, buses):
+    # 按母线取行，结果中没有的母线为 NaN
+    pos = index.get_indexer(np.asarray(buses))
+    taken = values[np.clip(pos, 0, None)] if len(values) else np.full((len(pos), values.shape[1]), np.nan)
+    taken[pos < 0] = np.nan
+    return taken
+
+
+def element_end_table(net, element, bus_results, columns=None):
+    """
+    线路两端或变压器两侧的结果表
+    :param net: pandapower 网络
+    :param element: 'line' 或 'trafo'
+    :param bus_results: 以母线索引为索引的 DataFrame（或 Series）
+    :param columns: 取用的结果列，None 为全部列
+    :return: 名称列之后依次为各端的 {端}_bus_{结果列}
+    """
+    name_column, sides = ELEMENT_SIDES[element]
+    index, values, names = _bus_values(bus_results, columns)
+    table = net[element]
+    data = {name_column: table['name'].values}
+    for side in sides:
+        taken = _take(index, values, table[f'{side}_bus'].values)
+        for j, column in enumerate(names):
+            data[f'{side}_bus_{column}'] = taken[:, j]
+    return pd.DataFrame(data)
+
+
+def line_end_table(net, bus_results, columns=None):
+    """线路两端结果表：line_name, from_bus_{列}..., to_bus_{列}..."""
+    return element_end_table(net, 'line', bus_results, columns)
+
+
+def transformer_side_table(net, bus_results, columns=None):
+    """变压器两侧结果表：transformer_name, hv_bus_{列}..., lv_bus_{列}..."""
+    return element_end_table(net, 'trafo', bus_results, columns)
+
+
+def bus_table(net, bus_results, columns=None):
+    """母线结果表：bus_name 与各结果列（按 net.bus 的顺序）"""
+    index, values, names = _bus_values(bus_results, columns)
+    taken = _take(index, values, net.bus.index.values)
+    data = {'bus_name': net.bus['name'].values}
+    for j, column in enumerate(names):
+        data[column] = taken[:, j]
+    return pd.DataFrame(data)
+
+
+def assemble_tables(net, bus_results, columns=None, case=None):
+    """
+    一次组装三张表
+    :return: (线路两端, 变压器两侧, 母线)
+    """
+    with span('assembly', case=case) as s:
+        tables = (line_end_table(net, bus_results, columns), transformer_side_table(net, bus_results, columns),
+                  bus_table(net, bus_results, columns))
+        s.rows = len(tables[0]) + len(tables[1]) + len(tables[2])
+    return tables
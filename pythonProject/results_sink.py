@@ -0,0 +1,234 @@
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from compact_results import CompactFrame
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, element_ends
+
+# 短路计算结果的输出：
+#     ParquetResultStore  按 变电站/方式/故障类型 分区的 Parquet 数据集，每次 write 追加新文件，
+#                         运行方式矩阵计算完一个写一个；读取时只扫描过滤条件涉及的分区。
+#                         同一个 ParquetResultStore 对象写入的结果带相同的 run_id（写出时间），
+#                         重复导出保留为历史记录，读取和生成报表时缺省只取最新一次
+#     ExcelResultSink     兼容原 short_circuit_results.xlsx 的六张表，关闭时一次写出
+# 两者接口相同（write / close，可用作 with 语句），写入的都是长格式结果表：
+#     substation, scenario, case, fault, element_type, element, side, bus, ikss_ka
+
+PARTITION_COLUMNS = ('substation', 'case', 'fault')
+LONG_COLUMNS = ['fault', 'element_type', 'element', 'side', 'bus', 'ikss_ka']
+
+# 与 main() 中 ExcelWriter 的工作表名称一致
+SHEET_CASES = (('max', 'Max Mode'), ('min', 'Min Mode'))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the Parquet result store requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def long_results(net, bus_results):
+    """
+    把母线结果展开为（母线、线路两端、变压器两侧）× 故障类型的长表
+    :param net: pandapower 网络
+    :param bus_results: calc_sc_sweep 的母线结果
+    :return: 列为 LONG_COLUMNS 的 DataFrame
+    """
+    ends = element_ends(net)
+    pos = pd.Index(bus_results.index).get_indexer(ends['bus'])
+    ikss = bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]].values[pos]
+    bus_names = pd.Series(net.bus['name'].values, index=net.bus.index).reindex(ends['bus']).values
+
+    n_fault = len(FAULT_TYPES)
+    return pd.DataFrame({
+        'fault': np.repeat(FAULT_TYPES, len(pos)),
+        'element_type': np.tile(ends['element_type'], n_fault),
+        'element': np.tile(ends['element'], n_fault),
+        'side': np.tile(ends['side'], n_fault),
+        'bus': np.tile(bus_names, n_fault),
+        'ikss_ka': ikss.T.ravel(),
+    }, columns=LONG_COLUMNS)
+
+
+def _by_element(rows, column, values):
+    # 按元件名称对齐各故障类型/各侧的结果（不依赖行顺序），行顺序按元件首次出现的顺序；
+    # 同一元件同一列出现多次（如混入多次导出的结果）时 pivot 报错
+    order = pd.unique(rows['element'])
+    return rows.pivot(index='element', columns=column, values='ikss_ka').reindex(index=order, columns=list(values))
+
+
+def excel_sheets(results):
+    """
+    由单个变电站、单个运行方式、单次导出的长格式结果生成原 Excel 报表的各张表
+    :return: {工作表名: DataFrame}
+    """
+    sheets = {}
+    for case, label in SHEET_CASES:
+        rows = results[results['case'] == case]
+        if not len(rows):
+            continue
+        buses = _by_element(rows[rows['element_type'] == 'bus'], 'fault', FAULT_TYPES)
+        bus_sheet = pd.DataFrame({f'{fault}_ikss_ka': buses[fault].values for fault in FAULT_TYPES})
+        bus_sheet['bus_name'] = buses.index.values
+        sheets[f'{label} Bus'] = bus_sheet
+
+        three_phase = rows[rows['fault'] == '3ph']
+        for element_type, sides, name_column, sheet in (('line', ('from', 'to'), 'line_name', 'Line Ends'),
+                                                          ('trafo', ('hv', 'lv'), 'transformer_name', 'Transformer')):
+            ends = _by_element(three_phase[three_phase['element_type'] == element_type], 'side', sides)
+            frame = {name_column: ends.index.values}
+            for side in sides:
+                frame[f'{side}_bus_ikss_ka'] = ends[side].values
+            sheets[f'{label} {sheet}'] = pd.DataFrame(frame)
+    return sheets
+
+
+def write_excel_report(results, path):
+    """
+    把长格式结果写为六张表的 Excel 报表
+    """
+    with span('export.excel') as s, pd.ExcelWriter(path) as writer:
+        for sheet, frame in excel_sheets(results).items():
+            frame.to_excel(writer, sheet_name=sheet, index=False)
+        s.rows = len(results)
+
+
+def _fill_keys(frame, keys):
+    if isinstance(frame, CompactFrame):
+        # 紧凑结果在写出时才转换；名称列解码为普通字符串、电流恢复为 float64，与已有文件的结构一致
+        return _fill_keys(frame.to_frame(categorical=False, float64=True), keys)
+    frame = frame.copy() if keys else frame
+    for column, value in keys.items():
+        frame[column] = value
+    return frame
+
+
+class ParquetResultStore:
+    """
+    分区 Parquet 结果库
+    :param root: 数据集根目录，目录结构为 substation=.../case=.../fault=.../<文件>.parquet
+    :param run_id: 本次导出的标识，写入每一行的 run_id 列；缺省为当前时间（按字符串排序即按时间排序）
+    """
+
+    def __init__(self, root, run_id=None):
+        self.pa = _pyarrow()
+        self.root = root
+        self.run_id = time.strftime('%Y%m%dT%H%M%S') + f'-{uuid.uuid4().hex[:8]}' if run_id is None else str(run_id)
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, frame, **keys):
+        """
+        追加一批结果
+        :param frame: 长格式结果表
+        :param keys: 对整批结果都相同的列（如 substation='A站', scenario='...'）
+        """
+        frame = _fill_keys(frame, dict(keys, run_id=keys.get('run_id', self.run_id)))
+        missing = [column for column in PARTITION_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"results are missing partition columns {missing}")
+        if not len(frame):
+            return
+        with span('export.parquet', case=keys.get('case')) as s:
+            frame = frame.astype({column: str for column in PARTITION_COLUMNS})
+            table = self.pa.Table.from_pandas(frame, preserve_index=False)
+            # 每批使用唯一文件名，追加写入不会覆盖已有文件
+            self.pa.parquet.write_to_dataset(table, self.root, partition_cols=list(PARTITION_COLUMNS),
+                                             basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                                             existing_data_behavior='overwrite_or_ignore')
+            s.rows = len(frame)
+
+    def dataset(self):
+        return self.pa.dataset.dataset(self.root, format='parquet', partitioning='hive')
+
+    def runs(self, **filters):
+        """
+        结果库中满足条件的导出记录
+        :param filters: 同 read
+        :return: 按时间排序的 run_id 列表
+        """
+        frame = self.read(columns=['run_id'], run=None, **filters)
+        return sorted(frame['run_id'].dropna().unique()) if len(frame) else []
+
+    def read(self, columns=None, run='latest', **filters):
+        """
+        按条件读取结果，只扫描相关分区
+        :param columns: 需要的列，None 为全部
+        :param run: 'latest' 为满足条件的最新一次导出，None 为全部导出，其他值为指定的 run_id
+        :param filters: 列 -> 值或值列表，例如 substation='A站', case='max', fault=['3ph', '1ph']
+        :return: DataFrame
+        """
+        if run == 'latest':
+            runs = self.runs(**filters)
+            run = runs[-1] if runs else None
+        if run is not None:
+            filters = dict(filters, run_id=run)
+        ds = self.pa.dataset
+        expression = None
+        for column, value in filters.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if column in PARTITION_COLUMNS:
+                values = [str(v) for v in values]
+            condition = ds.field(column).isin(values)
+            expression = condition if expression is None else expression & condition
+        if not os.listdir(self.root):
+            return pd.DataFrame(columns=columns)
+        frame = self.dataset().to_table(columns=columns, filter=expression).to_pandas()
+        # 分区列读回时为字典编码，转为普通字符串
+        for column in PARTITION_COLUMNS:
+            if column in frame.columns:
+                frame[column] = frame[column].astype(str)
+        return frame
+
+    def excel_report(self, path, substation, scenario=None, run='latest'):
+        """
+        从结果库生成某个变电站（某个运行方式）某次导出的 Excel 报表
+        :param run: 同 read，缺省为最新一次导出
+        """
+        filters = {'substation': substation}
+        if scenario is not None:
+            filters['scenario'] = scenario
+        results = self.read(run=run, **filters)
+        if 'scenario' in results.columns and results['scenario'].nunique() > 1:
+            raise ValueError("results contain several scenarios, select one for the report")
+        write_excel_report(results, path)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExcelResultSink:
+    """
+    兼容原输出格式的结果汇：累积结果，关闭时写出 Excel
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = []
+
+    def write(self, frame, **keys):
+        self.frames.append(_fill_keys(frame, keys))
+
+    def close(self):
+        if self.frames:
+            write_excel_report(pd.concat(self.frames, ignore_index=True), self.path)
+            self.frames = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
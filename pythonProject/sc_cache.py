@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from network_factory import _dump_pickle, _load_pickle, default_cache_dir
+from sc_sweep import calc_sc_sweep
+
+# 短路计算结果的内容寻址缓存
+# 键为 网络中与短路计算有关的元件表 + 计算参数（方式、故障类型、lv_tol_percent 等）+ 计算引擎版本 的哈希，
+# 网络内容不变、参数相同的重复计算直接返回结果，不再调用 sc.calc_sc 或重新分解。两级缓存：
+#     内存  按最近使用顺序保留 max_entries 项（LRU）
+#     磁盘  每项一个 pickle 文件，总大小超过 max_disk_bytes 时删除最久未使用的文件（命中时更新修改时间）；
+#           需显式启用：设置环境变量 SC_RESULT_CACHE 为缓存目录，或构造 ResultCache(cache_dir=目录或 True)，
+#           缺省只用内存，不在用户目录下写文件
+# 缓存命中返回结果的副本，调用者修改返回值不影响缓存。
+# 网络哈希直接读取各列的数组内容（不经 pandas 的逐行哈希），每次查找都重新计算，
+# 因此原地修改元件表（如切换开关）后不会取到旧结果。
+
+# 参与哈希的元件表（负荷不影响短路电流，不计入；绘图坐标列 geo 忽略）
+SC_TABLES = ('bus', 'line', 'trafo', 'trafo3w', 'ext_grid', 'gen', 'sgen', 'switch', 'shunt', 'impedance',
+             'ward', 'xward', 'motor', 'storage')
+NET_SCALARS = ('sn_mva', 'f_hz')
+
+# sc.calc_sc 会在元件表中补充缺省列（值为 NaN 或下列缺省值），这些列不改变结果，
+# 哈希时与全空列一并忽略，使同一网络计算前后的键相同
+_FILLED_DEFAULTS = {'trafo': {'xn_ohm': 0.}}
+
+# 磁盘缓存目录（设置后启用磁盘缓存）；cache_dir=True 时为网络缓存目录下的 results 子目录
+RESULT_CACHE_ENV = 'SC_RESULT_CACHE'
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_DISK_BYTES = 512 * 2 ** 20
+
+# 修改结果格式或哈希方式时递增，使旧缓存失效
+CACHE_VERSION = 2
+
+
+def _array_bytes(values):
+    # 数值列取内存内容，对象列（名称、联结组别等）按文本
+    values = np.asarray(values)
+    if values.dtype == object:
+        return '\x1f'.join(map(repr, values.tolist())).encode()
+    return np.ascontiguousarray(values).tobytes()
+
+
+def _table_digest(digest, name, df):
+    filled = _FILLED_DEFAULTS.get(name, {})
+    digest.update(f"\n[{name}]\n".encode())
+    digest.update(_array_bytes(df.index.values))
+    for column, series in df.items():
+        if column == 'geo':
+            continue
+        values = np.asarray(series.values)
+        # 全空列与 calc_sc 补充的缺省列不改变结果
+        if pd.isna(values).all() or (column in filled and (values == filled[column]).all()):
+            continue
+        digest.update(f"\n{column}:{values.dtype}\n".encode())
+        digest.update(_array_bytes(values))
+
+
+def network_key(net):
+    """
+    网络中与短路计算有关内容的哈希（pandapower 网络或 NetworkTables 均可）
+    """
+    digest = hashlib.sha256()
+    for name in SC_TABLES:
+        df = net.get(name) if hasattr(net, 'get') else getattr(net, name, None)
+        if isinstance(df, pd.DataFrame) and len(df):
+            _table_digest(digest, name, df)
+    for name in NET_SCALARS:
+        digest.update(f"\n{name}={net[name]!r}".encode())
+    return digest.hexdigest()
+
+
+def _engine_version(engine):
+    if engine == 'calc_sc':
+        try:
+            return f"pandapower={version('pandapower')}"
+        except PackageNotFoundError:
+            return 'pandapower=unknown'
+    return engine
+
+
+def result_key(net, engine, **params):
+    """
+    :param engine: 计算引擎（'calc_sc' 或 'sweep'）
+    :param params: 计算参数（方式、故障类型、lv_tol_percent 等）
+    :return: 结果的内容哈希
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION};{_engine_version(engine)};".encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    digest.update(network_key(net).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    两级 LRU 缓存
+    :param max_entries: 内存中保留的项数
+    :param cache_dir: 磁盘缓存目录；None 取环境变量 SC_RESULT_CACHE（未设置时只用内存），
+                      True 为 网络缓存目录/results，False 表示只用内存
+    :param max_disk_bytes: 磁盘缓存总大小上限
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_entries = max_entries
+        if cache_dir is None:
+            cache_dir = os.environ.get(RESULT_CACHE_ENV)
+        elif cache_dir is True:
+            cache_dir = os.path.join(default_cache_dir(), 'results')
+        self.cache_dir = cache_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self.counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'memory_evictions': 0, 'disk_evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """
+        :return: 缓存的结果，未命中返回 None
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.counts['memory_hits'] += 1
+            return self._memory[key]
+        if self.cache_dir:
+            path = self._path(key)
+            value = _load_pickle(path) if os.path.exists(path) else None
+            if value is not None:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self.counts['disk_hits'] += 1
+                self._remember(key, value)
+                return value
+        self.counts['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.cache_dir:
+            try:
+                _dump_pickle(value, self._path(key))
+            except OSError:
+                # 磁盘缓存只是加速手段，目录不可写时只用内存
+                return
+            self._evict_disk()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counts['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith('.pkl')]
+        except OSError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.counts['disk_evictions'] += 1
+
+    def clear(self, disk=False):
+        self._memory.clear()
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.pkl'):
+                    os.remove(entry.path)
+
+    def stats(self):
+        """
+        :return: 命中、未命中、淘汰次数，命中率，内存项数
+        """
+        stats = dict(self.counts)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.
+        stats['memory_entries'] = len(self._memory)
+        return stats
+
+
+_default_cache = None
+
+
+def default_cache():
+    """进程内共享的缓存"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def cached_calc_sc(net, fault='3ph', case='max', lv_tol_percent=6, cache=None, **kwargs):
+    """
+    带缓存的 sc.calc_sc：命中时直接把缓存的结果写入 net.res_bus_sc
+    :param kwargs: 传给 sc.calc_sc 的其他参数（同样参与哈希）
+    :return: net.res_bus_sc
+    """
+    cache = default_cache() if cache is None else cache
+    with span('cache.calc_sc', case=case, fault=fault) as s:
+        key = result_key(net, 'calc_sc', fault=fault, case=case, lv_tol_percent=lv_tol_percent, **kwargs)
+        results = cache.get(key)
+        if results is None:
+            import pandapower.shortcircuit as sc
+            sc.calc_sc(net, fault=fault, case=case, lv_tol_percent=lv_tol_percent, **kwargs)
+            results = net.res_bus_sc.copy()
+            cache.put(key, results)
+        net.res_bus_sc = results.copy()
+        s.rows = len(results)
+    return net.res_bus_sc
+
+
+def cached_calc_sc_sweep(net, case='max', lv_tol_percent=6, r_fault_ohm=0., x_fault_ohm=0., cache=None, **kwargs):
+    """
+    带缓存的 calc_sc_sweep
+    :param kwargs: 传给 calc_sc_sweep 的其他参数（quantities、tk_s 等，同样参与哈希）
+    :return: 以 net.bus.index 为索引的 DataFrame（缓存结果的副本）
+    """
+    cache = default_cache() if cache is None else cache
+    with span('cache.sweep', case=case) as s:
+        key = result_key(net, 'sweep', case=case, lv_tol_percent=lv_tol_percent, r_fault_ohm=r_fault_ohm,
+                         x_fault_ohm=x_fault_ohm, **kwargs)
+        results = cache.get(key)
+        if results is None:
+            results = calc_sc_sweep(net, case, lv_tol_percent, r_fault_ohm, x_fault_ohm, **kwargs)
+            cache.put(key, results)
+        s.rows = len(results)
+    return results.copy()
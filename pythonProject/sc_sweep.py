@@ -0,0 +1,616 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+from instrumentation import instrumented, span
+from result_assembly import bus_table, line_end_table, transformer_side_table
+
+# 短路计算扫描引擎
+# 按 IEC 60909 等效电压源法直接由 net 的元件表建立正序/零序节点导纳矩阵，
+# 每个运行方式(case)只做一次 LU 分解，之后母线、线路两端、变压器两侧的短路电流
+# 全部由同一组戴维南阻抗得到，不再对每条母线单独调用 sc.calc_sc。
+
+FAULT_TYPES = ('3ph', '2ph', '1ph')
+SEQUENCES = ('positive', 'zero')
+ELEMENT_TYPES = ('line', 'trafo', 'ext_grid')
+
+# 结果量：初始短路电流、冲击电流、热等效电流、开断电流
+QUANTITIES = ('ikss', 'ip', 'ith', 'ib')
+
+# IEC 60909 方法 C 的等效频率 fc（电抗按 fc/f 折算后求 R/X），{系统频率: fc}
+EQUIVALENT_FREQUENCY = {50.: 20., 60.: 24.}
+
+# 每次求解的右端列数，控制求阻抗矩阵对角元时的内存占用
+_SOLVE_BLOCK = 256
+
+
+def voltage_factor(vn_kv, case='max', lv_tol_percent=6):
+    """
+    IEC 60909 电压系数 c
+    :param vn_kv: 母线额定电压数组（kV）
+    :param case: 'max' 或 'min'
+    :param lv_tol_percent: 低压电网电压偏差，只能为 6 或 10
+    :return: 各母线的 c 值
+    """
+    vn_kv = np.asarray(vn_kv, dtype=np.float64)
+    if lv_tol_percent == 10:
+        c_lv_max, c_lv_min = 1.1, 0.9
+    elif lv_tol_percent == 6:
+        c_lv_max, c_lv_min = 1.05, 0.95
+    else:
+        raise ValueError("Voltage tolerance in the low voltage grid has" +
+                         " to be either 6% or 10% according to IEC 60909")
+    if case == 'max':
+        return np.where(vn_kv < 1., c_lv_max, 1.1)
+    elif case == 'min':
+        return np.where(vn_kv < 1., c_lv_min, 1.)
+    raise ValueError(f"Invalid case {case}")
+
+
+def _column(df, name, default, mask=None):
+    # 读取（可选）数值列并按 mask 取行，缺失或为空时使用默认值
+    n = len(df) if mask is None else int(np.count_nonzero(mask))
+    if name not in df.columns:
+        return np.full(n, default, dtype=np.float64)
+    values = df[name].values
+    if mask is not None:
+        values = values[mask]
+    if values.dtype == object:
+        values = np.array([default if v is None else v for v in values])
+    values = values.astype(np.float64)
+    return np.where(np.isnan(values), default, values)
+
+
+def _transformer_correction_factor(vk_percent, vkr_percent, c_max_lv, case):
+    # IEC 60909-0:2016 6.3.3 变压器阻抗修正系数，仅用于最大方式
+    if case != 'max':
+        return np.ones(np.shape(vk_percent))
+    xt = np.sqrt(vk_percent ** 2 - vkr_percent ** 2) / 100
+    return 0.95 * c_max_lv / (1 + 0.6 * xt)
+
+
+def _series_impedance(r, x):
+    return r + 1j * x
+
+
+def _scale_reactance(z, factor):
+    return z.real + 1j * z.imag * factor
+
+
+class SequenceModel:
+    """
+    某一运行方式下网络的正序/零序阻抗模型
+    节点导纳矩阵按标幺值（基准容量 net.sn_mva，基准电压为各母线 vn_kv）建立，
+    闭合的母联开关会将两条母线合并为同一节点。LU 分解按序网懒加载并缓存。
+    """
+
+    def __init__(self, net, case='max', lv_tol_percent=6):
+        if net.gen.in_service.values.astype(bool).any() or net.sgen.in_service.values.astype(bool).any():
+            raise NotImplementedError("gen/sgen contributions are not supported by the sweep engine, "
+                                      "use sc.calc_sc instead")
+        self.case = case
+        self.lv_tol_percent = lv_tol_percent
+        self.sn_mva = float(net.sn_mva)
+        self.f_hz = float(net.f_hz)
+        self.bus_index = net.bus.index.values
+        self.vn_kv = net.bus.vn_kv.values.astype(np.float64)
+        self.c = voltage_factor(self.vn_kv, case, lv_tol_percent)
+        self.c_max = voltage_factor(self.vn_kv, 'max', lv_tol_percent)
+        self._bus_pos = np.full(int(self.bus_index.max()) + 1 if len(self.bus_index) else 0, -1, dtype=np.int64)
+        self._bus_pos[self.bus_index] = np.arange(len(self.bus_index))
+        self._build_nodes(net)
+        self._build_elements(net)
+        self._assemble()
+        self._lu = {}
+
+    # ------------------------------------------------------------------ 拓扑
+    def bus_positions(self, buses):
+        """net 母线索引 -> 母线在 self.bus_index 中的位置"""
+        buses = np.asarray(buses, dtype=np.int64).ravel()
+        pos = self._bus_pos[buses]
+        if (pos < 0).any():
+            raise KeyError(f"buses {buses[pos < 0]} do not exist")
+        return pos
+
+    def _build_nodes(self, net):
+        # 闭合的母线-母线开关把两条母线合并为一个计算节点（并查集）
+        n_bus = len(self.bus_index)
+        parent = np.arange(n_bus)
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        sw = net.switch
+        bb = (sw.et.values == 'b') & sw.closed.values.astype(bool)
+        if bb.any():
+            for a, b in zip(self.bus_positions(sw.bus.values[bb]), self.bus_positions(sw.element.values[bb])):
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+        roots = np.array([find(i) for i in range(n_bus)])
+        _, node_of_bus = np.unique(roots, return_inverse=True)
+        self.node_of_bus = node_of_bus
+        self.n_node = int(node_of_bus.max()) + 1 if n_bus else 0
+
+    def _open_branch_switches(self, net, et, index):
+        # 线路/变压器上任意一端开关断开即视为该支路退出
+        sw = net.switch
+        open_sw = (sw.et.values == et) & ~sw.closed.values.astype(bool)
+        return np.isin(index, sw.element.values[open_sw])
+
+    def _build_elements(self, net):
+        case = self.case
+        sn = self.sn_mva
+
+        # 线路
+        line = net.line
+        m = line.in_service.values.astype(bool) & ~self._open_branch_switches(net, 'l', line.index.values)
+        fb = self.bus_positions(line.from_bus.values[m])
+        tb = self.bus_positions(line.to_bus.values[m])
+        length = _column(line, 'length_km', np.nan, m)
+        parallel = _column(line, 'parallel', 1., m)
+        base_r = self.vn_kv[fb] ** 2 / sn
+        r_corr = 1. + 4e-3 * (_column(line, 'endtemp_degree', 20., m) - 20.) if case == 'min' else 1.
+        self.line_index = line.index.values[m]
+        self.line_from = fb
+        self.line_to = tb
+        self.line_z1 = _series_impedance(_column(line, 'r_ohm_per_km', np.nan, m) * r_corr * length,
+                                         _column(line, 'x_ohm_per_km', np.nan, m) * length) / base_r / parallel
+        self.line_z0 = _series_impedance(_column(line, 'r0_ohm_per_km', np.nan, m) * r_corr * length,
+                                         _column(line, 'x0_ohm_per_km', np.nan, m) * length) / base_r / parallel
+        omega = 2 * np.pi * self.f_hz
+        self.line_b1 = omega * _column(line, 'c_nf_per_km', 0., m) * 1e-9 * base_r * length * parallel
+        self.line_b0 = omega * _column(line, 'c0_nf_per_km', 0., m) * 1e-9 * base_r * length * parallel
+
+        # 变压器（两绕组）
+        trafo = net.trafo
+        m = trafo.in_service.values.astype(bool) & ~self._open_branch_switches(net, 't', trafo.index.values)
+        hv = self.bus_positions(trafo.hv_bus.values[m])
+        lv = self.bus_positions(trafo.lv_bus.values[m])
+        vk = _column(trafo, 'vk_percent', np.nan, m)
+        vkr = _column(trafo, 'vkr_percent', np.nan, m)
+        vk0 = _column(trafo, 'vk0_percent', 0., m)
+        vkr0 = _column(trafo, 'vkr0_percent', 0., m)
+        self.trafo_index = trafo.index.values[m]
+        self.trafo_hv = hv
+        self.trafo_lv = lv
+        self.trafo_vector_group = trafo.vector_group.values[m].astype(str) if 'vector_group' in trafo.columns \
+            else np.full(len(hv), 'Dyn')
+        # 参数原值，供 transformer_impedances 按修改后的短路电压或分接位置重算（如 monte_carlo.py）
+        self.trafo_params = {
+            'vn_hv_kv': _column(trafo, 'vn_hv_kv', np.nan, m),
+            'vn_lv_kv': _column(trafo, 'vn_lv_kv', np.nan, m),
+            'tap_pos': _column(trafo, 'tap_pos', np.nan, m),
+            'tap_neutral': _column(trafo, 'tap_neutral', np.nan, m),
+            'tap_min': _column(trafo, 'tap_min', np.nan, m),
+            'tap_max': _column(trafo, 'tap_max', np.nan, m),
+            'tap_step_percent': _column(trafo, 'tap_step_percent', np.nan, m),
+            'tap_side': trafo['tap_side'].values[m] if 'tap_side' in trafo.columns else np.full(len(hv), None),
+            'sn_mva': _column(trafo, 'sn_mva', np.nan, m),
+            'parallel': _column(trafo, 'parallel', 1., m),
+            'vk_percent': vk,
+            'vkr_percent': vkr,
+            'vk0_percent': np.where(vk0 == 0, vk, vk0),
+            'vkr0_percent': np.where(vkr0 == 0, vkr, vkr0),
+            # 中性点接地阻抗（若有）以 3Zn 串入零序回路
+            'zn_ohm': _column(trafo, 'rn_ohm', 0., m) + 1j * _column(trafo, 'xn_ohm', 0., m),
+        }
+        self.trafo_ratio, self.trafo_kt, self.trafo_z1, self.trafo_z0 = self.transformer_impedances()
+
+        # 外部电网
+        eg = net.ext_grid
+        m = eg.in_service.values.astype(bool)
+        for col in (f's_sc_{case}_mva', f'rx_{case}'):
+            if col not in eg.columns:
+                raise ValueError(f"{col} needs to be specified for external grid")
+        self.ext_grid_index = eg.index.values[m]
+        self.ext_grid_bus = self.bus_positions(eg.bus.values[m])
+        self.ext_grid_params = {
+            's_sc_mva': _column(eg, f's_sc_{case}_mva', np.nan, m),
+            'rx': _column(eg, f'rx_{case}', np.nan, m),
+            'x0x': _column(eg, f'x0x_{case}', np.nan, m),
+            'r0x0': _column(eg, f'r0x0_{case}', np.nan, m),
+        }
+        self.ext_grid_z1, self.ext_grid_z0 = self.ext_grid_impedances()
+
+    def transformer_impedances(self, vk_percent=None, tap_pos=None):
+        """
+        变压器变比、修正系数与正序/零序阻抗（标幺值）
+        :param vk_percent: 替换的短路电压，可带前导维（如 (采样数, 变压器数)）；零序短路电压按同一比例变化
+        :param tap_pos: 分接位置，可带前导维；缺省按额定变比计算（与 calc_sc / IEC 60909 一致，不计网络中的 tap_pos）
+        :return: (变比, KT, z1, z0)，形状与参数广播后相同
+        """
+        p = self.trafo_params
+        sn = self.sn_mva
+        hv, lv = self.trafo_hv, self.trafo_lv
+        vk = p['vk_percent'] if vk_percent is None else np.asarray(vk_percent, dtype=np.float64)
+        vk0 = p['vk0_percent'] * vk / p['vk_percent']
+        vkr, vkr0 = p['vkr_percent'], p['vkr0_percent']
+        tap_pos = p['tap_neutral'] if tap_pos is None else np.asarray(tap_pos, dtype=np.float64)
+        # 分接头仅考虑高/低压侧纵向调压
+        tap_factor = np.nan_to_num(1 + (tap_pos - p['tap_neutral']) * p['tap_step_percent'] / 100, nan=1.)
+        vn_hv = np.where(p['tap_side'] == 'hv', p['vn_hv_kv'] * tap_factor, p['vn_hv_kv'])
+        vn_lv = np.where(p['tap_side'] == 'lv', p['vn_lv_kv'] * tap_factor, p['vn_lv_kv'])
+        tap_lv = (vn_lv / self.vn_kv[lv]) ** 2 * sn
+        kt = _transformer_correction_factor(vk, vkr, self.c_max[lv], self.case)
+        ratio = (vn_hv / self.vn_kv[hv]) / (vn_lv / self.vn_kv[lv])
+        z1 = _series_impedance(vkr, np.sqrt(vk ** 2 - vkr ** 2)) / 100 / p['sn_mva'] * tap_lv * kt / p['parallel']
+        tap_hv = (vn_hv / self.vn_kv[hv]) ** 2 * sn
+        grounded_hv = np.char.lower(self.trafo_vector_group.astype('U8')) == 'ynd'
+        tap_corr = np.where(grounded_hv, tap_hv, tap_lv)
+        z0 = _series_impedance(vkr0, np.sqrt(vk0 ** 2 - vkr0 ** 2)) / 100 / p['sn_mva'] * tap_corr * kt / p['parallel']
+        vn_earth = np.where(grounded_hv, self.vn_kv[hv], self.vn_kv[lv])
+        return ratio, kt, z1, z0 + 3 * p['zn_ohm'] / (vn_earth ** 2 / sn)
+
+    def ext_grid_impedances(self, s_sc_mva=None):
+        """
+        外部电网正序/零序阻抗（标幺值）
+        :param s_sc_mva: 替换的短路容量，可带前导维（如 (采样数, 电源数)）
+        :return: (z1, z0)
+        """
+        p = self.ext_grid_params
+        s_sc = p['s_sc_mva'] if s_sc_mva is None else np.asarray(s_sc_mva, dtype=np.float64)
+        z_grid = self.c[self.ext_grid_bus] / (s_sc / self.sn_mva)
+        x_grid = z_grid / np.sqrt(p['rx'] ** 2 + 1)
+        r_grid = p['rx'] * x_grid
+        x0_grid = p['x0x'] * x_grid
+        r0_grid = p['r0x0'] * x0_grid
+        return _series_impedance(r_grid, x_grid), _series_impedance(r0_grid, x0_grid)
+
+    # ------------------------------------------------------------------ 导纳矩阵
+    def _stamps(self, sequence):
+        """
+        返回 (行, 列, 值, 接地节点) 形式的导纳矩阵元素，行列为计算节点编号
+        """
+        stamps = self.element_stamps(sequence)
+        return stamps['rows'], stamps['cols'], stamps['vals'], stamps['rows'][stamps['shunt']]
+
+    def element_stamps(self, sequence):
+        """
+        导纳矩阵元素及其所属元件，供元件停运等低秩修正使用
+        :return: dict，rows/cols/vals 为矩阵元素（计算节点编号），
+                 element_type 为所属元件类型在 ELEMENT_TYPES 中的序号，element 为元件在 net 中的索引，
+                 shunt 标记对地元素（电源或零序接地点）
+        """
+        nob = self.node_of_bus
+        rows, cols, vals, kinds, owners, shunts = [], [], [], [], [], []
+
+        def add(i, j, v, kind, owner, shunt=False):
+            i = np.asarray(i, dtype=np.int64).ravel()
+            rows.append(i)
+            cols.append(np.asarray(j, dtype=np.int64).ravel())
+            vals.append(np.broadcast_to(np.asarray(v, dtype=np.complex128), i.shape).ravel())
+            kinds.append(np.full(len(i), ELEMENT_TYPES.index(kind), dtype=np.int8))
+            owners.append(np.asarray(owner, dtype=np.int64).ravel())
+            shunts.append(np.full(len(i), shunt))
+
+        def add_branch(f, t, y, kind, owner, ratio=1., b=0.):
+            f, t = nob[f], nob[t]
+            add(f, f, y / ratio ** 2 + 0.5j * b, kind, owner)
+            add(t, t, y + 0.5j * b, kind, owner)
+            add(f, t, -y / ratio, kind, owner)
+            add(t, f, -y / ratio, kind, owner)
+
+        def add_shunt(i, y, kind, owner):
+            add(nob[i], nob[i], y, kind, owner, shunt=True)
+
+        if sequence in ('positive', 'equivalent_frequency'):
+            # 等效频率网络（方法 C）：各元件电抗乘以 fc/f，线路电容不变（与 calc_sc 一致）
+            k = self.equivalent_frequency() / self.f_hz if sequence == 'equivalent_frequency' else 1.
+            add_branch(self.line_from, self.line_to, 1 / _scale_reactance(self.line_z1, k), 'line', self.line_index,
+                       b=self.line_b1)
+            add_branch(self.trafo_hv, self.trafo_lv, 1 / _scale_reactance(self.trafo_z1, k), 'trafo',
+                       self.trafo_index, ratio=self.trafo_ratio)
+            add_shunt(self.ext_grid_bus, 1 / _scale_reactance(self.ext_grid_z1, k), 'ext_grid', self.ext_grid_index)
+        elif sequence == 'zero':
+            add_branch(self.line_from, self.line_to, 1 / self.line_z0, 'line', self.line_index, b=self.line_b0)
+            vg = np.char.lower(self.trafo_vector_group.astype('U8'))
+            dyn = np.isin(vg, ('dyn', 'yyn'))
+            ynd = np.isin(vg, ('ynd', 'yny'))
+            unsupported = ~(dyn | ynd | np.isin(vg, ('yy', 'yd', 'dy', 'dd')))
+            if unsupported.any():
+                raise NotImplementedError(f"zero sequence of vector group(s) {set(vg[unsupported])} "
+                                          f"is not supported by the sweep engine")
+            add_shunt(self.trafo_lv[dyn], 1 / self.trafo_z0[dyn], 'trafo', self.trafo_index[dyn])
+            add_shunt(self.trafo_hv[ynd], 1 / self.trafo_z0[ynd], 'trafo', self.trafo_index[ynd])
+            add_shunt(self.ext_grid_bus, 1 / self.ext_grid_z0, 'ext_grid', self.ext_grid_index)
+        else:
+            raise ValueError(f"Invalid sequence {sequence}")
+
+        return {'rows': np.concatenate(rows), 'cols': np.concatenate(cols), 'vals': np.concatenate(vals),
+                'element_type': np.concatenate(kinds), 'element': np.concatenate(owners),
+                'shunt': np.concatenate(shunts)}
+
+    def _assemble(self):
+        self.ybus = {}
+        self.energized = {}
+        for sequence in SEQUENCES:
+            self._assemble_sequence(sequence)
+
+    def _assemble_sequence(self, sequence):
+        rows, cols, vals, shunts = self._stamps(sequence)
+        y = coo_matrix((vals, (rows, cols)), shape=(self.n_node, self.n_node)).tocsc()
+        y.sum_duplicates()
+        self.ybus[sequence] = y
+        self.energized[sequence] = self._energized_nodes(rows, cols, vals, shunts)
+
+    def equivalent_frequency(self):
+        if self.f_hz not in EQUIVALENT_FREQUENCY:
+            raise ValueError("Frequency has to be 50 Hz or 60 Hz according to the standard")
+        return EQUIVALENT_FREQUENCY[self.f_hz]
+
+    def _energized_nodes(self, rows, cols, vals, shunts):
+        # 只有与电源（或零序接地点）相连的孤岛才参与求解，其余节点阻抗视为无穷大
+        mask = (rows != cols) & (np.abs(vals) > 0)
+        graph = coo_matrix((np.ones(mask.sum()), (rows[mask], cols[mask])), shape=(self.n_node, self.n_node))
+        n_comp, labels = connected_components(graph, directed=False)
+        grounded = np.zeros(n_comp, dtype=bool)
+        grounded[labels[shunts]] = True
+        return grounded[labels]
+
+    # ------------------------------------------------------------------ 求解
+    def factor(self, sequence):
+        """
+        对某一序网导纳矩阵做 LU 分解（每个模型每个序网只分解一次）
+        :param sequence: SEQUENCES 之一，或 'equivalent_frequency'（方法 C 的等效频率正序网，首次使用时建立）
+        :return: (splu 对象, 参与求解的节点编号)
+        """
+        if sequence not in self.ybus:
+            self._assemble_sequence(sequence)
+        if sequence not in self._lu:
+            nodes = np.flatnonzero(self.energized[sequence])
+            y = self.ybus[sequence][nodes][:, nodes].tocsc()
+            self._lu[sequence] = (splu(y) if len(nodes) else None, nodes)
+        return self._lu[sequence]
+
+    def zbus_columns(self, sequence, buses=None):
+        """
+        求节点阻抗矩阵中若干列（标幺值），行按 self.bus_index 排列
+        :param buses: net 母线索引，None 表示全部母线
+        :return: 形状为 (母线数, len(buses)) 的复数数组，未带电母线对应 inf
+        """
+        pos = np.arange(len(self.bus_index)) if buses is None else self.bus_positions(buses)
+        return self._zbus_node_columns(sequence, self.node_of_bus[pos])[self.node_of_bus]
+
+    def _zbus_node_columns(self, sequence, col_nodes):
+        lu, nodes = self.factor(sequence)
+        z = np.full((self.n_node, len(col_nodes)), np.inf + 0j)
+        local = np.full(self.n_node, -1)
+        local[nodes] = np.arange(len(nodes))
+        valid = local[col_nodes] >= 0
+        if lu is not None and valid.any():
+            rhs = np.zeros((len(nodes), valid.sum()), dtype=np.complex128)
+            rhs[local[col_nodes[valid]], np.arange(valid.sum())] = 1.
+            sol = np.full((self.n_node, valid.sum()), np.inf + 0j)
+            sol[nodes] = lu.solve(rhs)
+            z[:, valid] = sol
+        return z
+
+    def zbus_diagonal(self, sequence):
+        """
+        节点阻抗矩阵对角元（各母线戴维南阻抗，标幺值），按块求解以限制内存
+        """
+        lu, nodes = self.factor(sequence)
+        diag = np.full(self.n_node, np.inf + 0j)
+        for start in range(0, len(nodes), _SOLVE_BLOCK):
+            block = np.arange(start, min(start + _SOLVE_BLOCK, len(nodes)))
+            rhs = np.zeros((len(nodes), len(block)), dtype=np.complex128)
+            rhs[block, np.arange(len(block))] = 1.
+            diag[nodes[block]] = lu.solve(rhs)[block, np.arange(len(block))]
+        return diag[self.node_of_bus]
+
+    def base_z_ohm(self):
+        return self.vn_kv ** 2 / self.sn_mva
+
+
+def element_ends(net):
+    """
+    母线、线路两端、变压器两侧的统一清单，保护装置均按此顺序排列
+    :return: dict，包含等长数组 element_type / element / side / bus
+    """
+    parts = [
+        ('bus', net.bus['name'].values, '', net.bus.index.values),
+        ('line', net.line['name'].values, 'from', net.line.from_bus.values),
+        ('line', net.line['name'].values, 'to', net.line.to_bus.values),
+        ('trafo', net.trafo['name'].values, 'hv', net.trafo.hv_bus.values),
+        ('trafo', net.trafo['name'].values, 'lv', net.trafo.lv_bus.values),
+    ]
+    return {
+        'element_type': np.concatenate([np.full(len(names), et, dtype=object) for et, names, _, _ in parts]),
+        'element': np.concatenate([names for _, names, _, _ in parts]),
+        'side': np.concatenate([np.full(len(names), side, dtype=object) for _, names, side, _ in parts]),
+        'bus': np.concatenate([buses for _, _, _, buses in parts]).astype(np.int64),
+    }
+
+
+def fault_currents(model, z1, z0=None, r_fault_ohm=0., x_fault_ohm=0., positions=None, vn_kv=None, c=None):
+    """
+    由戴维南阻抗计算三种故障的初始短路电流 ikss（kA）
+    :param model: SequenceModel
+    :param z1: 正序戴维南阻抗（标幺值）
+    :param z0: 零序戴维南阻抗（标幺值），为 None 时不计算单相短路
+    :param positions: z1 对应的母线位置，None 表示全部母线
+    :param vn_kv: 故障点额定电压（kV），给定时代替 positions 处母线的值（如线路中间的故障点）
+    :param c: 故障点电压系数，同上
+    :return: {'3ph': ..., '2ph': ..., '1ph': ...}
+    """
+    pos = slice(None) if positions is None else positions
+    vn = model.vn_kv[pos] if vn_kv is None else vn_kv
+    c = model.c[pos] if c is None else c
+    zf = (r_fault_ohm + 1j * x_fault_ohm) / (vn ** 2 / model.sn_mva)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z1f = z1 + zf
+        currents = {
+            '3ph': c / np.abs(z1f) / (np.sqrt(3) * vn) * model.sn_mva,
+            '2ph': c / np.abs(z1f) / (2 * vn) * model.sn_mva,
+        }
+        if z0 is not None:
+            currents['1ph'] = np.sqrt(3) * c / np.abs(2 * z1f + z0 + zf) / vn * model.sn_mva
+    # 未带电母线与 calc_sc 一致输出 NaN
+    dead = ~np.isfinite(z1)
+    for fault in currents:
+        currents[fault] = np.where(dead, np.nan, currents[fault])
+    return currents
+
+
+def _kappa(rx):
+    return 1.02 + .98 * np.exp(-3 * rx)
+
+
+def peak_factor(model, z1, zc=None, r_fault_ohm=0., x_fault_ohm=0., kappa_method='C', topology='auto'):
+    """
+    IEC 60909 冲击系数 κ（与 calc_sc 的 kappa 相同）
+    :param z1: 全部母线的正序戴维南阻抗（标幺值）
+    :param zc: 等效频率网络的戴维南阻抗，方法 C 需要
+    :param kappa_method: 'C'（等效频率法）或 'B'（按母线 R/X 乘以 1.15）
+    :param topology: 'radial' 时直接由 R/X 计算；'meshed' / 'auto' 按 kappa_method
+    :return: 各母线的 κ
+    """
+    zf = (r_fault_ohm + 1j * x_fault_ohm) / model.base_z_ohm()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = z1 + zf
+        if topology == 'radial':
+            return _kappa(z.real / z.imag)
+        if kappa_method in ('C', 'c'):
+            zc = zc + zf
+            return _kappa(zc.real / zc.imag * model.equivalent_frequency() / model.f_hz)
+    if kappa_method in ('B', 'b'):
+        if topology != 'meshed':
+            # 逐母线判断是否多路供电需要枚举全部路径，扫描引擎不做，请指定 topology 或改用方法 C
+            raise NotImplementedError("kappa method B with topology 'auto' is not supported by the sweep engine")
+        kappa_max = np.where(model.vn_kv < 1., 1.8, 2.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.clip(1.15 * _kappa(z.real / z.imag), 1, kappa_max)
+    raise ValueError("Unknown kappa method %s - specify B or C" % kappa_method)
+
+
+def peak_currents(model, currents, kappa, tk_s=1., quantities=QUANTITIES):
+    """
+    由初始短路电流和冲击系数计算冲击电流 ip、热等效电流 ith、开断电流 ib（kA）
+    远离发电机短路：ib = ikss，ith 取 n = 1；单相短路与 calc_sc 不同，同样按正序 κ 给出 ip/ith
+    :param currents: fault_currents 的结果
+    :param kappa: peak_factor 的结果
+    :param tk_s: 短路持续时间（s），用于 ith
+    :return: {(故障类型, 结果量): 电流}
+    """
+    result = {}
+    if 'ith' in quantities:
+        # 直流分量热效应系数 m（IEC 60909-0 附录 A），交流分量热效应系数 n = 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_k = np.log(kappa - 1)
+            f_tk = model.f_hz * tk_s
+            m = np.where(kappa > 1.99, 0., (np.exp(4 * f_tk * log_k) - 1) / (2 * f_tk * log_k))
+    for fault, ikss in currents.items():
+        if 'ip' in quantities:
+            result[fault, 'ip'] = np.sqrt(2) * kappa * ikss
+        if 'ith' in quantities:
+            result[fault, 'ith'] = ikss * np.sqrt(m + 1)
+        if 'ib' in quantities:
+            result[fault, 'ib'] = ikss
+    return result
+
+
+def calc_sc_sweep(net, case='max', lv_tol_percent=6, r_fault_ohm=0., x_fault_ohm=0., model=None,
+                  quantities=('ikss',), tk_s=1., kappa_method='C', topology='auto'):
+    """
+    一次分解、一次求解得到全部母线的三相/两相/单相短路电流
+    :param net: pandapower 网络
+    :param case: 'max' 或 'min'
+    :param lv_tol_percent: 低压电网电压偏差
+    :param model: 已建立的 SequenceModel，可在多次调用间复用分解结果
+    :param quantities: QUANTITIES 中的结果量，含 ip/ith 时同一次求解中计算 κ（方法 C 另需分解一次等效频率网络）
+    :param tk_s: 短路持续时间（s），用于 ith
+    :param kappa_method: 冲击系数计算方法，见 peak_factor
+    :param topology: 'auto' / 'meshed' / 'radial'，见 peak_factor
+    :return: 以 net.bus.index 为索引的 DataFrame
+    """
+    if model is None:
+        with span('sweep.model', case=case) as s:
+            model = SequenceModel(net, case, lv_tol_percent)
+            s.rows = model.n_node
+    sequences = SEQUENCES
+    if {'ip', 'ith'} & set(quantities) and topology != 'radial' and kappa_method in ('C', 'c'):
+        sequences = SEQUENCES + ('equivalent_frequency',)
+    z = {}
+    for sequence in sequences:
+        with span('sweep.solve', case=model.case, sequence=sequence) as s:
+            z[sequence] = model.zbus_diagonal(sequence)
+            s.rows = len(z[sequence])
+    with span('sweep.currents', case=model.case) as s:
+        results = bus_results_frame(model, z['positive'], z['zero'], r_fault_ohm, x_fault_ohm,
+                                    index_name=net.bus.index.name, quantities=quantities,
+                                    zc=z.get('equivalent_frequency'), tk_s=tk_s, kappa_method=kappa_method,
+                                    topology=topology)
+        s.rows = len(results)
+    return results
+
+
+def bus_results_frame(model, z1, z0, r_fault_ohm=0., x_fault_ohm=0., index_name=None, quantities=('ikss',),
+                      zc=None, tk_s=1., kappa_method='C', topology='auto'):
+    """
+    由全部母线的正序/零序戴维南阻抗生成 calc_sc_sweep 格式的结果表
+    列依次为 {故障类型}_ikss_ka，所选的 {故障类型}_ip_ka / _ith_ka / _ib_ka，rk/xk/rk0/xk0_ohm，
+    计算 ip/ith 时最后为 kappa
+    """
+    currents = fault_currents(model, z1, z0, r_fault_ohm, x_fault_ohm)
+    base_z = model.base_z_ohm()
+    results = pd.DataFrame({f'{fault}_ikss_ka': currents[fault] for fault in FAULT_TYPES},
+                           index=pd.Index(model.bus_index, name=index_name))
+    kappa = None
+    if {'ip', 'ith'} & set(quantities):
+        kappa = peak_factor(model, z1, zc, r_fault_ohm, x_fault_ohm, kappa_method, topology)
+    if set(quantities) - {'ikss'}:
+        peaks = peak_currents(model, currents, kappa, tk_s, quantities)
+        for quantity in QUANTITIES[1:]:
+            if quantity in quantities:
+                for fault in FAULT_TYPES:
+                    results[f'{fault}_{quantity}_ka'] = peaks[fault, quantity]
+    with np.errstate(invalid='ignore'):
+        results['rk_ohm'] = np.where(np.isfinite(z1), z1.real * base_z, np.nan)
+        results['xk_ohm'] = np.where(np.isfinite(z1), z1.imag * base_z, np.nan)
+        results['rk0_ohm'] = np.where(np.isfinite(z0), z0.real * base_z, np.nan)
+        results['xk0_ohm'] = np.where(np.isfinite(z0), z0.imag * base_z, np.nan)
+    if kappa is not None:
+        results['kappa'] = np.where(np.isfinite(z1), kappa, np.nan)
+    return results
+
+
+@instrumented('run_short_circuit_sweep')
+def run_short_circuit_sweep(net, case='max', lv_tol_percent=6, model=None, quantities=('ikss',), tk_s=1.):
+    """
+    与 run_short_circuit_calculation 相同格式的四张结果表，只需一次求解
+    :param quantities: QUANTITIES 中的结果量，全部在同一次求解中得到
+    :return: (母线三种故障结果, 线路两端结果, 变压器两侧结果, 母线三相短路结果)
+    """
+    return sweep_tables(net, calc_sc_sweep(net, case, lv_tol_percent, model=model, quantities=quantities,
+                                           tk_s=tk_s), quantities)
+
+
+def sweep_tables(net, bus_results, quantities=('ikss',)):
+    """
+    把 calc_sc_sweep 的母线结果整理为 run_short_circuit_sweep 的四张表
+    """
+    with span('sweep.tables') as s:
+        tables = _sweep_tables(net, bus_results, quantities)
+        s.rows = len(tables[1]) + len(tables[2])
+    return tables
+
+
+def _sweep_tables(net, bus_results, quantities=('ikss',)):
+    columns = [f'{fault}_{quantity}_ka' for quantity in QUANTITIES if quantity in quantities for fault in FAULT_TYPES]
+    short_circuit_results = bus_results[columns].copy()
+    short_circuit_results['bus_name'] = net.bus['name'].values
+
+    # 线路两端、变压器高压和低压侧、母线的三相短路结果（ikss_ka 及所选的 ip_ka/ith_ka/ib_ka）
+    three_phase = {f'3ph_{quantity}_ka': f'{quantity}_ka' for quantity in QUANTITIES if quantity in quantities}
+    ikss_3ph = bus_results[list(three_phase)].rename(columns=three_phase)
+    line_end_short_circuit_df = line_end_table(net, ikss_3ph)
+    transformer_short_circuit_df = transformer_side_table(net, ikss_3ph)
+    bus_short_circuit_df = bus_table(net, ikss_3ph)
+
+    return short_circuit_results, line_end_short_circuit_df, transformer_short_circuit_df, bus_short_circuit_df
@@ -0,0 +1,179 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from compact_results import CompactFrame, compact_long_results, element_labels
+from instrumentation import context, span
+from results_sink import LONG_COLUMNS, long_results
+from sc_sweep import calc_sc_sweep
+from substation import load_tables
+
+# 运行方式矩阵计算
+# 每个运行方式（scenario）是一个字典，描述相对基础网络的改变，例如：
+#     {
+#         "name": "母联合位-2号主变检修",
+#         "switches": {"Bus Coupler": True},           # 开关名称或索引 -> 是否闭合
+#         "out_of_service": {"trafo": ["Transformer 2"]},  # 元件类型 -> 名称或索引列表
+#         "ext_grid": {"s_sc_max_mva": 300, "rx_max": 0.2},  # 列 -> 值（全部电源）或 {电源索引: 值}
+#         "lv_tol_percent": 6,
+#         "cases": ["max", "min"],
+#     }
+# 各工作进程只建立一次基础网络，之后对每个运行方式复制网络并施加改变。
+
+DEFAULT_CASES = ('max', 'min')
+RESULT_COLUMNS = ['scenario', 'case'] + LONG_COLUMNS
+
+# 工作进程内缓存的基础网络
+_base_net = None
+
+
+def _init_worker(network_builder):
+    global _base_net
+    _base_net = network_builder()
+
+
+def _element_index(table, key):
+    # 元件既可以用索引指定，也可以用名称指定（名称两端空格忽略）
+    if isinstance(key, (int, np.integer)):
+        if key not in table.index:
+            raise KeyError(f"element {key} does not exist")
+        return key
+    matches = table.index[table['name'].astype(str).str.strip() == str(key).strip()]
+    if len(matches) == 0:
+        raise KeyError(f"element '{key}' does not exist")
+    return matches[0]
+
+
+def _copy_for_scenario(net, scenario):
+    # 只复制运行方式会修改的元件表，其余表与基础网络共享
+    tables = set(scenario.get('out_of_service', {}))
+    if scenario.get('switches'):
+        tables.add('switch')
+    if scenario.get('ext_grid'):
+        tables.add('ext_grid')
+    scenario_net = copy.copy(net)
+    for table in tables:
+        scenario_net[table] = net[table].copy()
+    return scenario_net
+
+
+def apply_scenario(net, scenario):
+    """
+    在 net 上施加一个运行方式（原地修改）
+    :param net: pandapower 网络
+    :param scenario: 运行方式字典
+    :return: net
+    """
+    for switch, closed in scenario.get('switches', {}).items():
+        net.switch.at[_element_index(net.switch, switch), 'closed'] = bool(closed)
+
+    for element_type, elements in scenario.get('out_of_service', {}).items():
+        table = net[element_type]
+        for element in elements:
+            table.at[_element_index(table, element), 'in_service'] = False
+
+    for column, value in scenario.get('ext_grid', {}).items():
+        if isinstance(value, dict):
+            for eg, v in value.items():
+                net.ext_grid.at[_element_index(net.ext_grid, eg), column] = v
+        else:
+            net.ext_grid[column] = value
+    return net
+
+
+def source_strength(i_max_ka, i_min_ka, vn_kv=35):
+    """
+    由系统最大/最小短路电流换算外部电网短路容量，用于运行方式的 'ext_grid' 项
+    :param i_max_ka: 最大方式短路电流（kA）
+    :param i_min_ka: 最小方式短路电流（kA）
+    :param vn_kv: 电源母线额定电压（kV）
+    """
+    return {'s_sc_max_mva': vn_kv * i_max_ka * np.sqrt(3), 's_sc_min_mva': vn_kv * i_min_ka * np.sqrt(3)}
+
+
+def _long_format(net, bus_results, scenario_name, case):
+    frame = long_results(net, bus_results)
+    frame.insert(0, 'case', case)
+    frame.insert(0, 'scenario', scenario_name)
+    return frame
+
+
+def run_scenario(net, scenario, compact=False):
+    """
+    计算一个运行方式下各方式(case)的短路电流
+    :param net: 基础网络（不会被修改）
+    :param scenario: 运行方式字典
+    :param compact: 为 True 时返回 compact_results.CompactFrame（名称编码、电流 float32）
+    :return: 长格式 DataFrame
+    """
+    with context(scenario=scenario['name']):
+        with span('scenario.apply'):
+            net = apply_scenario(_copy_for_scenario(net, scenario), scenario)
+        lv_tol_percent = scenario.get('lv_tol_percent', 6)
+        labels = element_labels(net) if compact else None
+        frames = []
+        for case in scenario.get('cases', DEFAULT_CASES):
+            bus_results = calc_sc_sweep(net, case, lv_tol_percent)
+            with span('scenario.long_format', case=case) as s:
+                if compact:
+                    frames.append(compact_long_results(net, bus_results, labels, scenario=scenario['name'], case=case))
+                else:
+                    frames.append(_long_format(net, bus_results, scenario['name'], case))
+                s.rows = len(frames[-1])
+        return CompactFrame.concat(frames) if compact else pd.concat(frames, ignore_index=True)
+
+
+def _run_in_worker(scenario, compact=False, runner=run_scenario):
+    return runner(_base_net, scenario, compact)
+
+
+def run_scenario_matrix(scenarios, network_builder=load_tables, max_workers=None, chunksize=None,
+                        sink=None, substation='default', compact=False, runner=run_scenario):
+    """
+    并行计算运行方式矩阵
+    :param scenarios: 运行方式字典列表，每个字典必须包含唯一的 'name'
+    :param network_builder: 建立基础网络的顶层函数（需可被 pickle）
+    :param max_workers: 进程数，None 为 CPU 核数，0 表示在当前进程内顺序计算
+    :param chunksize: 每次分发给工作进程的运行方式数量
+    :param sink: 结果汇（如 results_sink.ParquetResultStore），给定时每算完一个运行方式即写出，不再汇总返回
+    :param substation: 写入结果汇时的变电站名称
+    :param compact: 为 True 时各运行方式的结果以 CompactFrame 返回和传回主进程，汇总结果也是 CompactFrame
+    :param runner: 计算一个运行方式的顶层函数 runner(net, scenario, compact)（需可被 pickle），
+                   缺省为 run_scenario（短路电流），如 arc_flash.run_arc_flash（入射能量）
+    :return: 以 scenario 为键的长格式 DataFrame；给定 sink 时返回 None
+    """
+    scenarios = list(scenarios)
+    names = [s['name'] for s in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("scenario names must be unique")
+    if not scenarios:
+        if sink is not None:
+            return None
+        empty = pd.DataFrame(columns=RESULT_COLUMNS)
+        return CompactFrame.from_frame(empty) if compact else empty
+
+    if max_workers == 0:
+        net = network_builder()
+        results = _collect((runner(net, scenario, compact) for scenario in scenarios), sink, substation)
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        if chunksize is None:
+            chunksize = max(1, len(scenarios) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(network_builder,)) as executor:
+            results = _collect(executor.map(partial(_run_in_worker, compact=compact, runner=runner), scenarios,
+                                            chunksize=chunksize), sink, substation)
+    return results
+
+
+def _collect(frames, sink, substation):
+    if sink is None:
+        frames = list(frames)
+        return CompactFrame.concat(frames) if isinstance(frames[0], CompactFrame) else pd.concat(frames, ignore_index=True)
+    for frame in frames:
+        sink.write(frame, substation=substation)
+    return None
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from coordination import zone_end_currents
+from instrumentation import span
+from sc_sweep import FAULT_TYPES
+from setpoint_engine import PROTECTION_TYPES, SetpointEngine
+from topology_index import TopologyIndex
+
+# 灵敏系数校验
+# 定值由最大方式结果计算，灵敏度用最小方式的两相短路电流校验：
+#     灵敏系数 = 最小方式校验点短路电流 / 动作电流（一次值）
+# 最大、最小方式的母线结果按 element_ends 的顺序（母线、线路两端、变压器两侧）对齐，
+# 全部装置 × 全部保护段的灵敏系数由一次数组运算得到。校验点：
+#     'near'  保护安装处母线
+#     'end'   保护范围末端（TopologyIndex.zone_end_bus_pos）：线路首端装置取末端母线，线路末端装置取首端母线，
+#             变压器两侧装置取低压侧母线，母线装置取本母线
+# 'near' 校验点取母线电流；线路/变压器装置的 'end' 校验点取流过装置本身的电流（coordination.relay_currents，
+# 计入并联支路分流、电压折算、Dy/Yd 变压器移相和零序隔断），母线装置取母线电流。
+
+# {保护段: (校验点, 要求的灵敏系数)}
+SENSITIVITY_CHECKS = {
+    'instantaneous': ('near', 1.),
+    'time_delayed': ('end', 1.3),
+    'time_graded': ('end', 1.5),
+}
+
+SENSITIVITY_COLUMNS = ['element_type', 'element', 'side', 'bus', 'stage', 'check_point', 'check_bus',
+                       'ikss_min_ka', 'pickup_ka', 'sensitivity', 'required', 'status']
+
+
+def sensitivity_table(net, bus_results, setpoint_table=None, CT_ratio=1., fault='2ph', checks=SENSITIVITY_CHECKS,
+                      topology=None, lv_tol_percent=6):
+    """
+    各装置各保护段的灵敏系数及是否合格
+    :param net: pandapower 网络
+    :param bus_results: {'max': ..., 'min': ...} calc_sc_sweep 的母线结果
+    :param setpoint_table: SetpointEngine.setpoint_table 的结果（应为能动作的定值，如 basis='zone_min'），
+                           缺省时按 'zone_min' 基准由最小方式结果计算
+    :param CT_ratio: 计算定值时使用的电流互感器变比（标量，或与定值表行数相同的数组）
+    :param fault: 校验使用的故障类型
+    :param checks: {保护段: (校验点, 要求的灵敏系数)}，未列出的保护段不校验
+    :param topology: TopologyIndex，缺省时由 net 建立
+    :param lv_tol_percent: 计算最小方式装置电流时的低压电网电压偏差（与 bus_results['min'] 相同）
+    :return: 每个装置、每个保护段一行的 DataFrame，列为 SENSITIVITY_COLUMNS；
+             status 为 'pass' / 'fail' / 'no_fault'（校验点失电、元件停运或该段无定值）
+    """
+    if setpoint_table is None:
+        topology = TopologyIndex(net) if topology is None else topology
+        setpoint_table = SetpointEngine(CT_ratio=CT_ratio, basis='zone_min', lv_tol_percent=lv_tol_percent) \
+            .setpoint_table(net, bus_results['min'], topology=topology)
+    with span('sensitivity') as s:
+        topology = TopologyIndex(net) if topology is None else topology
+        ends = topology.labels
+        f = FAULT_TYPES.index(fault)
+        stages = [stage for stage in PROTECTION_TYPES if stage in checks]
+        columns = [PROTECTION_TYPES.index(stage) for stage in stages]
+        location = np.array([checks[stage][0] for stage in stages], dtype=object)
+        required = np.array([checks[stage][1] for stage in stages], dtype=np.float64)
+
+        # 校验点母线，形状 (装置数, 段数)
+        own = topology.relay_bus_pos[:, np.newaxis]
+        pos = np.where(location == 'end', topology.zone_end_bus_pos[:, np.newaxis], own)
+        bus_index = pd.Index(topology.bus_index)
+
+        ikss_min = np.broadcast_to(bus_results['min'][f'{fault}_ikss_ka'].reindex(bus_index).values[own],
+                                   pos.shape).copy()
+        if (location == 'end').any():
+            end = zone_end_currents(net, bus_results['min'], 'min', lv_tol_percent, topology)
+            ikss_min[:, location == 'end'] = end[:, f, np.newaxis]
+
+        ct = np.asarray(CT_ratio, dtype=np.float64)
+        ct = ct[:, np.newaxis] if ct.ndim else ct
+        pickup = setpoint_table.setpoints[:, f, columns] * ct / 1000.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coefficient = ikss_min / pickup
+        # 按 1 / 灵敏系数整定的定值（SetpointEngine 的 'zone_min' 基准）恰好等于要求值，比较时容许舍入误差
+        passes = (coefficient >= required) | np.isclose(coefficient, required)
+        status = np.select([np.isnan(coefficient), passes], ['no_fault', 'pass'], 'fail')
+
+        n_dev, n_stage = pickup.shape
+        bus_names = net.bus['name'].values
+        result = pd.DataFrame({
+            'element_type': np.repeat(ends['element_type'], n_stage),
+            'element': np.repeat(ends['element'], n_stage),
+            'side': np.repeat(ends['side'], n_stage),
+            'bus': np.repeat(bus_names[own[:, 0]], n_stage),
+            'stage': np.tile(np.array(stages, dtype=object), n_dev),
+            'check_point': np.tile(location, n_dev),
+            'check_bus': bus_names[pos.ravel()],
+            'ikss_min_ka': ikss_min.ravel(),
+            'pickup_ka': pickup.ravel(),
+            'sensitivity': coefficient.ravel(),
+            'required': np.tile(required, n_dev),
+            'status': status.ravel(),
+        }, columns=SENSITIVITY_COLUMNS)
+        s.rows = len(result)
+    return result
+
+
+def sensitivity_summary(table):
+    """
+    按装置类型和保护段统计合格、不合格数
+    :param table: sensitivity_table 的结果
+    :return: 以 (element_type, stage) 为索引、pass/fail/no_fault 为列的 DataFrame
+    """
+    return pd.crosstab([table['element_type'], table['stage']], table['status']) \
+        .reindex(columns=['pass', 'fail', 'no_fault'], fill_value=0)
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from compact_results import CompactFrame, _compact_float, _encode
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, element_ends
+
+# 保护定值向量化计算
+# K 系数表、电流互感器变比、各段附加倍数和延时都保存为 NumPy 数组，
+# 所有母线、线路两端、变压器两侧、三种故障、三段保护的定值由一次广播运算得到：
+#     定值[装置, 故障, 保护段] = K[故障, 保护段] * 附加倍数[保护段] * I[装置, 故障] * 1000 / CT变比[装置]
+# 基准电流 I 的取法（basis）：
+#     'bus'       装置所在母线的短路电流（与 1+.py 的 K·Ikss 相同，通常用最大方式结果）。
+#                 K ≥ 1 时动作电流高于装置能看到的任何故障电流，各段都不会动作，只用于复现原脚本的定值表
+#     'zone_min'  最小方式下保护范围末端故障时流过装置的电流（coordination.zone_end_currents），
+#                 K 取 1 / 要求的灵敏系数（ZONE_MIN_K_VALUES），各段在最小方式下能切除保护范围内的故障，
+#                 灵敏度校验、配合校核和电弧闪络计算使用这一基准
+
+PROTECTION_TYPES = ('instantaneous', 'time_delayed', 'time_graded')
+
+# 与 run_short_circuit_and_set_protection 中使用的系数一致
+DEFAULT_K_VALUES = {
+    ('3ph', 'instantaneous'): 1.2,
+    ('3ph', 'time_delayed'): 1.8,
+    ('3ph', 'time_graded'): 2.4,
+    ('2ph', 'instantaneous'): 1.1,
+    ('2ph', 'time_delayed'): 1.7,
+    ('2ph', 'time_graded'): 2.3,
+    ('1ph', 'instantaneous'): 1.0,
+    ('1ph', 'time_delayed'): 1.6,
+    ('1ph', 'time_graded'): 2.2
+}
+DEFAULT_K = 1.2
+
+PICKUP_BASES = ('bus', 'zone_min')
+
+# 'zone_min' 基准的 K 系数：1 / sensitivity.SENSITIVITY_CHECKS 中要求的灵敏系数（速断 1.0、限时速断 1.3、过流 1.5），
+# 三种故障类型相同
+ZONE_MIN_K_VALUES = {(fault, protection): k for fault in ('3ph', '2ph', '1ph')
+                     for protection, k in (('instantaneous', 1.), ('time_delayed', 1 / 1.3), ('time_graded', 1 / 1.5))}
+
+# 各段保护动作延时（秒）：速断 0s，限时速断 0.1s，定时限过流 0.2s
+DEFAULT_DELAYS = (0., 0.1, 0.2)
+
+
+def k_matrix(K_values=None, default=DEFAULT_K):
+    """
+    把 {(故障类型, 保护类型): K} 字典转换为 (故障, 保护段) 数组
+    :param K_values: K 系数字典，缺失的组合使用 default
+    :return: 形状为 (3, 3) 的数组
+    """
+    K_values = DEFAULT_K_VALUES if K_values is None else K_values
+    return np.array([[K_values.get((fault, protection), default) for protection in PROTECTION_TYPES]
+                     for fault in FAULT_TYPES], dtype=np.float64)
+
+
+class SetpointEngine:
+    """
+    保护定值计算器
+    :param K_values: K 系数字典或形状为 (..., 3, 3) 的数组（前导维可用于批量灵敏度分析）
+    :param CT_ratio: 电流互感器变比，标量或每个装置一个值；为 1 时定值为一次电流（A）
+    :param stage_factors: 各段附加倍数（如 1+整定计算.py 中的 1.0/1.5/1.8）
+    :param delays: 各段动作延时（秒）
+    :param basis: 基准电流取法，见 PICKUP_BASES；'zone_min' 时缺省 K 为 ZONE_MIN_K_VALUES
+    :param lv_tol_percent: 'zone_min' 计算装置电流时的低压电网电压偏差
+    """
+
+    def __init__(self, K_values=None, CT_ratio=1., stage_factors=(1., 1., 1.), delays=DEFAULT_DELAYS, basis='bus',
+                 lv_tol_percent=6):
+        if basis not in PICKUP_BASES:
+            raise ValueError(f"unknown pickup basis '{basis}', expected one of {PICKUP_BASES}")
+        if K_values is None and basis == 'zone_min':
+            K_values = ZONE_MIN_K_VALUES
+        self.K = K_values if isinstance(K_values, np.ndarray) else k_matrix(K_values)
+        self.basis = basis
+        self.lv_tol_percent = lv_tol_percent
+        self.CT_ratio = np.asarray(CT_ratio, dtype=np.float64)
+        self.stage_factors = np.asarray(stage_factors, dtype=np.float64)
+        self.delays = np.asarray(delays, dtype=np.float64)
+
+    def compute(self, ikss_ka, K=None, CT_ratio=None):
+        """
+        一次广播计算全部定值
+        :param ikss_ka: 形状为 (装置数, 3) 的短路电流（kA），列顺序同 FAULT_TYPES
+        :param K: 临时替换的 K 数组，形状 (..., 3, 3)
+        :param CT_ratio: 临时替换的变比
+        :return: 形状为 (..., 装置数, 3, 3) 的定值数组
+        """
+        K = self.K if K is None else np.asarray(K, dtype=np.float64)
+        ct = self.CT_ratio if CT_ratio is None else np.asarray(CT_ratio, dtype=np.float64)
+        # 比例系数先合并为 (..., 1, 3, 3)，再与 (装置, 3, 1) 的电流相乘
+        scale = (K * self.stage_factors * 1000.)[..., np.newaxis, :, :]
+        current = np.asarray(ikss_ka, dtype=np.float64)[:, :, np.newaxis]
+        if ct.ndim:
+            current = current / ct[:, np.newaxis, np.newaxis]
+        else:
+            scale = scale / ct
+        return scale * current
+
+    @property
+    def reference_case(self):
+        """setpoint_table 需要的母线结果的方式：'bus' 基准为 'max'，'zone_min' 基准为 'min'"""
+        return 'min' if self.basis == 'zone_min' else 'max'
+
+    def setpoint_table(self, net, bus_results, K=None, topology=None):
+        """
+        计算网络中每条母线、每条线路两端、每台变压器两侧的定值
+        :param net: pandapower 网络
+        :param bus_results: calc_sc_sweep 的母线结果（以母线索引为索引，含 '{故障}_ikss_ka' 列），
+                            方式见 reference_case
+        :param topology: TopologyIndex（'zone_min' 基准使用），缺省时由 net 建立
+        :return: SetpointTable，ikss_ka 为各装置的基准电流
+        """
+        with span('setpoints') as s:
+            ends = element_ends(net)
+            if self.basis == 'zone_min':
+                from coordination import zone_end_currents
+                ikss = zone_end_currents(net, bus_results, 'min', self.lv_tol_percent, topology)
+            else:
+                bus_pos = pd.Index(bus_results.index).get_indexer(ends['bus'])
+                if (bus_pos < 0).any():
+                    missing = sorted(set(np.asarray(ends['bus'])[bus_pos < 0].tolist()))
+                    raise KeyError(f"bus results are missing buses {missing}")
+                ikss = bus_results[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]].values[bus_pos]
+            table = SetpointTable(ends, ikss, self.compute(ikss, K=K), self.delays)
+            s.rows = len(table)
+        return table
+
+
+class SetpointTable:
+    """
+    列式定值结果：装置标签、短路电流和定值都以数组保存，
+    columns() 返回的每一列都是原数组的视图，只有调用 to_frame() 时才生成 DataFrame
+    """
+
+    def __init__(self, labels, ikss_ka, setpoints, delays):
+        self.labels = labels
+        self.ikss_ka = ikss_ka
+        self.setpoints = setpoints
+        self.delays = delays
+
+    def __len__(self):
+        return self.ikss_ka.shape[0]
+
+    def columns(self):
+        columns = dict(self.labels)
+        for i, fault in enumerate(FAULT_TYPES):
+            columns[f'{fault}_ikss_ka'] = self.ikss_ka[:, i]
+        for i, fault in enumerate(FAULT_TYPES):
+            for j, protection in enumerate(PROTECTION_TYPES):
+                columns[f'setpoint_{fault}_{protection}'] = self.setpoints[..., i, j]
+        return columns
+
+    def _delay_columns(self):
+        # 延时列与 calculate_protection_setpoints 的列名一致
+        columns = {}
+        for fault in FAULT_TYPES:
+            columns[f'time_delayed_{fault}'] = self.delays[1]
+            columns[f'time_graded_{fault}'] = self.delays[2]
+        return columns
+
+    def to_compact(self, **keys):
+        """
+        紧凑表示：标签列编码、定值 float32、延时和 keys（如 scenario/case）存为常量，列与 to_frame() 相同
+        :return: compact_results.CompactFrame
+        """
+        if self.setpoints.ndim != 3:
+            raise ValueError("to_compact only supports a single K table, select one batch entry first")
+        columns = self.columns()
+        names = list(columns)
+        categorical = {name: _encode(columns.pop(name)) for name in list(self.labels)
+                       if np.asarray(self.labels[name]).dtype == object}
+        numeric = {name: _compact_float(np.ascontiguousarray(values)) for name, values in columns.items()}
+        constants = dict(keys, **self._delay_columns())
+        order = list(keys) + names + list(self._delay_columns())
+        return CompactFrame(len(self), categorical, numeric, constants, order)
+
+    def to_frame(self):
+        if self.setpoints.ndim != 3:
+            raise ValueError("to_frame only supports a single K table, select one batch entry first")
+        columns = self.columns()
+        for name, delay in self._delay_columns().items():
+            columns[name] = np.full(len(self), delay)
+        return pd.DataFrame(columns)
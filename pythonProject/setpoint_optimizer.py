@@ -0,0 +1,313 @@
+import numpy as np
+import pandas as pd
+
+from coordination import CURVE_NAMES, DEFAULT_MARGIN, RelaySettings, _fault_points, _pairs, _relay_frame, \
+    operating_times, relay_currents
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, SequenceModel, calc_sc_sweep
+from sensitivity import SENSITIVITY_CHECKS
+from topology_index import TopologyIndex
+
+# 保护定值自动搜索
+# 每个继电器每段的动作电流为 K·I_ref（I_ref 为最大方式下继电器所在母线的短路电流，与 SetpointEngine 的定值含义相同），
+# 定时限段另有延时、反时限段另有 TMS。在 K 与时间的网格上搜索，使各继电器在其保护范围内的故障点动作时间之和最小，约束为：
+#     灵敏度  最小方式两相短路电流 / 动作电流 ≥ 要求的灵敏系数（按段给定）
+#     选择性  作为上级时，对下级继电器动作的每个故障点，动作时间 ≥ 下级动作时间 + 级差
+#     速断不越级  近电源端继电器的速断段不应在元件对端最大方式短路时动作（可靠系数 INSTANTANEOUS_RELIABILITY）
+#     段间关系  后一段的 K 不大于前一段，定时限延时不小于前一段
+# 继电器按从下游到上游的顺序逐个确定（下级定值确定后上级的选择性约束即为已知数组）；
+# 由于"各段动作时间的最小值 ≥ x"等价于"每段 ≥ x"，约束按段独立，各段依次选取，
+# 每段的全部候选 (K, 时间) 由一次数组运算求出动作时间、约束和目标值，不重新计算短路电流。
+# 继电器均为非方向继电器。背后没有电源（TopologyIndex.source_behind）又不作为其他继电器后备的继电器
+# （如辐射形线路负荷端），只能看到经并联支路分流的电流，不参与搜索，保持初始定值（状态 'fixed'）。
+# 某段没有满足全部约束的候选时，在违反约束最少、目标值相同的候选中取最小的 K，使该段尽量能够动作。
+
+K_GRID = np.round(np.arange(0.05, 2.0001, 0.05), 2)
+DELAY_GRID = np.round(np.arange(0., 2.0001, 0.1), 2)
+TMS_GRID = np.round(np.arange(0.05, 1.0001, 0.05), 2)
+
+# 各段要求的灵敏系数（最小方式两相短路电流 / 动作电流），取 sensitivity.py 中在保护范围末端校验的段，
+# 未列出的段不校核灵敏度
+SENSITIVITY_RATIOS = {stage: ratio for stage, (point, ratio) in SENSITIVITY_CHECKS.items() if point == 'end'}
+
+# 速断段动作电流不小于该系数乘以元件对端最大方式短路电流
+INSTANTANEOUS_RELIABILITY = 1.2
+
+# 保护范围内不动作的故障点在目标函数中计为该时间（秒）
+NO_TRIP_PENALTY = 10.
+
+_2PH = FAULT_TYPES.index('2ph')
+
+
+def _group_rows(values, n, keep=None):
+    # 按值分组的行号列表：第 i 个元素为 values == i 的行（只取 keep 为真的行）
+    rows = np.arange(len(values)) if keep is None else np.flatnonzero(keep)
+    order = rows[np.argsort(values[rows], kind='stable')]
+    bounds = np.searchsorted(values[order], np.arange(n + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n)]
+
+
+class SetpointOptimizer:
+    """
+    在网格上搜索各继电器的 K 系数与延时
+    :param net: pandapower 网络
+    :param relays: 初始整定表 RelaySettings（段数、曲线类型、不参与配合的继电器定值取自此表）
+    :param bus_results: {'max': ..., 'min': ...} calc_sc_sweep 的母线结果，缺省时计算
+    :param margin: 配合级差（秒）
+    :param sensitivity: {段名称: 灵敏系数}
+    :param min_pickup_ka: 动作电流下限（一次值，kA，如最大负荷电流），标量或每个继电器一个值
+    """
+
+    def __init__(self, net, relays, bus_results=None, lv_tol_percent=6, margin=DEFAULT_MARGIN,
+                 sensitivity=SENSITIVITY_RATIOS, min_pickup_ka=0., k_grid=K_GRID, delay_grid=DELAY_GRID,
+                 tms_grid=TMS_GRID):
+        self.relays = relays
+        self.margin = margin
+        self.sensitivity = sensitivity
+        self.k_grid = np.asarray(k_grid, dtype=np.float64)
+        self.delay_grid = np.asarray(delay_grid, dtype=np.float64)
+        self.tms_grid = np.asarray(tms_grid, dtype=np.float64)
+        self.min_pickup_ka = np.broadcast_to(np.asarray(min_pickup_ka, dtype=np.float64), (len(relays),))
+
+        with span('optimizer.prepare') as s:
+            models = {case: SequenceModel(net, case, lv_tol_percent) for case in ('max', 'min')}
+            bus_results = bus_results or {}
+            bus_results = {case: bus_results[case] if case in bus_results
+                           else calc_sc_sweep(net, case, lv_tol_percent, model=models[case]) for case in models}
+            topology = TopologyIndex(net)
+            rel = _relay_frame(relays, topology)
+            self.pairs = _pairs(rel, topology)
+            points = _fault_points(rel, self.pairs)
+            self.points = points
+
+            # 各故障点、各方式下上下级继电器的电流，形状 (点数, 方式数, 故障类型数)
+            currents = {}
+            for role, close_in in (('downstream', points['close_in'].values),
+                                   ('upstream', np.zeros(len(points), dtype=bool))):
+                currents[role] = np.stack([
+                    relay_currents(models[case], rel, points[role].values, points['fault_bus_pos'].values, close_in,
+                                   bus_results[case], topology)
+                    for case in ('max', 'min')], axis=1)
+            self.currents = currents
+
+            # 各继电器作为下级/上级的故障点行号；保护范围内同一故障点在多个配合对中重复出现，只计一次
+            n_relay = len(relays)
+            self._rows = {role: _group_rows(points[role].values, n_relay) for role in ('downstream', 'upstream')}
+            self._unique_rows = {role: _group_rows(points[role].values, n_relay,
+                                                   ~points.duplicated([role, 'point', 'fault_bus_pos']).values)
+                                 for role in ('downstream', 'upstream')}
+
+            # 不参与搜索的继电器：远电源端、不作为后备且背后没有电源
+            backup = np.array([len(rows) > 0 for rows in self._rows['upstream']], dtype=bool)
+            candidates = rel[rel['far'].values & ~backup[rel['relay'].values]]
+            self.fixed = np.zeros(n_relay, dtype=bool)
+            self.fixed[candidates['relay'].values[~topology.source_behind(candidates['position'].values)]] = True
+
+            # 参考电流：最大方式下继电器所在母线的短路电流
+            self.i_ref = np.full((len(relays), len(FAULT_TYPES)), np.nan)
+            self.i_ref[rel['relay'].values] = bus_results['max'][[f'{fault}_ikss_ka' for fault in FAULT_TYPES]] \
+                .values[rel['bus_pos'].values]
+            self.rel = rel
+            s.rows = len(points)
+
+    # ------------------------------------------------------------------ 准备
+    def _order(self):
+        # 从下游到上游的拓扑顺序（Kahn 算法）
+        relays = np.unique(np.r_[self.pairs['downstream'].values, self.pairs['upstream'].values])
+        pending = {r: 0 for r in relays}
+        for up in self.pairs['upstream'].values:
+            pending[up] += 1
+        uppers = self.pairs.groupby('downstream')['upstream'].apply(list).to_dict()
+        ready = [r for r in relays if pending[r] == 0]
+        order = []
+        while ready:
+            r = ready.pop()
+            order.append(r)
+            for up in uppers.get(r, ()):
+                pending[up] -= 1
+                if pending[up] == 0:
+                    ready.append(up)
+        if len(order) != len(relays):
+            raise ValueError("relay pairs contain a cycle, the network is not radial from its sources")
+        return order
+
+    def _primary(self, relay):
+        # 继电器的保护范围：作为下级的故障点；只作为上级的继电器（如变压器高压侧）取其后备故障点
+        role = 'downstream' if len(self._rows['downstream'][relay]) else 'upstream'
+        return self.currents[role][self._unique_rows[role][relay]]
+
+    def _remote_max(self, relay):
+        # 近电源端继电器元件对端的最大方式短路电流（速断不越级）
+        rows = self._rows['downstream'][relay]
+        rows = rows[self.points['point'].values[rows] == 'remote']
+        if not len(rows):
+            return None
+        return np.nanmax(self.currents['downstream'][rows][:, 0], axis=0)
+
+    # ------------------------------------------------------------------ 搜索
+    def _stage_candidates(self, relay, stage, previous):
+        curve = self.relays.curve[relay, stage]
+        if self.relays.stages[stage] == 'instantaneous':
+            times = self.relays.delay[relay, stage:stage + 1] if CURVE_NAMES[curve] == 'DT' \
+                else self.relays.tms[relay, stage:stage + 1]
+        else:
+            times = self.delay_grid if CURVE_NAMES[curve] == 'DT' else self.tms_grid
+        k, t = (a.ravel() for a in np.meshgrid(self.k_grid, times, indexing='ij'))
+        if previous is not None:
+            k_prev, t_prev, curve_prev = previous
+            keep = k <= k_prev
+            if CURVE_NAMES[curve] == 'DT' and CURVE_NAMES[curve_prev] == 'DT':
+                keep &= t >= t_prev
+            k, t = k[keep], t[keep]
+        # 同样的目标值下优先较大的 K、较短的时间
+        order = np.lexsort((t, -k))
+        return k[order], t[order], curve
+
+    def _stage_times(self, relay, stage, k, t, curve, currents):
+        # currents: (点数, 方式数, 故障类型数) -> (候选数, 点数·方式数·故障类型数)
+        # 电流以 I_ref 为基准，动作电流即 K
+        normalized = (currents / self.i_ref[relay]).reshape(-1)
+        n = len(k)
+        if CURVE_NAMES[curve] == 'DT':
+            tms, delay = np.ones((n, 1)), t[:, np.newaxis]
+        else:
+            tms, delay = t[:, np.newaxis], np.full((n, 1), self.relays.delay[relay, stage])
+        return operating_times(np.broadcast_to(normalized, (n, len(normalized))), k[:, np.newaxis],
+                               np.full((n, 1), curve), tms, delay)
+
+    def _optimize_relay(self, relay, settings):
+        """
+        :param settings: 当前整定值 (动作电流, 曲线, TMS, 延时)，下级继电器已确定
+        :return: 各段 K、各段时间（定时限为延时，反时限为 TMS）、状态
+        """
+        n_stage = len(self.relays.stages)
+        primary = self._primary(relay)
+        backup_rows = self._rows['upstream'][relay]
+        backup = self.currents['upstream'][backup_rows]
+        # 下级在同一故障点的动作时间
+        t_down = self._downstream_times(backup_rows, settings)
+        sensitivity_current = np.nanmin(primary[:, 1, _2PH]) if np.isfinite(primary[:, 1, _2PH]).any() else np.nan
+        remote_max = self._remote_max(relay)
+
+        best = np.full(len(primary.reshape(-1)) if len(primary) else 0, np.inf)
+        ks, ts, status = np.full(n_stage, np.nan), np.full(n_stage, np.nan), 'ok'
+        previous = None
+        for stage in range(n_stage):
+            name = self.relays.stages[stage]
+            k, t, curve = self._stage_candidates(relay, stage, previous)
+            violations = np.zeros(len(k))
+            pickup_2ph = k * self.i_ref[relay, _2PH]
+            violations += np.any(k[:, np.newaxis] * self.i_ref[relay] < self.min_pickup_ka[relay], axis=1)
+            insensitive = np.zeros(len(k), dtype=bool)
+            if name in self.sensitivity and np.isfinite(sensitivity_current):
+                insensitive = sensitivity_current / pickup_2ph < self.sensitivity[name]
+            if name == 'instantaneous' and remote_max is not None:
+                violations += np.any(k[:, np.newaxis] * self.i_ref[relay] < INSTANTANEOUS_RELIABILITY * remote_max,
+                                     axis=1)
+            unselective = np.zeros(len(k))
+            if len(backup):
+                t_up = self._stage_times(relay, stage, k, t, curve, backup)
+                with np.errstate(invalid='ignore'):
+                    unselective = (np.isfinite(t_down) & (t_up < t_down + self.margin)).sum(axis=1)
+            violations += insensitive + unselective
+
+            if len(primary):
+                t_stage = self._stage_times(relay, stage, k, t, curve, primary)
+                combined = np.minimum(best, t_stage)
+                objective = np.where(np.isfinite(combined), combined, NO_TRIP_PENALTY).sum(axis=1)
+            else:
+                combined = np.zeros((len(k), 0))
+                objective = np.zeros(len(k))
+            choice = np.lexsort((objective, violations))[0]
+            if violations[choice]:
+                # 无可行候选：同样违反约束、同样目标值时取最小的 K（候选按 K 从大到小排列）
+                tied = np.flatnonzero((violations == violations[choice]) & (objective == objective[choice]))
+                choice = tied[np.argmin(k[tied])]
+            if violations[choice] and status == 'ok':
+                status = 'unselective' if unselective[choice] else 'insensitive' if insensitive[choice] \
+                    else 'infeasible'
+            ks[stage], ts[stage] = k[choice], t[choice]
+            best = combined[choice]
+            previous = (k[choice], t[choice], curve)
+        return ks, ts, status
+
+    def _downstream_times(self, rows, settings):
+        # 故障点下级继电器的动作时间，展平为 (点数·方式数·故障类型数,)
+        down = self.points['downstream'].values[rows]
+        pickup, curve, tms, delay = settings
+        times = operating_times(self.currents['downstream'][rows][..., np.newaxis],
+                                pickup[down][:, np.newaxis], curve[down][:, np.newaxis, np.newaxis],
+                                tms[down][:, np.newaxis, np.newaxis], delay[down][:, np.newaxis, np.newaxis])
+        return times.reshape(-1)
+
+    def optimize(self):
+        """
+        :return: OptimizationResult
+        """
+        relays = self.relays
+        pickup = relays.pickup_ka.copy()
+        tms = np.array(relays.tms)
+        delay = np.array(relays.delay)
+        k_table = np.full((len(relays), len(relays.stages)), np.nan)
+        status = np.full(len(relays), 'fixed', dtype=object)
+        with span('optimizer.search') as s:
+            order = [relay for relay in self._order() if not self.fixed[relay]]
+            for relay in order:
+                ks, ts, status[relay] = self._optimize_relay(relay, (pickup, relays.curve, tms, delay))
+                k_table[relay] = ks
+                pickup[relay] = self.i_ref[relay][:, np.newaxis] * ks
+                dt = np.array([CURVE_NAMES[c] == 'DT' for c in relays.curve[relay]])
+                delay[relay] = np.where(dt, ts, delay[relay])
+                tms[relay] = np.where(dt, tms[relay], ts)
+            s.rows = len(order)
+        return OptimizationResult(RelaySettings(relays.labels, pickup, relays.curve, tms, delay, relays.stages),
+                                  k_table, status)
+
+
+class OptimizationResult:
+    """
+    :param relays: 搜索得到的 RelaySettings
+    :param k: 各继电器各段的 K 系数（未参与搜索的继电器为 NaN）
+    :param status: 各继电器状态：'ok'、'unselective'（无法满足级差）、'insensitive'（无法满足灵敏度）、
+                   'infeasible'（其他约束）、'fixed'（未参与配合或背后没有电源，保持原定值）
+    """
+
+    def __init__(self, relays, k, status):
+        self.relays = relays
+        self.k = k
+        self.status = status
+
+    def to_frame(self):
+        """
+        每个继电器每段一行：relay, stage, curve, k, delay_s, tms, 各故障类型动作电流（kA）, status
+        """
+        r = self.relays
+        n_relay, n_stage = r.curve.shape
+        relay, stage = (a.ravel() for a in np.meshgrid(np.arange(n_relay), np.arange(n_stage), indexing='ij'))
+        frame = pd.DataFrame({
+            'relay': r.names()[relay],
+            'stage': np.array(r.stages, dtype=object)[stage],
+            'curve': np.array(CURVE_NAMES, dtype=object)[r.curve[relay, stage]],
+            'k': self.k[relay, stage],
+            'delay_s': r.delay[relay, stage],
+            'tms': r.tms[relay, stage],
+        })
+        for i, fault in enumerate(FAULT_TYPES):
+            frame[f'pickup_{fault}_ka'] = r.pickup_ka[relay, i, stage]
+        frame['status'] = self.status[relay]
+        return frame
+
+
+def optimize_setpoints(net, setpoint_table, bus_results=None, CT_ratio=1., curves=None, **kwargs):
+    """
+    由 SetpointEngine 的定值表出发搜索各继电器的 K 系数与延时
+    :param net: pandapower 网络
+    :param setpoint_table: SetpointEngine.setpoint_table 的结果（确定继电器、段数和初始定值）
+    :param bus_results: {'max': ..., 'min': ...} calc_sc_sweep 的母线结果，缺省时计算
+    :param CT_ratio: 计算定值时使用的电流互感器变比
+    :param curves: {保护段: (曲线名称, TMS)}，见 RelaySettings.from_setpoints
+    :param kwargs: 传给 SetpointOptimizer 的其他参数（margin、sensitivity、min_pickup_ka、各搜索网格等）
+    :return: OptimizationResult
+    """
+    relays = RelaySettings.from_setpoints(setpoint_table, CT_ratio, curves)
+    return SetpointOptimizer(net, relays, bus_results, **kwargs).optimize()
@@ -0,0 +1,48 @@
+import os
+
+from network_factory import add_spec_elements, cached_network, cached_tables
+from substation_loader import read_substation
+
+# 变电站网络模型：各计算脚本共用的母线、电源、变压器、线路和负荷定义
+# 元件参数只保存在 substations/35kV_substation/ 下的表格文件中（格式见 substation_loader），这里不再重复
+
+SUBSTATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'substations', '35kV_substation')
+
+# 定义最大和最小模式的电流（ext_grids.csv 中的短路容量即 35kV × 该电流 × √3）
+Imax = 6.72  # 最大电流，单位：kA
+Imin = 3.35  # 最小电流，单位：kA
+
+
+# 变电站定义（供 network_factory 批量建网）
+def substation_spec():
+    return read_substation(SUBSTATION_DIR)
+
+
+# 创建网络
+def create_network():
+    # pandapower 导入较慢，只在建网时导入
+    import pandapower as pp
+
+    net = pp.create_empty_network()
+    return net
+
+# 添加母线、外部电网、变压器、线路和负荷
+def add_elements(net):
+    add_spec_elements(net, substation_spec())
+
+
+# 建立完整的变电站网络（可被 pickle，供多进程工作进程调用）
+def build_network():
+    net = create_network()
+    add_elements(net)
+    return net
+
+
+# 从磁盘缓存读取变电站网络，定义未变时无需重新建网
+def load_network():
+    return cached_network(substation_spec())
+
+
+# 只读表格视图，缓存命中时无需导入 pandapower
+def load_tables():
+    return cached_tables(substation_spec())
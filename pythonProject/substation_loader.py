@@ -0,0 +1,155 @@
+import os
+
+import pandas as pd
+
+from network_factory import SPEC_TABLES, build_network, cached_network, normalize_spec
+from results_sink import long_results
+from sc_sweep import calc_sc_sweep, run_short_circuit_sweep
+
+# 变电站定义文件的读取与逐站流式加载
+# 一个数据目录下每个变电站占一项，支持两种形式：
+#     <根目录>/<变电站>/            每张表一个文件：buses.csv、lines.parquet、trafos.yaml ...
+#     <根目录>/<变电站>.yaml        单个 YAML 文件，顶层键为表名，值为记录列表
+# 表名与列名同 network_factory 中的定义（SPEC_TABLES），母线一律用名称引用。
+# 线路长度既可以给 length_km，也可以给 length_m（与原 line_parameters 的单位一致）。
+
+TABLE_FORMATS = ('.csv', '.parquet', '.yaml', '.yml')
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("YAML substation files require PyYAML (pip install pyyaml)")
+    return yaml
+
+
+def _read_yaml(path):
+    with open(path, encoding='utf-8') as f:
+        return _yaml().safe_load(f) or {}
+
+
+def _read_table(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        # 名称中的首尾空格是原始数据的一部分，保持原样
+        return pd.read_csv(path, encoding='utf-8', float_precision='round_trip')
+    if ext == '.parquet':
+        return pd.read_parquet(path)
+    return pd.DataFrame(_read_yaml(path))
+
+
+def _finalize(spec):
+    lines = spec.get('lines')
+    if lines is not None and len(lines) and 'length_km' not in lines.columns and 'length_m' in lines.columns:
+        lines = lines.copy()
+        lines.insert(lines.columns.get_loc('length_m'), 'length_km', lines.pop('length_m') / 1000)
+        spec['lines'] = lines
+    return spec
+
+
+def read_substation(path):
+    """
+    读取一个变电站的定义
+    :param path: 变电站目录或 YAML 文件
+    :return: 变电站定义（各表为 DataFrame）
+    """
+    if os.path.isdir(path):
+        spec = {}
+        for table in SPEC_TABLES:
+            files = [os.path.join(path, table + ext) for ext in TABLE_FORMATS
+                     if os.path.exists(os.path.join(path, table + ext))]
+            if len(files) > 1:
+                raise ValueError(f"{path}: table '{table}' is defined more than once: {files}")
+            if files:
+                spec[table] = _read_table(files[0])
+    else:
+        data = _read_yaml(path)
+        unknown = set(data) - set(SPEC_TABLES) - {'name'}
+        if unknown:
+            raise ValueError(f"{path}: unknown tables {sorted(unknown)}")
+        spec = {table: pd.DataFrame(data[table]) for table in SPEC_TABLES if data.get(table)}
+    if 'buses' not in spec:
+        raise ValueError(f"{path}: substation has no bus table")
+    return normalize_spec(_finalize(spec))
+
+
+def _substation_name(path):
+    name = os.path.basename(os.path.normpath(path))
+    return name if os.path.isdir(path) else os.path.splitext(name)[0]
+
+
+def list_substations(root):
+    """
+    数据目录下的全部变电站，按名称排序
+    :return: [(名称, 路径), ...]
+    """
+    entries = []
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        if os.path.isdir(path) or os.path.splitext(entry)[1].lower() in ('.yaml', '.yml'):
+            entries.append((_substation_name(path), path))
+    return entries
+
+
+def iter_substations(root, names=None, cache=True, cache_dir=None):
+    """
+    逐个读取变电站并建立网络，任一时刻只保留一个网络，内存占用与变电站数量无关
+    :param root: 数据目录
+    :param names: 只加载这些变电站，None 为全部
+    :param cache: 是否使用 network_factory 的磁盘缓存
+    :return: 生成 (名称, 网络)
+    """
+    for name, path in list_substations(root):
+        if names is not None and name not in names:
+            continue
+        spec = read_substation(path)
+        net = cached_network(spec, cache_dir) if cache else build_network(spec)
+        yield name, net
+
+
+def write_substation(spec, path, fmt='csv'):
+    """
+    把变电站定义写成每表一个文件的目录
+    :param spec: 变电站定义
+    :param path: 目标目录
+    :param fmt: 'csv'、'parquet' 或 'yaml'
+    """
+    os.makedirs(path, exist_ok=True)
+    for table, df in normalize_spec(spec).items():
+        if not len(df):
+            continue
+        target = os.path.join(path, f"{table}.{fmt}")
+        if fmt == 'csv':
+            df.to_csv(target, index=False, encoding='utf-8')
+        elif fmt == 'parquet':
+            df.to_parquet(target, index=False)
+        elif fmt == 'yaml':
+            with open(target, 'w', encoding='utf-8') as f:
+                _yaml().safe_dump(df.to_dict('records'), f, allow_unicode=True, sort_keys=False)
+        else:
+            raise ValueError(f"unknown format '{fmt}'")
+
+
+def run_fleet(root, case='max', lv_tol_percent=6, names=None, cache=True):
+    """
+    对数据目录下的全部变电站逐个计算短路电流
+    :return: 生成 (名称, run_short_circuit_sweep 的四张结果表)
+    """
+    for name, net in iter_substations(root, names=names, cache=cache):
+        yield name, run_short_circuit_sweep(net, case, lv_tol_percent)
+
+
+def export_fleet(root, sink, cases=('max', 'min'), lv_tol_percent=6, names=None, cache=True):
+    """
+    逐个变电站计算并写入结果汇，内存中只保留当前变电站的结果
+    :param sink: 结果汇（ParquetResultStore 或 ExcelResultSink）
+    :return: 已写入的变电站名称列表
+    """
+    done = []
+    for name, net in iter_substations(root, names=names, cache=cache):
+        for case in cases:
+            bus_results = calc_sc_sweep(net, case, lv_tol_percent)
+            sink.write(long_results(net, bus_results), substation=name, scenario='base', case=case)
+        done.append(name)
+    return done
@@ -0,0 +1,23 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+# 项目模块为平铺的脚本模块，测试时把项目目录加入搜索路径（同 benchmarks/）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+
+def pytest_configure(config):
+    # pytest 在每个测试中重置警告过滤器，pandapower 内部的 FutureWarning 同样忽略
+    config.addinivalue_line('filterwarnings', 'ignore::FutureWarning')
+
+
+@pytest.fixture(params=[False, True], ids=['coupler-open', 'coupler-closed'])
+def net(request):
+    """原变电站网络，母联分、合两种状态"""
+    from substation import build_network
+    net = build_network()
+    net.switch['closed'] = request.param
+    return net
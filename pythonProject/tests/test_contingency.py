@@ -0,0 +1,20 @@
+import copy
+
+import numpy as np
+import pytest
+
+from contingency import ContingencyEngine, n1_contingencies, n2_contingencies
+from scenarios import apply_scenario
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+
+COLUMNS = [f'{fault}_ikss_ka' for fault in FAULT_TYPES]
+
+
+@pytest.mark.parametrize('case', ['max', 'min'])
+def test_outages_match_full_solve(net, case):
+    # 停运元件的低秩修正与在停运后的网络上重新计算相同（含进线 N-2 造成的孤岛母线，均为 NaN）
+    contingencies = n1_contingencies(net) + n2_contingencies(net)
+    ikss = ContingencyEngine(net, case).screen(contingencies)
+    for contingency, currents in zip(contingencies, ikss):
+        expected = calc_sc_sweep(apply_scenario(copy.deepcopy(net), contingency), case)[COLUMNS].values
+        np.testing.assert_allclose(currents, expected, rtol=1e-9, err_msg=contingency['name'])
@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from fault_sweep import line_fault_sweep
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+
+
+@pytest.mark.parametrize('case', ['max', 'min'])
+def test_line_ends_match_bus_results(net, case):
+    # 线路两端（x = 0、1）的故障电流与首端、末端母线的结果相同
+    bus = calc_sc_sweep(net, case)[[f'{fault}_ikss_ka' for fault in FAULT_TYPES]]
+    sweep = line_fault_sweep(net, case, points=5)
+    lines = net.line.loc[sweep.line_index]
+    np.testing.assert_allclose(sweep.ikss[:, :, 0], bus.loc[lines['from_bus'].values].values, rtol=1e-12)
+    np.testing.assert_allclose(sweep.ikss[:, :, -1], bus.loc[lines['to_bus'].values].values, rtol=1e-12)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from incremental import IncrementalSweep
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+from setpoint_engine import SetpointEngine
+
+COLUMNS = [f'{fault}_ikss_ka' for fault in FAULT_TYPES]
+
+
+@pytest.mark.parametrize('case', ['max', 'min'])
+def test_low_rank_update_matches_full_solve(net, case):
+    # 修改线路长度、变压器短路电压和电源容量后，Woodbury 修正与重新分解的结果相同
+    sweep = IncrementalSweep(net, case)
+    net.line.at[net.line.index[0], 'length_km'] *= 3
+    net.trafo.at[net.trafo.index[1], 'vk_percent'] = 10.
+    net.ext_grid.at[net.ext_grid.index[0], f's_sc_{case}_mva'] *= 0.5
+    info = sweep.update()
+    assert not info['refactored']
+    assert len(info['buses'])
+
+    expected = calc_sc_sweep(net, case)
+    np.testing.assert_allclose(sweep.bus_results[COLUMNS].values, expected[COLUMNS].values, rtol=1e-9)
+    setpoints = SetpointEngine().setpoint_table(net, expected)
+    np.testing.assert_allclose(sweep.setpoints.setpoints, setpoints.setpoints, rtol=1e-9)
+
+
+def test_topology_change_refactors(net):
+    # 切换母联开关改变节点合并方式，重新分解
+    sweep = IncrementalSweep(net)
+    net.switch['closed'] = ~net.switch['closed'].astype(bool)
+    assert sweep.update()['refactored']
+    np.testing.assert_allclose(sweep.bus_results[COLUMNS].values, calc_sc_sweep(net)[COLUMNS].values, rtol=1e-9)
@@ -0,0 +1,28 @@
+import copy
+
+import numpy as np
+import pytest
+
+from monte_carlo import BatchedFaultModel, MonteCarloStudy
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+
+COLUMNS = [f'{fault}_ikss_ka' for fault in FAULT_TYPES]
+
+
+@pytest.mark.parametrize('case', ['max', 'min'])
+def test_samples_match_full_solve(net, case):
+    # 批量 Woodbury 修正得到的各样本电流与按样本参数修改网络后重新计算相同
+    samples = MonteCarloStudy(net, case, seed=1, r_fault_ohm=(0., 2.)).draw(4)
+    currents = BatchedFaultModel(net, case).currents(samples)
+    eg, trafo = net.ext_grid.index, net.trafo.index
+    for s in range(len(currents)):
+        sample_net = copy.deepcopy(net)
+        sample_net.ext_grid.loc[eg, f's_sc_{case}_mva'] = samples['s_sc_mva'][s]
+        # 零序短路电压与正序按同一比例变化（SequenceModel.transformer_impedances）
+        sample_net.trafo.loc[trafo, 'vk0_percent'] *= samples['vk_percent'][s] / net.trafo['vk_percent'].values
+        sample_net.trafo.loc[trafo, 'vk_percent'] = samples['vk_percent'][s]
+        bolted = calc_sc_sweep(sample_net, case)
+        ground = calc_sc_sweep(sample_net, case, r_fault_ohm=samples['r_fault_ohm'][s])
+        expected = np.c_[bolted[COLUMNS[:2]].values, ground[COLUMNS[2]].values]
+        # 结果以 float32 保存
+        np.testing.assert_allclose(currents[s], expected, rtol=1e-6)
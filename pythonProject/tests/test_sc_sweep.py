@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+
+
+@pytest.mark.parametrize('fault', FAULT_TYPES)
+@pytest.mark.parametrize('case', ['max', 'min'])
+def test_sweep_matches_calc_sc(net, case, fault):
+    # 一次分解求得的全部母线结果与 pandapower 逐故障类型的 calc_sc 相同
+    import pandapower.shortcircuit as sc
+
+    sweep = calc_sc_sweep(net, case, lv_tol_percent=6)
+    sc.calc_sc(net, fault=fault, case=case, lv_tol_percent=6)
+    expected = net.res_bus_sc['ikss_ka'].reindex(sweep.index).values
+    np.testing.assert_allclose(sweep[f'{fault}_ikss_ka'].values, expected, rtol=1e-9)
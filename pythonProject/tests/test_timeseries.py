@@ -0,0 +1,30 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from scenarios import apply_scenario
+from sc_sweep import FAULT_TYPES, calc_sc_sweep
+from timeseries import TimeSeriesStudy
+
+COLUMNS = [f'{fault}_ikss_ka' for fault in FAULT_TYPES]
+
+
+def test_steps_match_full_solve(net):
+    # 各时段（母联分合、线路投退、电源容量变化）的结果与按该时段状态修改网络后重新计算相同
+    line = net.line['name'].iloc[0]
+    s_sc = net.ext_grid['s_sc_max_mva'].iloc[0]
+    profile = pd.DataFrame({
+        'Bus Coupler': [False, True, True, False],
+        line: [True, True, False, False],
+        's_sc_max_mva': [s_sc, 0.8 * s_sc, s_sc, 0.5 * s_sc],
+    }, index=pd.date_range('2024-01-01', periods=4, freq='15min'))
+    study = TimeSeriesStudy(net)
+    currents = study.solve(profile).bus_currents('max')
+    for step, (_, row) in enumerate(profile.iterrows()):
+        step_net = apply_scenario(copy.deepcopy(net), {'switches': {0: row['Bus Coupler']},
+                                                   'out_of_service': {} if row[line] else {'line': [line]}})
+        step_net.ext_grid['s_sc_max_mva'] = row['s_sc_max_mva']
+        expected = calc_sc_sweep(step_net, 'max')[COLUMNS].values
+        np.testing.assert_allclose(currents[step], expected, rtol=1e-6)
+    assert study.stats()['factorizations'] == 4
@@ -0,0 +1,279 @@
+import copy
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from compact_results import CompactFrame, _codes, element_labels, intern_categories
+from instrumentation import span
+from monte_carlo import BatchedFaultModel
+from sc_sweep import FAULT_TYPES, element_ends
+from scenarios import _element_index
+
+# 短路电流时间序列：按时段给出开关状态、元件投退和电源强度（如一年 15 分钟一点），逐时段计算短路电流
+# 运行曲线 profile 为以时间为索引的 DataFrame，每列对应一个可变量：
+#     开关名称（如 "Bus Coupler"）             值为是否闭合
+#     线路/变压器/外部电网名称（如 "6109&1#电容器"）  值为是否投运（名称两端空格忽略）
+#     外部电网参数列（如 "s_sc_max_mva"）       全部电源取同一值；"s_sc_max_mva[1]" 只改索引（或名称）为 1 的电源
+# 值为 NaN 时保持网络中的原值。
+# 计算前先对时段去重：
+#     拓扑  开关、投退状态及电源短路容量以外的参数相同的时段共用一个分解（BatchedFaultModel），
+#           已分解的拓扑按 (方式, 状态) 缓存，分段输入（如逐月）时跨段复用
+#     状态  同一拓扑下只有电源短路容量不同的时段由一次批量 Woodbury 修正求出（见 monte_carlo.py），
+#           完全相同的时段只算一次
+# 结果为时间为首列的长格式列式数据（CompactFrame，每时段每个故障类型每个元件端一行），按段流式输出，
+# 可直接写入 results_sink.ParquetResultStore。
+
+# 电源短路容量列，按方式取用，只改变电源导纳，不重新分解
+SOURCE_COLUMNS = {'max': 's_sc_max_mva', 'min': 's_sc_min_mva'}
+
+# 每段输出的时段数（15 分钟一点时约一个月）
+DEFAULT_CHUNK_STEPS = 96 * 30
+
+# 缓存的已分解拓扑数上限
+DEFAULT_MAX_TOPOLOGIES = 256
+
+_ELEMENT_COLUMN = re.compile(r'^(\w+)\[(.+)\]$')
+
+# 按名称匹配的元件表及其状态列（依次查找）
+STATE_TABLES = (('switch', 'closed'), ('line', 'in_service'), ('trafo', 'in_service'), ('ext_grid', 'in_service'))
+
+
+def read_profile(path):
+    """
+    读取运行曲线（.csv/.xlsx/.parquet），第一列为时间
+    :return: 以时间为索引的 DataFrame
+    """
+    if path.endswith('.parquet'):
+        profile = pd.read_parquet(path)
+        if not isinstance(profile.index, pd.DatetimeIndex):
+            profile = profile.set_index(profile.columns[0])
+    elif path.endswith('.xlsx'):
+        profile = pd.read_excel(path, index_col=0)
+    else:
+        profile = pd.read_csv(path, index_col=0, encoding='utf-8-sig')
+    profile.index = pd.to_datetime(profile.index)
+    profile.index.name = 'time'
+    return profile
+
+
+def _element_key(key):
+    return int(key) if key.lstrip('-').isdigit() else key
+
+
+def profile_columns(net, columns):
+    """
+    把运行曲线的列解析为元件
+    :return: {列名: (元件表, 元件索引数组, 字段)}
+    """
+    resolved = {}
+    for column in columns:
+        match = _ELEMENT_COLUMN.match(str(column))
+        if match and match.group(1) in net.ext_grid.columns:
+            index = np.array([_element_index(net.ext_grid, _element_key(match.group(2)))])
+            resolved[column] = ('ext_grid', index, match.group(1))
+            continue
+        if column in net.ext_grid.columns:
+            resolved[column] = ('ext_grid', net.ext_grid.index.values, column)
+            continue
+        for table, field in STATE_TABLES:
+            names = net[table]['name'].astype(str).str.strip() if 'name' in net[table] else pd.Series(dtype=str)
+            matches = net[table].index[(names == str(column).strip()).values]
+            if len(matches):
+                resolved[column] = (table, matches.values[:1], field)
+                break
+        else:
+            raise KeyError(f"profile column '{column}' does not match a switch, line, trafo, ext_grid or "
+                           f"ext_grid parameter")
+    return resolved
+
+
+def _profile_values(profile, columns):
+    # 布尔/数值列 -> float64，NaN 表示保持原值
+    values = np.empty((len(profile), len(columns)))
+    for j, column in enumerate(columns):
+        series = profile[column]
+        if series.dtype == object:
+            series = series.map(lambda v: v if not isinstance(v, str) else
+                                {'true': 1., 'false': 0.}.get(v.strip().lower(), v))
+        values[:, j] = pd.to_numeric(series, errors='raise').astype(np.float64)
+    return values
+
+
+def _unique_rows(values):
+    # 按行去重，NaN 视为相同
+    if not values.shape[1]:
+        return np.zeros((1, 0)), np.zeros(len(values), dtype=np.int64)
+    keyed = np.where(np.isnan(values), np.inf, values)
+    rows, inverse = np.unique(keyed, axis=0, return_inverse=True)
+    return np.where(np.isinf(rows), np.nan, rows), inverse.ravel()
+
+
+class TimeSeriesStudy:
+    """
+    短路电流时间序列计算
+    :param net: 基础网络（不会被修改），如 substation.load_tables() / build_network()
+    :param cases: 计算的方式
+    :param max_topologies: 缓存的已分解拓扑数（按最近使用保留）
+    """
+
+    def __init__(self, net, cases=('max',), lv_tol_percent=6, max_topologies=DEFAULT_MAX_TOPOLOGIES):
+        self.net = net
+        self.cases = tuple(cases)
+        self.lv_tol_percent = lv_tol_percent
+        self.max_topologies = max_topologies
+        self._models = OrderedDict()
+        self.counts = {'steps': 0, 'states': 0, 'factorizations': 0, 'topology_hits': 0}
+
+    def _topology_net(self, resolved, columns, row):
+        # 在基础网络的副本上施加一个拓扑状态（只复制涉及的元件表）
+        net = copy.copy(self.net)
+        for table in {resolved[column][0] for column in columns}:
+            net[table] = self.net[table].copy()
+        for column, value in zip(columns, row):
+            if np.isnan(value):
+                continue
+            table, index, field = resolved[column]
+            net[table].loc[index, field] = bool(value) if field in ('closed', 'in_service') else value
+        return net
+
+    def _model(self, case, resolved, columns, row):
+        key = (case, tuple(columns), tuple(np.where(np.isnan(row), np.inf, row)))
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            self.counts['topology_hits'] += 1
+            return model
+        model = BatchedFaultModel(self._topology_net(resolved, columns, row), case, self.lv_tol_percent)
+        self.counts['factorizations'] += 1
+        self._models[key] = model
+        while len(self._models) > self.max_topologies:
+            self._models.popitem(last=False)
+        return model
+
+    def _source_values(self, model, resolved, columns, rows):
+        # 各状态的电源短路容量 (状态, 电源)，未给定的取拓扑网络中的原值
+        s_sc = np.broadcast_to(model.model.ext_grid_params['s_sc_mva'],
+                               (len(rows), len(model.model.ext_grid_index))).copy()
+        eg_index = pd.Index(model.model.ext_grid_index)
+        for j, column in enumerate(columns):
+            pos = eg_index.get_indexer(resolved[column][1])
+            pos = pos[pos >= 0]
+            given = ~np.isnan(rows[:, j])
+            s_sc[np.ix_(given, pos)] = rows[given, j][:, np.newaxis]
+        return s_sc
+
+    def solve(self, profile):
+        """
+        计算一段运行曲线
+        :param profile: 以时间为索引的运行曲线
+        :return: TimeSeriesResult
+        """
+        columns = list(profile.columns)
+        resolved = profile_columns(self.net, columns)
+        values = _profile_values(profile, columns)
+        n_bus = len(self.net.bus)
+        step_state, state_currents = {}, {}
+        with span('timeseries.solve', steps=len(profile)) as s:
+            for case in self.cases:
+                source = [j for j, column in enumerate(columns) if resolved[column][2] == SOURCE_COLUMNS[case]]
+                other = [j for j, column in enumerate(columns) if resolved[column][2] not in SOURCE_COLUMNS.values()]
+                topology_rows, topology = _unique_rows(values[:, other])
+                state_rows, state = _unique_rows(np.column_stack([topology, values[:, source]]))
+                currents = np.empty((len(state_rows), n_bus, len(FAULT_TYPES)), dtype=np.float32)
+                topology_columns = [columns[j] for j in other]
+                source_columns = [columns[j] for j in source]
+                for t, row in enumerate(topology_rows):
+                    states = np.flatnonzero(state_rows[:, 0] == t)
+                    model = self._model(case, resolved, topology_columns, row)
+                    s_sc = self._source_values(model, resolved, source_columns, state_rows[states, 1:])
+                    currents[states] = model.currents(model.base_samples(len(states), s_sc_mva=s_sc))
+                step_state[case] = state
+                state_currents[case] = currents
+                self.counts['states'] += len(state_rows)
+            self.counts['steps'] += len(profile)
+            s.rows = len(profile)
+        return TimeSeriesResult(self.net, profile.index.values, step_state, state_currents)
+
+    def stream(self, profile, chunk_steps=DEFAULT_CHUNK_STEPS, **keys):
+        """
+        分段计算并逐段输出
+        :param keys: 每段都相同的列（如 scenario='...'），存为常量
+        :return: 生成器，每段每个方式产生 (case, CompactFrame)
+        """
+        labels = element_labels(self.net)
+        for start in range(0, len(profile), chunk_steps):
+            result = self.solve(profile.iloc[start:start + chunk_steps])
+            for case in self.cases:
+                yield case, result.to_compact(case, labels, **keys)
+
+    def write(self, sink, profile, substation='default', chunk_steps=DEFAULT_CHUNK_STEPS, **keys):
+        """
+        分段计算并写入结果汇（如 results_sink.ParquetResultStore），不在内存中累积
+        :return: 写入的行数
+        """
+        rows = 0
+        for _, frame in self.stream(profile, chunk_steps, **keys):
+            sink.write(frame, substation=substation)
+            rows += len(frame)
+        return rows
+
+    def stats(self):
+        """
+        :return: 时段数、不同状态数、分解次数、拓扑缓存命中次数
+        """
+        return dict(self.counts)
+
+
+class TimeSeriesResult:
+    """
+    :param times: 各时段的时间
+    :param step_state: {方式: 各时段的状态编号}
+    :param state_currents: {方式: 形状为 (状态, 母线, 3) 的短路电流（kA，float32）}
+    """
+
+    def __init__(self, net, times, step_state, state_currents):
+        self.net = net
+        self.times = times
+        self.step_state = step_state
+        self.state_currents = state_currents
+
+    def __len__(self):
+        return len(self.times)
+
+    def bus_currents(self, case='max'):
+        """
+        :return: 形状为 (时段, 母线, 3) 的短路电流
+        """
+        return self.state_currents[case][self.step_state[case]]
+
+    def bus_results(self, time, case='max'):
+        """
+        某一时刻的母线结果，格式同 calc_sc_sweep
+        """
+        step = pd.Index(self.times).get_loc(pd.Timestamp(time) if not isinstance(time, (int, np.integer)) else time)
+        values = self.state_currents[case][self.step_state[case][step]].astype(np.float64)
+        return pd.DataFrame({f'{fault}_ikss_ka': values[:, i] for i, fault in enumerate(FAULT_TYPES)},
+                            index=self.net.bus.index)
+
+    def to_compact(self, case='max', labels=None, **keys):
+        """
+        长格式列式结果：case, time, fault, element_type, element, side, bus, ikss_ka，
+        行顺序为时段 × 故障类型 × 元件端（每个时段内与 results_sink.long_results 相同）
+        :param labels: compact_results.element_labels(net)，批量输出时传入以免重复编码
+        :param keys: 整段相同的列（如 scenario='...'），与 case 一起存为常量，位于最前
+        :return: CompactFrame
+        """
+        labels = element_labels(self.net) if labels is None else labels
+        pos = pd.Index(self.net.bus.index).get_indexer(element_ends(self.net)['bus'])
+        currents = self.state_currents[case][:, pos, :]                  # (状态, 元件端, 3)
+        ikss = currents[self.step_state[case]].transpose(0, 2, 1).reshape(-1)
+        n_end, n_fault, n_step = len(pos), len(FAULT_TYPES), len(self)
+        fault = np.tile(np.repeat(np.arange(n_fault), n_end), n_step)
+        categorical = {'fault': (_codes(fault, n_fault), intern_categories(FAULT_TYPES))}
+        for name, (codes, categories) in labels.items():
+            categorical[name] = (np.tile(codes, n_fault * n_step), categories)
+        numeric = {'time': np.repeat(self.times, n_end * n_fault), 'ikss_ka': ikss}
+        order = list(keys) + ['case', 'time', 'fault', 'element_type', 'element', 'side', 'bus', 'ikss_ka']
+        return CompactFrame(len(ikss), categorical, numeric, dict(keys, case=case), order)
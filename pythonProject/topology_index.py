@@ -0,0 +1,372 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+from instrumentation import span
+from sc_sweep import element_ends
+
+# 拓扑索引：保护范围、故障路径与继电器映射的预计算
+# 由 net.bus / net.line / net.trafo / net.switch（及外部电网所在母线）一次建立，全部以数组保存：
+#     节点      闭合的母线-母线开关合并的母线组（编号与 SequenceModel.node_of_bus 相同）
+#     支路      投运且两端开关均闭合的线路/变压器，邻接关系为 CSR（adj_indptr / adj_node / adj_branch）
+#     电源距离  各节点到外部电网的最少支路数
+#     上游路径  各节点到电源各条最短路径上的全部支路，并联支路均计入（CSR，path_indptr / path_branch，由近及远）
+#     移相      各节点相对参考的 30° 移相次数奇偶（经过 D/Y 变压器改变一次）
+#     继电器    与 element_ends 顺序相同（母线、线路两端、变压器两侧），每个继电器的保护范围（zone）、
+#               所在/对端母线与节点、是否靠近电源；节点 -> 进线继电器、节点 -> 向其供电的近电源端继电器、
+#               节点 -> 看到该点故障的继电器均为 CSR
+# 配合、灵敏度、定值计算按位置数组直接取值，不再逐元件遍历图或筛选 DataFrame。
+# 开关状态改变时（set_switch / sync）只重算节点、支路投退与由此导出的数组，元件表的解析结果保留。
+
+ZONE_KINDS = ('bus', 'line', 'trafo')
+
+
+def _csr(rows, values, n_rows):
+    # 按行（稳定排序，行内保持 values 的原顺序）组成 CSR：(indptr, 值)
+    rows = np.asarray(rows, dtype=np.int64)
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, np.asarray(values)[order]
+
+
+def _shifting(vector_groups):
+    # 联结组别两侧绕组类型不同（D/Y）时两侧相差 30°
+    windings = [[c for c in str(g).lower() if c in 'dyz'][:2] for g in vector_groups]
+    return np.array([len(w) == 2 and w[0] != w[1] for w in windings], dtype=bool)
+
+
+class TopologyIndex:
+    """
+    网络拓扑的数组索引
+    :param net: pandapower 网络（或 NetworkTables）
+    """
+
+    def __init__(self, net):
+        with span('topology.index') as s:
+            self._build_static(net)
+            self._build_dynamic()
+            s.rows = len(self.relay_bus_pos)
+
+    # ------------------------------------------------------------------ 元件表（只解析一次）
+    def _build_static(self, net):
+        self.bus_index = net.bus.index.values
+        self.bus_names = net.bus['name'].values
+        self._bus_pos = np.full(int(self.bus_index.max()) + 1 if len(self.bus_index) else 0, -1, dtype=np.int64)
+        self._bus_pos[self.bus_index] = np.arange(len(self.bus_index))
+
+        sw = net.switch
+        self.switch_index = sw.index.values
+        self.switch_et = sw['et'].values.astype(str)
+        self.switch_bus = self.bus_positions(sw['bus'].values)
+        self.switch_element = sw['element'].values.astype(np.int64)
+        self.switch_closed = sw['closed'].values.astype(bool).copy()
+
+        line, trafo = net.line, net.trafo
+        self.branch_type = np.r_[np.zeros(len(line), dtype=np.int8), np.ones(len(trafo), dtype=np.int8)]
+        self.branch_element = np.r_[line.index.values, trafo.index.values].astype(np.int64)
+        self.branch_a = self.bus_positions(np.r_[line.from_bus.values, trafo.hv_bus.values])
+        self.branch_b = self.bus_positions(np.r_[line.to_bus.values, trafo.lv_bus.values])
+        self.branch_in_service = np.r_[line.in_service.values, trafo.in_service.values].astype(bool)
+        groups = trafo['vector_group'].values if 'vector_group' in trafo.columns else np.full(len(trafo), 'Dyn')
+        self.branch_shifting = np.r_[np.zeros(len(line), dtype=bool), _shifting(groups)]
+        # 支路所在开关的元件类型代码
+        self._branch_et = np.r_[np.full(len(line), 'l'), np.full(len(trafo), 't')]
+
+        eg = net.ext_grid
+        self.source_bus = self.bus_positions(eg['bus'].values[eg['in_service'].values.astype(bool)])
+
+        # 继电器：与 element_ends 同序；母线装置的支路为 -1
+        self.labels = element_ends(net)
+        n_bus, n_line, n_trafo = len(net.bus), len(line), len(trafo)
+        line_branch = np.arange(n_line)
+        trafo_branch = n_line + np.arange(n_trafo)
+        self.relay_branch = np.r_[np.full(n_bus, -1), line_branch, line_branch, trafo_branch, trafo_branch]
+        self.relay_bus_pos = self.bus_positions(self.labels['bus'])
+        self.relay_far_bus_pos = np.r_[np.arange(n_bus), self.branch_b[line_branch], self.branch_a[line_branch],
+                                       self.branch_b[trafo_branch], self.branch_a[trafo_branch]]
+        # 保护范围：母线装置为本母线，支路装置为所在支路（编号在母线之后）
+        on_branch = self.relay_branch >= 0
+        branch = np.where(on_branch, self.relay_branch, 0)
+        self.relay_zone = np.where(on_branch, n_bus + self.relay_branch, self.relay_bus_pos)
+        self.zone_kind = np.r_[np.zeros(n_bus, dtype=np.int8), 1 + self.branch_type]
+        self.zone_relay_indptr, self.zone_relay = _csr(self.relay_zone, np.arange(len(self.relay_zone)),
+                                                       n_bus + len(self.branch_type))
+        # 保护范围末端（灵敏度校验点）：线路取对端母线，变压器两侧均取低压侧母线，母线装置取本母线
+        is_trafo = on_branch & (self.branch_type[branch] == 1)
+        self.zone_end_bus_pos = np.where(is_trafo, self.branch_b[branch], self.relay_far_bus_pos)
+        # 装置与保护范围末端之间经过 D/Y 变压器（变压器高压侧装置）
+        self.relay_shift = is_trafo & self.branch_shifting[branch] & (self.relay_bus_pos != self.zone_end_bus_pos)
+
+        # (类型, 名称, 母线索引) -> 继电器位置，名称两端空格忽略
+        names = pd.Series(self.labels['element']).astype(str).str.strip().values
+        self._relay_lookup = {}
+        for i, key in enumerate(zip(self.labels['element_type'], names, self.labels['bus'].tolist())):
+            self._relay_lookup.setdefault(key, i)
+
+    def bus_positions(self, buses):
+        """net 母线索引 -> 母线位置"""
+        buses = np.asarray(buses, dtype=np.int64).ravel()
+        pos = self._bus_pos[buses]
+        if (pos < 0).any():
+            raise KeyError(f"buses {buses[pos < 0]} do not exist")
+        return pos
+
+    # ------------------------------------------------------------------ 随开关状态变化的部分
+    def _build_dynamic(self):
+        self._build_nodes()
+        self._build_branches()
+        self._build_paths()
+        self._build_relay_maps()
+
+    def _build_nodes(self):
+        # 闭合的母线-母线开关把母线合并为一个节点（连通分量，编号按最小母线位置排序，与 SequenceModel 一致）
+        n_bus = len(self.bus_index)
+        bb = (self.switch_et == 'b') & self.switch_closed
+        a = self.switch_bus[bb]
+        b = self.bus_positions(self.switch_element[bb]) if bb.any() else np.zeros(0, dtype=np.int64)
+        graph = coo_matrix((np.ones(len(a)), (a, b)), shape=(n_bus, n_bus))
+        _, labels = connected_components(graph, directed=False)
+        # 每个分量以其最小母线位置为代表，再按代表排序编号
+        roots = np.full(labels.max() + 1 if n_bus else 0, n_bus, dtype=np.int64)
+        np.minimum.at(roots, labels, np.arange(n_bus))
+        _, self.node_of_bus = np.unique(roots[labels], return_inverse=True)
+        self.node_of_bus = self.node_of_bus.ravel()
+        self.n_node = int(self.node_of_bus.max()) + 1 if n_bus else 0
+
+    def _build_branches(self):
+        # 支路投运且其上开关均闭合
+        open_sw = ~self.switch_closed & (self.switch_et != 'b')
+        opened = pd.MultiIndex.from_arrays([self.switch_et[open_sw], self.switch_element[open_sw]])
+        self.branch_active = self.branch_in_service & \
+            ~pd.MultiIndex.from_arrays([self._branch_et, self.branch_element]).isin(opened)
+        active = np.flatnonzero(self.branch_active)
+        a, b = self.node_of_bus[self.branch_a[active]], self.node_of_bus[self.branch_b[active]]
+        self.adj_indptr, entries = _csr(np.r_[a, b], np.c_[np.r_[b, a], np.r_[active, active]], self.n_node)
+        self.adj_node, self.adj_branch = entries[:, 0], entries[:, 1]
+
+    def _build_paths(self):
+        n_node = self.n_node
+        active = np.flatnonzero(self.branch_active)
+        a, b = self.node_of_bus[self.branch_a[active]], self.node_of_bus[self.branch_b[active]]
+        graph = coo_matrix((np.ones(len(a)), (a, b)), shape=(n_node, n_node))
+        sources = np.unique(self.node_of_bus[self.source_bus])
+        self.distance = shortest_path(graph, directed=False, unweighted=True, indices=sources).min(axis=0) \
+            if len(sources) else np.full(n_node, np.inf)
+
+        # 移相奇偶：不移相支路连成的分量之间由 D/Y 变压器相连
+        plain = active[~self.branch_shifting[active]]
+        graph = coo_matrix((np.ones(len(plain)), (self.node_of_bus[self.branch_a[plain]],
+                                                  self.node_of_bus[self.branch_b[plain]])), shape=(n_node, n_node))
+        n_comp, labels = connected_components(graph, directed=False)
+        shifting = active[self.branch_shifting[active]]
+        links = list(zip(labels[self.node_of_bus[self.branch_a[shifting]]],
+                         labels[self.node_of_bus[self.branch_b[shifting]]]))
+        parity = np.full(n_comp, -1)
+        for start in range(n_comp):
+            if parity[start] >= 0:
+                continue
+            parity[start] = 0
+            stack = [start]
+            while stack:
+                comp = stack.pop()
+                for u, v in links:
+                    for x, y in ((u, v), (v, u)):
+                        if x == comp and parity[y] < 0:
+                            parity[y] = 1 - parity[comp]
+                            stack.append(y)
+        self.parity = parity[labels]
+
+        # 上游路径（CSR）：节点到电源各条最短路径上的全部支路（并联支路均计入），
+        # 即沿相邻节点距离小 1 的支路逐级上溯；行内按支路下游端距离由近及远排列
+        node = np.repeat(np.arange(n_node), np.diff(self.adj_indptr))
+        with np.errstate(invalid='ignore'):
+            toward = self.distance[self.adj_node] == self.distance[node] - 1
+        rows, branches = node[toward], self.adj_branch[toward]
+        n_branch = len(self.branch_type)
+        step = csr_matrix((np.ones(len(rows)), (rows, self.adj_node[toward])), shape=(n_node, n_node))
+        own = csr_matrix((np.ones(len(rows)), (rows, branches)), shape=(n_node, n_branch))
+        path = own
+        depth = np.where(np.isfinite(self.distance), self.distance, 0).astype(np.int64)
+        for _ in range(int(depth.max()) - 1 if n_node else 0):
+            path = own + step @ path
+            path.data[:] = 1.
+        path_node, path_branch = path.nonzero()
+        level = np.zeros(n_branch)
+        level[branches] = self.distance[rows]
+        order = np.lexsort((path_branch, -level[path_branch], path_node))
+        self.path_indptr, self.path_branch = _csr(path_node[order], path_branch[order], n_node)
+
+    def _build_relay_maps(self):
+        n_node = self.n_node
+        self.relay_node = self.node_of_bus[self.relay_bus_pos]
+        self.relay_far_node = self.node_of_bus[self.relay_far_bus_pos]
+        branch = self.relay_branch
+        self.relay_active = (branch < 0) | self.branch_active[np.where(branch < 0, 0, branch)]
+        on_branch = self.relay_active & (branch >= 0)
+        own, other = self.distance[self.relay_node], self.distance[self.relay_far_node]
+        # 靠近电源一端（向下游保护元件）/ 远离电源一端（作为所在母线的进线保护）
+        self.relay_near = on_branch & (own < other)
+        self.relay_far = on_branch & (own > other)
+
+        relays = np.arange(len(branch))
+        # 节点 -> 进线继电器；节点 -> 对端为该节点的近电源端继电器（向该节点供电）
+        far = relays[self.relay_far]
+        self.incomer_indptr, self.incomer = _csr(self.relay_node[far], far, n_node)
+        near = relays[self.relay_near]
+        self.feeding_indptr, self.feeding = _csr(self.relay_far_node[near], near, n_node)
+        # 支路 -> 近电源端继电器
+        self.branch_near_relay = np.full(len(self.branch_type), -1, dtype=np.int64)
+        self.branch_near_relay[branch[near][::-1]] = near[::-1]
+
+        # 节点 -> 看到该点故障的继电器：本节点的母线装置，以及上游路径上各支路两端的继电器（按路径由近及远）
+        branch_relays_indptr, branch_relays = _csr(branch[branch >= 0], relays[branch >= 0], len(self.branch_type))
+        path_node = np.repeat(np.arange(n_node), np.diff(self.path_indptr))
+        count = np.diff(branch_relays_indptr)[self.path_branch]
+        entry = np.repeat(branch_relays_indptr[self.path_branch], count) + \
+            np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        bus_relays = relays[branch < 0]
+        rows = np.r_[self.relay_node[bus_relays], np.repeat(path_node, count)]
+        self.fault_relay_indptr, self.fault_relay = _csr(rows, np.r_[bus_relays, branch_relays[entry]], n_node)
+
+    def set_switch(self, switch, closed):
+        """
+        改变一个开关的状态并更新索引
+        :param switch: 开关索引
+        :return: 状态是否改变
+        """
+        pos = np.flatnonzero(self.switch_index == switch)
+        if not len(pos):
+            raise KeyError(f"switch {switch} does not exist")
+        if self.switch_closed[pos[0]] == bool(closed):
+            return False
+        self.switch_closed[pos[0]] = bool(closed)
+        with span('topology.update'):
+            if self.switch_et[pos[0]] == 'b':
+                self._build_dynamic()
+            else:
+                # 线路/变压器开关不改变节点划分
+                self._build_branches()
+                self._build_paths()
+                self._build_relay_maps()
+        return True
+
+    def sync(self, net):
+        """
+        按 net.switch 的当前状态更新索引（开关表的行须与建立索引时相同）
+        :return: 状态改变的开关索引
+        """
+        closed = net.switch['closed'].reindex(self.switch_index).values.astype(bool)
+        changed = self.switch_index[closed != self.switch_closed]
+        if len(changed):
+            self.switch_closed = closed.copy()
+            with span('topology.update'):
+                self._build_dynamic()
+        return changed
+
+    # ------------------------------------------------------------------ 查询
+    def relay_positions(self, labels):
+        """
+        继电器标签（element_type / element / bus，如 RelaySettings.labels）-> 索引中的继电器位置，找不到为 -1
+        """
+        names = pd.Series(labels['element']).astype(str).str.strip().values
+        return np.array([self._relay_lookup.get(key, -1) for key in
+                         zip(labels['element_type'], names, np.asarray(labels['bus']).tolist())], dtype=np.int64)
+
+    def bus_distance(self):
+        """各母线到电源的最少支路数"""
+        return self.distance[self.node_of_bus]
+
+    def bus_parity(self):
+        """各母线的 30° 移相奇偶"""
+        return self.parity[self.node_of_bus]
+
+    def upstream_path(self, bus):
+        """
+        母线到电源各条最短路径经过的支路，并联支路均计入（由近及远）
+        :return: (元件类型数组, 元件索引数组)
+        """
+        node = self.node_of_bus[self.bus_positions(bus)[0]]
+        branches = self.path_branch[self.path_indptr[node]:self.path_indptr[node + 1]]
+        return np.array(ZONE_KINDS, dtype=object)[1 + self.branch_type[branches]], self.branch_element[branches]
+
+    def relays_seeing(self, bus):
+        """
+        母线故障时有故障电流流过的继电器位置（本母线装置与上游路径各支路两端，含全部并联支路）
+        """
+        node = self.node_of_bus[self.bus_positions(bus)[0]]
+        return self.fault_relay[self.fault_relay_indptr[node]:self.fault_relay_indptr[node + 1]]
+
+    def source_behind(self, relays):
+        """
+        支路继电器背后是否有电源：所在节点不经过本元件（及与之并联、连接同样两个节点的支路）能否到达外部电网
+        :param relays: 支路继电器位置数组
+        :return: 布尔数组
+        """
+        relays = np.asarray(relays, dtype=np.int64)
+        node, far = self.relay_node[relays], self.relay_far_node[relays]
+        active = np.flatnonzero(self.branch_active)
+        a, b = self.node_of_bus[self.branch_a[active]], self.node_of_bus[self.branch_b[active]]
+        source = np.zeros(self.n_node, dtype=bool)
+        source[self.node_of_bus[self.source_bus]] = True
+        result = np.zeros(len(relays), dtype=bool)
+        # 同一对节点上的继电器只需判断一次
+        pairs, inverse = np.unique(np.c_[node, far], axis=0, return_inverse=True)
+        for i, (u, v) in enumerate(pairs):
+            keep = ~(((a == u) & (b == v)) | ((a == v) & (b == u)))
+            graph = coo_matrix((np.ones(keep.sum()), (a[keep], b[keep])), shape=(self.n_node, self.n_node))
+            _, labels = connected_components(graph, directed=False)
+            result[inverse.ravel() == i] = source[labels == labels[u]].any()
+        return result
+
+    def zone_relays(self, zone):
+        """保护范围（母线位置，或 母线数 + 支路编号）内的继电器位置"""
+        return self.zone_relay[self.zone_relay_indptr[zone]:self.zone_relay_indptr[zone + 1]]
+
+    def coordination_pairs(self, present=None):
+        """
+        由拓扑确定的上下级继电器对（继电器位置）：
+            近电源端继电器 -> 所在节点的进线继电器（没有进线继电器时为向该节点供电元件的近电源端继电器）
+            进线继电器     -> 同一元件近电源端的继电器
+        :param present: 实际装设的继电器（布尔数组），None 表示全部
+        :return: (下级数组, 上级数组, 是否为进线对数组)，同一对只出现一次
+        """
+        if present is None:
+            incomer_indptr, incomers = self.incomer_indptr, self.incomer
+            feeding_indptr, feeding = self.feeding_indptr, self.feeding
+            near_mask, far_mask = self.relay_near, self.relay_far
+        else:
+            near_mask, far_mask = self.relay_near & present, self.relay_far & present
+            far = np.flatnonzero(far_mask)
+            incomer_indptr, incomers = _csr(self.relay_node[far], far, self.n_node)
+            near = np.flatnonzero(near_mask)
+            feeding_indptr, feeding = _csr(self.relay_far_node[near], near, self.n_node)
+        near = np.flatnonzero(near_mask)
+        node = self.relay_node[near]
+        count = np.diff(incomer_indptr)[node]
+        down = [np.repeat(near, count)]
+        up = [incomers[_ranges(incomer_indptr[node], count)]]
+        orphan = near[count == 0]
+        node = self.relay_node[orphan]
+        count = np.diff(feeding_indptr)[node]
+        down.append(np.repeat(orphan, count))
+        up.append(feeding[_ranges(feeding_indptr[node], count)])
+        # 同一元件的近电源端继电器
+        partner = np.full(len(self.branch_type), -1, dtype=np.int64)
+        partner[self.relay_branch[near][::-1]] = near[::-1]
+        far = np.flatnonzero(far_mask)
+        partner = partner[self.relay_branch[far]]
+        down.append(far[partner >= 0])
+        up.append(partner[partner >= 0])
+        incomer = np.r_[np.zeros(len(down[0]) + len(down[1]), dtype=bool), np.ones(len(down[2]), dtype=bool)]
+        down, up = np.concatenate(down), np.concatenate(up)
+        _, first = np.unique(np.c_[down, up], axis=0, return_index=True)
+        first = np.sort(first)
+        return down[first], up[first], incomer[first]
+
+def _ranges(starts, counts):
+    # 把若干 [start, start + count) 区间拼成一个位置数组
+    counts = np.asarray(counts, dtype=np.int64)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - np.r_[0, np.cumsum(counts)[:-1]], counts) + \
+        np.arange(counts.sum())
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+from coordination import _relay_frame, relay_currents
+from instrumentation import span
+from sc_sweep import FAULT_TYPES, SequenceModel, calc_sc_sweep
+from topology_index import TopologyIndex
+
+# 变压器保护整定：比率制动差动、差动速断、高压侧电流速断
+# 全部变压器的额定电流、电流互感器变比、平衡系数和各项定值按 net.trafo 的数组一次计算；
+# 穿越电流由 coordination.relay_currents 求得：变压器高压侧继电器在低压母线故障时的最大相电流，
+# 已计入 D/Y 联结的 30° 移相（两相短路时高压侧最大相为折算值的 2/√3 倍）和零序电流不能穿越（单相接地时为 1/√3 倍），
+# 并联电源时只计本变压器分担的部分。以额定电流为基准（pu）：
+#     最小动作电流  Idmin = Krel·(Ker + ΔU + Δm)，不小于 MIN_DIFF_PICKUP_PU
+#     制动特性      Id ≥ Idmin + S·max(0, Ir − Ir0)，Ir0 = KNEE_PU
+#     比率制动系数  S = (Krel·Iunb − Idmin) / (Ir_max − Ir0)，Iunb = (Kap·Kcc·Ker + ΔU + Δm)·Ir_max，
+#                   Ir_max 为区外（低压母线）最大穿越电流，限制在 SLOPE_RANGE 内
+#     差动速断      按容量取 DIFF_INSTANTANEOUS_MULTIPLE 倍额定电流（躲励磁涌流和区外故障不平衡电流）
+#     二次谐波制动  SECOND_HARMONIC_RATIO
+#     高压侧电流速断 max(Krel·低压母线故障时高压侧最大电流, 励磁涌流倍数·额定电流)
+# 校验：
+#     stability     区外故障（三种故障类型）时动作电流 / 不平衡电流 ≥ 1；YN 侧未消除零序时，
+#                   单相接地的零序电流（按低压侧相电流的 1/3）计入差流
+#     diff          最小方式低压母线两相短路（单侧电源）的差动灵敏系数 ≥ REQUIRED_SENSITIVITY['diff']
+#     diff_instant  最小方式高压侧出口两相短路 / 差动速断 ≥ REQUIRED_SENSITIVITY['diff_instant']
+#     hv_instant    最小方式高压侧出口两相短路 / 电流速断 ≥ REQUIRED_SENSITIVITY['hv_instant']
+
+# 可靠系数、电流互感器误差、非周期分量系数、同型系数、平衡调整误差
+K_RELIABILITY = 1.5
+CT_ERROR = 0.1
+K_APERIODIC = 1.5
+K_SAME_TYPE = 1.
+MISMATCH = 0.05
+
+MIN_DIFF_PICKUP_PU = 0.2
+KNEE_PU = 0.8
+SLOPE_RANGE = (0.3, 0.7)
+SECOND_HARMONIC_RATIO = 0.15
+
+# 差动速断倍数，按容量（MVA）上限选取（DL/T 684 推荐范围 7~12 / 4.5~7 / 3~6 / 2~5）
+DIFF_INSTANTANEOUS_MULTIPLE = ((6.3, 8.), (31.5, 6.), (120., 4.5), (np.inf, 3.5))
+# 励磁涌流倍数（额定电流的倍数），按容量（MVA）上限选取
+INRUSH_MULTIPLE = ((2.5, 12.), (10., 10.), (40., 8.), (100., 6.), (np.inf, 5.))
+# 高压侧电流速断躲区外故障的可靠系数
+K_INSTANTANEOUS = 1.3
+
+REQUIRED_SENSITIVITY = {'diff': 2., 'diff_instant': 1.2, 'hv_instant': 2.}
+
+# 电流互感器标准一次额定电流（A），取不小于 CT_MARGIN 倍额定电流的最小值
+STANDARD_CT_PRIMARY_A = (50, 75, 100, 150, 200, 300, 400, 500, 600, 750, 800, 1000, 1200, 1500, 2000, 2500, 3000,
+                         4000, 5000, 6000, 8000)
+CT_MARGIN = 1.2
+
+TRANSFORMER_PROTECTION_COLUMNS = [
+    'trafo', 'hv_bus', 'lv_bus', 'sn_mva', 'vector_group', 'clock', 'in_hv_a', 'in_lv_a', 'ct_hv_a', 'ct_lv_a',
+    'balance_lv', 'i0_elimination_hv', 'i0_elimination_lv', 'tap_range', 'diff_pickup_pu', 'knee_pu', 'slope',
+    'diff_instantaneous_pu', 'second_harmonic', 'through_max_pu', 'unbalance_pu', 'stability_margin',
+    'diff_sensitivity', 'diff_instantaneous_sensitivity', 'inrush_ka', 'hv_instantaneous_ka',
+    'hv_instantaneous_sensitivity', 'status']
+
+
+def _by_capacity(table, sn_mva):
+    limits = np.array([limit for limit, _ in table])
+    values = np.array([value for _, value in table])
+    return values[np.searchsorted(limits, sn_mva)]
+
+
+def _windings(vector_groups):
+    # 联结组别 -> (高压侧中性点接地, 低压侧中性点接地)，如 'Dyn' -> (False, True)，'YNd' -> (True, False)
+    hv, lv = [], []
+    for group in vector_groups:
+        group = str(group)
+        hv_n = group[1:2] == 'N'
+        hv.append(group[:1] in 'YZ' and hv_n)
+        lv.append(group[2 if hv_n else 1:].lower() in ('yn', 'zn'))
+    return np.array(hv, dtype=bool), np.array(lv, dtype=bool)
+
+
+def ct_primary(rated_a, margin=CT_MARGIN, standard=STANDARD_CT_PRIMARY_A):
+    """
+    按额定电流选取电流互感器一次额定电流（A），超过标准系列时取额定电流的 margin 倍
+    """
+    standard = np.asarray(standard, dtype=np.float64)
+    required = np.asarray(rated_a, dtype=np.float64) * margin
+    pos = np.searchsorted(standard, required)
+    return np.where(pos < len(standard), standard[np.minimum(pos, len(standard) - 1)], required)
+
+
+def tap_range(trafo):
+    """
+    分接开关调压范围（标幺值），无分接开关时为 0
+    """
+    step = trafo['tap_step_percent'].values.astype(np.float64) / 100. if 'tap_step_percent' in trafo else 0.
+    neutral = trafo['tap_neutral'].values.astype(np.float64) if 'tap_neutral' in trafo else 0.
+    span_ = [np.abs(trafo[column].values.astype(np.float64) - neutral) for column in ('tap_min', 'tap_max')
+             if column in trafo]
+    result = np.max(span_, axis=0) * step if span_ else np.zeros(len(trafo))
+    return np.nan_to_num(np.broadcast_to(result, (len(trafo),)).astype(np.float64))
+
+
+def _side_currents(net, bus_results, models, topology):
+    """
+    各方式下变压器高压侧继电器在低压母线故障时的最大相电流（kA），
+    以及低压侧继电器的最大相电流，形状 {方式: (变压器数, 故障类型数)}
+    """
+    n_bus, n_line, n_trafo = len(net.bus), len(net.line), len(net.trafo)
+    hv = n_bus + 2 * n_line + np.arange(n_trafo)
+    lv = hv + n_trafo
+    # 继电器编号即拓扑索引中的位置
+    rel = _relay_frame(topology, topology)
+    present = np.isin(np.r_[hv, lv], rel['relay'].values)
+    relays = np.r_[hv, lv][present]
+    fault_bus = np.r_[topology.relay_bus_pos[lv], topology.relay_bus_pos[lv]][present]
+    currents = {}
+    for case, model in models.items():
+        values = np.full((2 * n_trafo, len(FAULT_TYPES)), np.nan)
+        if len(relays):
+            values[present] = relay_currents(model, rel, relays, fault_bus, np.zeros(len(relays), dtype=bool),
+                                             bus_results[case], topology)
+        currents[case] = values[:n_trafo], values[n_trafo:]
+    return currents
+
+
+def transformer_protection_table(net, bus_results=None, lv_tol_percent=6, ct_hv_a=None, ct_lv_a=None,
+                                 zero_sequence_elimination=True, topology=None):
+    """
+    全部变压器的差动、差动速断和高压侧电流速断定值及校验
+    :param net: pandapower 网络
+    :param bus_results: {'max': ..., 'min': ...} calc_sc_sweep 的母线结果，缺省时计算
+    :param ct_hv_a: 高压侧电流互感器一次额定电流（A），标量或每台变压器一个值，缺省按额定电流选取标准值
+    :param ct_lv_a: 低压侧电流互感器一次额定电流（A），同上
+    :param zero_sequence_elimination: 差动保护是否在中性点接地侧消除零序电流
+    :param topology: TopologyIndex，缺省时由 net 建立
+    :return: 每台变压器一行的 DataFrame，列为 TRANSFORMER_PROTECTION_COLUMNS，电流定值以额定电流为基准（pu）；
+             status 为 'ok' / 'unstable'（区外故障时差动可能误动）/ 'insensitive'（灵敏系数不足）/
+             'out_of_service'
+    """
+    with span('transformer_protection') as s:
+        trafo = net.trafo
+        topology = TopologyIndex(net) if topology is None else topology
+        models = {case: SequenceModel(net, case, lv_tol_percent) for case in ('max', 'min')}
+        bus_results = bus_results or {}
+        bus_results = {case: bus_results[case] if case in bus_results
+                       else calc_sc_sweep(net, case, lv_tol_percent, model=models[case]) for case in models}
+
+        sn = trafo['sn_mva'].values.astype(np.float64) * trafo['parallel'].values.astype(np.float64) \
+            if 'parallel' in trafo else trafo['sn_mva'].values.astype(np.float64)
+        vn_hv = trafo['vn_hv_kv'].values.astype(np.float64)
+        vn_lv = trafo['vn_lv_kv'].values.astype(np.float64)
+        in_hv = sn / (np.sqrt(3) * vn_hv)
+        in_lv = sn / (np.sqrt(3) * vn_lv)
+        ct_hv = ct_primary(in_hv * 1000.) if ct_hv_a is None else np.broadcast_to(ct_hv_a, sn.shape).astype(float)
+        ct_lv = ct_primary(in_lv * 1000.) if ct_lv_a is None else np.broadcast_to(ct_lv_a, sn.shape).astype(float)
+        # 平衡系数：低压侧二次电流折算到高压侧基准
+        balance_lv = (in_hv * 1000. / ct_hv) / (in_lv * 1000. / ct_lv)
+        groups = trafo['vector_group'].values.astype(str) if 'vector_group' in trafo else np.full(len(sn), 'Dyn')
+        grounded_hv, grounded_lv = _windings(groups)
+        clock = np.round(trafo['shift_degree'].values.astype(np.float64) / 30.).astype(int) % 12 \
+            if 'shift_degree' in trafo else np.zeros(len(sn), dtype=int)
+        du = tap_range(trafo)
+
+        currents = _side_currents(net, bus_results, models, topology)
+        hv_max, lv_max = currents['max']
+        hv_min, _ = currents['min']
+        # 区外故障穿越电流与制动电流（pu），形状 (变压器数, 故障类型数)
+        restraint = np.fmax(hv_max / in_hv[:, np.newaxis], lv_max / in_lv[:, np.newaxis])
+        through_max = np.nanmax(np.where(np.isnan(restraint), -np.inf, restraint), axis=1)
+        through_max = np.where(np.isfinite(through_max), through_max, np.nan)
+
+        diff_pickup = np.maximum(K_RELIABILITY * (CT_ERROR + du + MISMATCH), MIN_DIFF_PICKUP_PU)
+        unbalance_rate = K_APERIODIC * K_SAME_TYPE * CT_ERROR + du + MISMATCH
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (K_RELIABILITY * unbalance_rate * through_max - diff_pickup) / (through_max - KNEE_PU)
+        slope = np.clip(np.nan_to_num(slope, nan=SLOPE_RANGE[0]), *SLOPE_RANGE)
+
+        # 区外故障不平衡电流：各故障类型的误差项，加上未消除的零序电流
+        unbalance = unbalance_rate[:, np.newaxis] * restraint
+        zero = grounded_lv & ~zero_sequence_elimination
+        one_phase = FAULT_TYPES.index('1ph')
+        unbalance[:, one_phase] += np.where(zero, lv_max[:, one_phase] / in_lv / 3., 0.)
+        operate = diff_pickup[:, np.newaxis] + slope[:, np.newaxis] * np.maximum(restraint - KNEE_PU, 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            margin = np.nanmin(np.where(np.isnan(restraint), np.inf, operate / unbalance), axis=1)
+
+        diff_instant = _by_capacity(DIFF_INSTANTANEOUS_MULTIPLE, sn)
+        inrush = _by_capacity(INRUSH_MULTIPLE, sn) * in_hv
+        hv_instant = np.fmax(K_INSTANTANEOUS * np.nanmax(np.nan_to_num(hv_max, nan=0.), axis=1), inrush)
+
+        # 灵敏度：最小方式低压母线两相短路（单侧电源，Ir = Id）与高压侧出口两相短路
+        two_phase = FAULT_TYPES.index('2ph')
+        internal = hv_min[:, two_phase] / in_hv
+        with np.errstate(invalid='ignore'):
+            diff_sensitivity = internal / (diff_pickup + slope * np.maximum(internal - KNEE_PU, 0.))
+        hv_pos = topology.bus_positions(trafo['hv_bus'].values)
+        hv_fault = bus_results['min']['2ph_ikss_ka'].reindex(topology.bus_index).values[hv_pos]
+        diff_instant_sensitivity = hv_fault / in_hv / diff_instant
+        hv_instant_sensitivity = hv_fault / hv_instant
+
+        active = topology.branch_active[topology.branch_type == 1]
+        insensitive = (diff_sensitivity < REQUIRED_SENSITIVITY['diff']) | \
+            (diff_instant_sensitivity < REQUIRED_SENSITIVITY['diff_instant']) | \
+            (hv_instant_sensitivity < REQUIRED_SENSITIVITY['hv_instant'])
+        status = np.select([~active, margin < 1., insensitive], ['out_of_service', 'unstable', 'insensitive'], 'ok')
+
+        bus_names = net.bus['name'].values
+        result = pd.DataFrame({
+            'trafo': trafo['name'].values,
+            'hv_bus': bus_names[hv_pos],
+            'lv_bus': bus_names[topology.bus_positions(trafo['lv_bus'].values)],
+            'sn_mva': sn,
+            'vector_group': groups,
+            'clock': clock,
+            'in_hv_a': in_hv * 1000.,
+            'in_lv_a': in_lv * 1000.,
+            'ct_hv_a': ct_hv,
+            'ct_lv_a': ct_lv,
+            'balance_lv': balance_lv,
+            'i0_elimination_hv': grounded_hv & zero_sequence_elimination,
+            'i0_elimination_lv': grounded_lv & zero_sequence_elimination,
+            'tap_range': du,
+            'diff_pickup_pu': diff_pickup,
+            'knee_pu': KNEE_PU,
+            'slope': slope,
+            'diff_instantaneous_pu': diff_instant,
+            'second_harmonic': SECOND_HARMONIC_RATIO,
+            'through_max_pu': through_max,
+            'unbalance_pu': unbalance_rate * through_max,
+            'stability_margin': np.where(active, margin, np.nan),
+            'diff_sensitivity': diff_sensitivity,
+            'diff_instantaneous_sensitivity': diff_instant_sensitivity,
+            'inrush_ka': inrush,
+            'hv_instantaneous_ka': np.where(active, hv_instant, np.nan),
+            'hv_instantaneous_sensitivity': np.where(active, hv_instant_sensitivity, np.nan),
+            'status': status,
+        }, columns=TRANSFORMER_PROTECTION_COLUMNS)
+        s.rows = len(result)
+    return result